@@ -0,0 +1,120 @@
+"""Admission control: cap concurrent runs of an expensive operation.
+
+A gate admits up to ``limit`` callers at once. Further callers queue for at
+most ``max_wait`` seconds, and once ``max_queue`` of them are waiting the rest
+are turned away straight away with Overloaded, so a spike is shed at the door
+instead of piling onto threads and upstream quotas. Gates are awaited on the
+event loop, so a queued request holds no worker thread.
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.metrics import Counter, Gauge, Histogram
+
+_IN_FLIGHT = Gauge(
+    "popchoice_admission_in_flight",
+    "Requests currently admitted, by gate.",
+    labels=("gate",),
+)
+_QUEUE_DEPTH = Gauge(
+    "popchoice_admission_queue_depth",
+    "Requests waiting for a slot, by gate.",
+    labels=("gate",),
+)
+_REJECTED = Counter(
+    "popchoice_admission_rejected_total",
+    "Requests turned away, by gate and reason (queue_full or timeout).",
+    labels=("gate", "reason"),
+)
+_WAIT_SECONDS = Histogram(
+    "popchoice_admission_wait_seconds",
+    "Time admitted requests spent queued, by gate.",
+    labels=("gate",),
+)
+
+
+class Overloaded(Exception):
+    """The gate is full; the caller should retry after ``retry_after`` seconds."""
+
+    def __init__(self, gate: str, reason: str, retry_after: int) -> None:
+        super().__init__(f"{gate} is overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int,
+        max_wait: float,
+        retry_after: int,
+    ) -> None:
+        self.name = name
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._slots = asyncio.Semaphore(limit)
+        self._waiting = 0
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def _reject(self, reason: str) -> Overloaded:
+        _REJECTED.inc(gate=self.name, reason=reason)
+        return Overloaded(self.name, reason, self.retry_after)
+
+    async def acquire(self) -> None:
+        """Take a slot, queueing if needed; raises Overloaded if none frees up."""
+        if self._slots.locked() and self._waiting >= self.max_queue:
+            raise self._reject("queue_full")
+
+        started = time.perf_counter()
+        self._waiting += 1
+        _QUEUE_DEPTH.inc(gate=self.name)
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await self._slots.acquire()
+        except TimeoutError:
+            raise self._reject("timeout") from None
+        finally:
+            self._waiting -= 1
+            _QUEUE_DEPTH.dec(gate=self.name)
+        _WAIT_SECONDS.observe(time.perf_counter() - started, gate=self.name)
+        _IN_FLIGHT.inc(gate=self.name)
+
+    def release(self) -> None:
+        _IN_FLIGHT.dec(gate=self.name)
+        self._slots.release()
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncGenerator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """A StreamingResponse that holds an already acquired slot of ``gate``
+    until it is done sending, however that ends: streamed out, failed, or
+    cancelled because the client went away before the body was read."""
+
+    def __init__(self, gate: AdmissionGate, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._gate = gate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._gate.release()
@@ -1,36 +1,67 @@
-from typing import TypedDict
+import threading
+from typing import Annotated, TypedDict
 
-from langchain_anthropic import ChatAnthropic
+import httpx
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
-from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import InjectedToolArg, tool
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, StateGraph
 from langgraph.types import interrupt
 
-from app.database import search_similar
+from app import profiling
+from app.config import (
+    CHECKPOINTER,
+    CONTEXT_TOKEN_BUDGET,
+    DEFAULT_HOUSEHOLD,
+    DEFAULT_PARTNER_NAMES,
+    DEFAULT_REGION,
+    SPECULATIVE_SEARCH,
+    SPECULATIVE_WORKERS,
+)
+from app.context import build_watch_context
+from app.database import SearchHit, partner_names
+from app.metrics import Histogram
+from app.retrieval import hybrid_search
+from app.speculation import Speculator
 from app.tmdb import get_watch_providers, search_media
+from app.tracing import Span, current_thread_id, span, thread_scope
 
+_LLM_INPUT_TOKENS = Histogram(
+    "popchoice_llm_input_tokens",
+    "Prompt tokens per chat model request, as counted by the model.",
+    labels=("call",),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000),
+)
 
-@tool
-def check_streaming_in_romania(title: str) -> str:
-    """Check if a movie or series is currently available for streaming in Romania.
-    Returns the platforms it's available on, or states it's not available."""
-    results = search_media(title)
-    if not results:
-        return f"Could not find '{title}' on TMDB."
-
-    top = results[0]
-    tmdb_id = top["tmdb_id"]
-    media_type = top["type"]
 
-    providers = get_watch_providers(tmdb_id, media_type)
-    flatrate = providers.get("RO", {}).get("flatrate", [])
+@tool
+def check_streaming_availability(
+    title: str, region: Annotated[str, InjectedToolArg]
+) -> str:
+    """Check if a movie or series is currently available for streaming in the
+    household's region. Returns the platforms it's available on, or states
+    it's not available."""
+    try:
+        results = search_media(title)
+        if not results:
+            return f"Could not find '{title}' on TMDB."
+
+        top = results[0]
+        providers = get_watch_providers(top["tmdb_id"], top["type"])
+    except httpx.HTTPError:
+        # A timed-out or failed lookup costs one title, not the whole answer.
+        return f"Could not check availability of '{title}' right now."
+
+    flatrate = providers.get(region, {}).get("flatrate", [])
 
     if not flatrate:
-        return f"'{top['title']}' is NOT currently available for streaming in Romania."
+        return f"'{top['title']}' is NOT currently available for streaming in {region}."
 
     platforms = [p["provider_name"] for p in flatrate]
-    return f"'{top['title']}' is available on: {', '.join(platforms)} in Romania."
+    return f"'{top['title']}' is available on: {', '.join(platforms)} in {region}."
 
 
 class RecommenderState(TypedDict):
@@ -38,23 +69,54 @@ class RecommenderState(TypedDict):
     media_type: str | None
     genres: list[str]
     nostalgic_title: str | None
-    search_results: list[dict]
+    search_results: list[SearchHit]
     recommendation: str | None
     asked_nostalgic: bool
     availability_info: str | None
+    watch_context: str | None
+    region: str
+    household: str
+    # The two partners, as the prompts name them.
+    names: list[str]
+
+
+# Built on first use; langchain_anthropic alone adds seconds to import time.
+_llm: BaseChatModel | None = None
+_llm_with_tools = None
+_init_lock = threading.Lock()
+
+
+def _get_llm() -> BaseChatModel:
+    global _llm
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                from langchain_anthropic import ChatAnthropic
+
+                _llm = ChatAnthropic(model="claude-haiku-4-5-20251001")  # type: ignore[call-arg]
+    return _llm
+
+
+def _get_llm_with_tools():
+    global _llm_with_tools
+    if _llm_with_tools is None:
+        _llm_with_tools = _get_llm().bind_tools([check_streaming_availability])
+    return _llm_with_tools
+
 
+MOOD_QUESTION = (
+    "What mood are you two in tonight? "
+    "(You can give multiple moods separated by commas, e.g. 'relaxed, adventurous')"
+)
 
-_llm = ChatAnthropic(model="claude-haiku-4-5-20251001")  # type: ignore[call-arg]
-_llm_with_tools = _llm.bind_tools([check_streaming_in_romania])
+
+def _split_answer(answer: str) -> list[str]:
+    return [a.strip() for a in answer.replace(" and ", ",").split(",") if a.strip()]
 
 
 def ask_mood(state: RecommenderState) -> dict:
-    answer = interrupt(
-        "What mood are you two in tonight? "
-        "(You can give multiple moods separated by commas, e.g. 'relaxed, adventurous')"
-    )
-    moods = [m.strip() for m in answer.replace(" and ", ",").split(",") if m.strip()]
-    return {"mood": moods}
+    answer = interrupt(MOOD_QUESTION)
+    return {"mood": _split_answer(answer)}
 
 
 def ask_type(state: RecommenderState) -> dict:
@@ -69,25 +131,71 @@ def ask_genres(state: RecommenderState) -> dict:
     if "no preference" in answer.lower():
         genres = []
     else:
-        genres = [
-            g.strip() for g in answer.replace(" and ", ",").split(",") if g.strip()
-        ]
+        genres = _split_answer(answer)
     return {"genres": genres}
 
 
-def search_db(state: RecommenderState) -> dict:
+def _media_type_filter(answer: str | None) -> str | None:
+    """Map the free-text type answer to a stored type, or None for "both"."""
+    text = (answer or "").lower()
+    wants_movie = "movie" in text or "film" in text
+    wants_series = any(word in text for word in ("series", "show", "tv"))
+    if wants_movie == wants_series:
+        return None
+    return "movie" if wants_movie else "series"
+
+
+# What search_db searches for: query, keywords, type filter, genres, household.
+SearchArgs = tuple[str, str, str | None, tuple[str, ...], str]
+
+
+def _search_args(
+    mood: list[str],
+    media_type: str | None,
+    genres: list[str],
+    household: str | None,
+    nostalgic_title: str | None = None,
+) -> SearchArgs:
     parts = []
-    if state.get("mood"):
-        parts.append(f"mood: {', '.join(state['mood'])}")
-    if state.get("media_type"):
-        parts.append(f"type: {state['media_type']}")
-    if state.get("genres"):
-        parts.append(f"genres: {', '.join(state['genres'])}")
-    if state.get("nostalgic_title"):
-        parts.append(f"similar feel to: {state['nostalgic_title']}")
+    if mood:
+        parts.append(f"mood: {', '.join(mood)}")
+    if genres:
+        parts.append(f"genres: {', '.join(genres)}")
+    if nostalgic_title:
+        parts.append(f"similar feel to: {nostalgic_title}")
 
     query = ". ".join(parts)
-    results = search_similar(query, limit=5)
+    keywords = " ".join([*mood, *genres] + [nostalgic_title or ""])
+    return (
+        query,
+        keywords,
+        _media_type_filter(media_type),
+        tuple(genres),
+        household or DEFAULT_HOUSEHOLD,
+    )
+
+
+def _run_search(args: SearchArgs) -> list[SearchHit]:
+    query, keywords, media_type, genres, household = args
+    return hybrid_search(
+        query,
+        keywords,
+        media_type=media_type,
+        genres=list(genres),
+        limit=5,
+        household=household,
+    )
+
+
+def search_db(state: RecommenderState) -> dict:
+    args = _search_args(
+        state.get("mood", []),
+        state.get("media_type"),
+        state.get("genres", []),
+        state.get("household"),
+        state.get("nostalgic_title"),
+    )
+    results = _speculative.take(current_thread_id(), args, lambda: _run_search(args))
     return {"search_results": results}
 
 
@@ -99,29 +207,47 @@ def ask_nostalgic(state: RecommenderState) -> dict:
     return {"nostalgic_title": title, "asked_nostalgic": True}
 
 
+def _names(state: RecommenderState) -> list[str]:
+    return state.get("names") or DEFAULT_PARTNER_NAMES
+
+
 def _build_watch_context(state: RecommenderState) -> str:
-    results = state.get("search_results", [])
-    if not results:
-        return "No strong matches found in their watch history."
-    lines = []
-    for r in results:
-        line = (
-            f"- {r['title']} ({r['type']}, rated {r.get('user_rating', '?')}/10): "
-            f'Mora said "{r.get("user_review", "")}". '
-            f'GF said "{r.get("gf_review", "")}".'
+    query = [*state.get("mood", []), *state.get("genres", [])]
+    nostalgic_title = state.get("nostalgic_title")
+    if nostalgic_title:
+        query.append(nostalgic_title)
+    with span("context.build") as current:
+        context = build_watch_context(
+            state.get("search_results", []),
+            CONTEXT_TOKEN_BUDGET,
+            query,
+            _names(state),
         )
-        lines.append(line)
-    return "\n".join(lines)
+        current.attributes["chars"] = len(context)
+    return context
+
+
+def _record_usage(call: str, response, current: Span) -> None:
+    """Record the prompt size the model reports, when it reports one."""
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict) and "input_tokens" in usage:
+        current.attributes["input_tokens"] = usage["input_tokens"]
+        _LLM_INPUT_TOKENS.observe(usage["input_tokens"], call=call)
 
 
 def check_availability(state: RecommenderState) -> dict:
-    """Use the LLM with tools to find a title that is available for streaming."""
+    """Use the LLM with tools to find a title that is available for streaming.
+
+    Builds the watch-history context for this run and stores it for
+    recommend, which sends the same block.
+    """
     context = _build_watch_context(state)
+    region = state.get("region") or DEFAULT_REGION
 
     system = SystemMessage(
         content=(
             "You are helping a couple find something to watch tonight. "
-            "Use the check_streaming_in_romania tool to verify titles are available. "
+            "Use the check_streaming_availability tool to verify titles are available. "
             "If a title is NOT available, pick a different one and check again. "
             "Keep trying until you find one that IS available (up to 4 checks)."
         )
@@ -135,21 +261,25 @@ def check_availability(state: RecommenderState) -> dict:
             f"Nostalgic reference: {state.get('nostalgic_title') or 'none'}\n\n"
             f"Their watch history matches:\n{context}\n\n"
             "Find a title that matches their preferences and verify "
-            "it is available for streaming in Romania."
+            f"it is available for streaming in their region ({region})."
         )
     )
 
     messages: list = [system, human]
 
     while True:
-        response = _llm_with_tools.invoke(messages)
+        with span("llm.check_availability") as current:
+            response = _get_llm_with_tools().invoke(messages)
+            _record_usage("check_availability", response, current)
 
         if not response.tool_calls:
             break
 
         messages.append(response)
         for tool_call in response.tool_calls:
-            tool_result = check_streaming_in_romania.invoke(tool_call["args"])
+            args = dict(tool_call["args"])
+            args["region"] = region
+            tool_result = check_streaming_availability.invoke(args)
             messages.append(
                 ToolMessage(
                     content=str(tool_result),
@@ -158,13 +288,17 @@ def check_availability(state: RecommenderState) -> dict:
             )
 
     tool_results = [m.content for m in messages if isinstance(m, ToolMessage)]
-    return {"availability_info": "\n".join(tool_results) if tool_results else ""}
+    return {
+        "availability_info": "\n".join(tool_results) if tool_results else "",
+        "watch_context": context,
+    }
 
 
 def recommend(state: RecommenderState) -> dict:
     """Generate the formatted recommendation (no tool calls — safe to stream)."""
-    context = _build_watch_context(state)
+    context = state.get("watch_context") or _build_watch_context(state)
     availability = state.get("availability_info") or "No availability data."
+    first, second = _names(state)[:2]
 
     system = SystemMessage(
         content=(
@@ -178,7 +312,7 @@ def recommend(state: RecommenderState) -> dict:
             "Here is an example of a perfect response:\n\n"
             "## Prison Break\n\n"
             "This high-tension thriller is perfect for your adventurous mood tonight. "
-            "Mora loved the suspense in Breaking Bad and your girlfriend enjoyed the fast pacing of Money Heist, "
+            f"{first} loved the suspense in Breaking Bad and {second} enjoyed the fast pacing of Money Heist, "
             "so the constant cliffhangers and clever plotting in Prison Break should hit the same sweet spot for both of you.\n\n"
             "### Available on: `Netflix`"
         )
@@ -196,7 +330,9 @@ def recommend(state: RecommenderState) -> dict:
         )
     )
 
-    response = _llm.invoke([system, human])
+    with span("llm.recommend") as current:
+        response = _get_llm().invoke([system, human])
+        _record_usage("recommend", response, current)
     final_content = response.content
 
     if isinstance(final_content, list):
@@ -221,16 +357,40 @@ def route_after_search(state: RecommenderState) -> str:
     return "ask_nostalgic"
 
 
-def build_graph():
-    graph = StateGraph(RecommenderState)  # type: ignore[arg-type]
+def _traced_node(name: str, fn):
+    """Wrap a node in a span tagged with the graph thread it runs for."""
+
+    def node(state: RecommenderState, config: RunnableConfig) -> dict:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        with thread_scope(thread_id), span(f"node.{name}"):
+            return fn(state)
+
+    return node
+
 
-    graph.add_node("ask_mood", ask_mood)
-    graph.add_node("ask_type", ask_type)
-    graph.add_node("ask_genres", ask_genres)
-    graph.add_node("search_db", search_db)
-    graph.add_node("ask_nostalgic", ask_nostalgic)
-    graph.add_node("check_availability", check_availability)
-    graph.add_node("recommend", recommend)
+def _checkpointer() -> BaseCheckpointSaver:
+    if CHECKPOINTER == "supabase":
+        from app.checkpoints import SupabaseSaver
+
+        return SupabaseSaver()
+    return MemorySaver()
+
+
+def build_graph(checkpointer: BaseCheckpointSaver | None = None):
+    # ty doesn't match a TypedDict class against langgraph's StateLike bound.
+    graph = StateGraph(RecommenderState)  # ty: ignore[invalid-argument-type]
+
+    nodes = {
+        "ask_mood": ask_mood,
+        "ask_type": ask_type,
+        "ask_genres": ask_genres,
+        "search_db": search_db,
+        "ask_nostalgic": ask_nostalgic,
+        "check_availability": check_availability,
+        "recommend": recommend,
+    }
+    for name, fn in nodes.items():
+        graph.add_node(name, _traced_node(name, fn))
 
     graph.set_entry_point("ask_mood")
     graph.add_edge("ask_mood", "ask_type")
@@ -249,8 +409,103 @@ def build_graph():
         },
     )
 
-    checkpointer = MemorySaver()
-    return graph.compile(checkpointer=checkpointer)
+    return graph.compile(checkpointer=checkpointer or _checkpointer())
+
+
+_recommender = None
+# MemorySaver keeps every session's checkpoints in this worker's memory.
+profiling.track(
+    "agent.checkpointer", lambda: getattr(_recommender, "checkpointer", None)
+)
+
+
+def get_recommender():
+    """The compiled graph, built on first use."""
+    global _recommender
+    if _recommender is None:
+        with _init_lock:
+            if _recommender is None:
+                _recommender = build_graph()
+    return _recommender
+
+
+def close() -> None:
+    """Write out checkpoints the graph's checkpointer still buffers."""
+    checkpointer = getattr(_recommender, "checkpointer", None)
+    if hasattr(checkpointer, "close"):
+        checkpointer.close()
+
+
+def initial_state(
+    region: str = DEFAULT_REGION,
+    household: str = DEFAULT_HOUSEHOLD,
+    names: list[str] | None = None,
+) -> RecommenderState:
+    return {
+        "mood": [],
+        "media_type": None,
+        "genres": [],
+        "nostalgic_title": None,
+        "search_results": [],
+        "recommendation": None,
+        "asked_nostalgic": False,
+        "availability_info": None,
+        "watch_context": None,
+        "region": region,
+        "household": household,
+        "names": names or DEFAULT_PARTNER_NAMES,
+    }
+
+
+def begin_thread(
+    config: RunnableConfig,
+    region: str,
+    mood_answer: str,
+    household: str = DEFAULT_HOUSEHOLD,
+) -> None:
+    """Write a thread's first checkpoint as if ask_mood had just been answered.
+
+    /recommend/start asks the mood question without touching the graph, so a
+    thread only exists once its first reply arrives. Resuming from here with
+    ``stream(None, config)`` runs on to the next question. The household's
+    partner names are read once here and kept in the thread's state.
+    """
+    state = {
+        **initial_state(region, household, partner_names(household)),
+        "mood": _split_answer(mood_answer),
+    }
+    get_recommender().update_state(config, state, as_node="ask_mood")
+
+
+_speculative = Speculator("search", workers=SPECULATIVE_WORKERS)
+profiling.track("agent.speculations", lambda: _speculative._pending)
+
+
+def speculate(thread_id: str, config: RunnableConfig) -> None:
+    """Start search_db's work for a thread that is waiting on an answer.
+
+    Only the type and genre questions come before the search. The guess is
+    the answers so far with no genre preference; search_db uses it if that is
+    how the user answers and searches again otherwise. The thread's state is
+    only read when speculation is on.
+    """
+    if not SPECULATIVE_SEARCH:
+        return
+    snapshot = get_recommender().get_state(config)
+    if not set(snapshot.next) & {"ask_type", "ask_genres"}:
+        return
+    state = snapshot.values
+    args = _search_args(
+        state.get("mood", []),
+        state.get("media_type"),
+        [],
+        state.get("household"),
+        state.get("nostalgic_title"),
+    )
+    _speculative.submit(thread_id, args, _run_search, args)
 
 
-recommender = build_graph()
+def warm_up() -> None:
+    """Build the chat model and graph ahead of the first recommendation."""
+    _get_llm_with_tools()
+    get_recommender()
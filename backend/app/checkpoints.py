@@ -0,0 +1,342 @@
+"""LangGraph checkpoints stored in Supabase, written in batches.
+
+MemorySaver keeps each thread in the memory of the worker that ran it.
+SupabaseSaver stores them in the ``graph_checkpoints`` and
+``graph_checkpoint_writes`` tables (see the README), so sessions survive
+restarts and any worker can serve any reply.
+
+A graph run saves a checkpoint after every step, plus the writes of every
+task. Rather than one round trip each, puts go into a buffer that is upserted
+in one request per table once ``batch_size`` rows are pending, or
+``flush_ms`` after the first of them arrived (a background thread flushes).
+``flush_ms=0`` writes each put through, and so does ``durability="sync"``,
+where a step's checkpoint must be stored before the next step starts. Reads
+flush first, so a worker always sees its own writes; other workers see them
+within ``flush_ms``, far less than anyone takes to answer a question.
+
+While the database is down, rows that fail to write stay pending, up to
+``max_pending``; past that, the batch that failed is dropped (and counted)
+so the buffer can't grow without bound. close() stops the background
+thread and writes what is left.
+"""
+
+import asyncio
+import base64
+import threading
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from app.config import (
+    CHECKPOINT_BATCH_SIZE,
+    CHECKPOINT_DURABILITY,
+    CHECKPOINT_FLUSH_MS,
+    CHECKPOINT_MAX_PENDING,
+)
+from app.database import (
+    delete_checkpoints,
+    load_checkpoint_writes,
+    load_checkpoints,
+    save_checkpoints,
+)
+from app.metrics import Counter
+
+_FLUSH_FAILURES = Counter(
+    "popchoice_checkpoint_flush_failures_total",
+    "Background checkpoint flushes that failed after retries (rows stay pending).",
+)
+_DROPPED_ROWS = Counter(
+    "popchoice_checkpoint_rows_dropped_total",
+    "Checkpoint rows dropped after a failed flush left too many pending.",
+)
+
+# Pending rows by primary key, so saving the same row twice sends it once.
+_Pending = dict[tuple, dict]
+
+
+class SupabaseSaver(BaseCheckpointSaver[str]):
+    def __init__(
+        self,
+        batch_size: int = CHECKPOINT_BATCH_SIZE,
+        flush_ms: float = CHECKPOINT_FLUSH_MS,
+        durability: str = CHECKPOINT_DURABILITY,
+        max_pending: int = CHECKPOINT_MAX_PENDING,
+    ) -> None:
+        super().__init__()
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.write_through = flush_ms <= 0 or durability == "sync"
+        self.max_pending = max_pending
+        self._checkpoints: _Pending = {}
+        self._writes: _Pending = {}
+        self._lock = threading.Lock()
+        # Flushes run one at a time, so an older batch can't land after a
+        # newer one.
+        self._flush_lock = threading.Lock()
+        self._has_pending = threading.Event()
+        # Started on first use, so pre-forked workers each start their own.
+        self._flusher: threading.Thread | None = None
+        self._closed = threading.Event()
+
+    # -- serialization -----------------------------------------------------
+
+    def _dump(self, value: Any) -> str:
+        kind, data = self.serde.dumps_typed(value)
+        return f"{kind}:{base64.b64encode(data).decode()}"
+
+    def _load(self, text: str) -> Any:
+        kind, _, data = text.partition(":")
+        return self.serde.loads_typed((kind, base64.b64decode(data)))
+
+    # -- write buffer ------------------------------------------------------
+
+    def _enqueue(self, checkpoints: _Pending, writes: _Pending) -> None:
+        with self._lock:
+            self._checkpoints.update(checkpoints)
+            self._writes.update(writes)
+            pending = len(self._checkpoints) + len(self._writes)
+            self._has_pending.set()
+            write_through = self.write_through or self._closed.is_set()
+            if self._flusher is None and not write_through:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically,
+                    name="checkpoint-flush",
+                    daemon=True,
+                )
+                self._flusher.start()
+        if write_through or pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write every pending row now. Rows that fail to write stay pending,
+        unless that would leave more than ``max_pending``; then they are
+        dropped. Either way the error is raised."""
+        with self._flush_lock:
+            with self._lock:
+                checkpoints, self._checkpoints = self._checkpoints, {}
+                writes, self._writes = self._writes, {}
+                self._has_pending.clear()
+            if not checkpoints and not writes:
+                return
+            try:
+                save_checkpoints(list(checkpoints.values()), list(writes.values()))
+            except Exception:
+                with self._lock:
+                    failed = len(checkpoints) + len(writes)
+                    queued = len(self._checkpoints) + len(self._writes)
+                    if failed + queued > self.max_pending:
+                        _DROPPED_ROWS.inc(failed)
+                    else:
+                        # Newer copies of the same rows, queued meanwhile, win.
+                        self._checkpoints = {**checkpoints, **self._checkpoints}
+                        self._writes = {**writes, **self._writes}
+                        self._has_pending.set()
+                raise
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.is_set():
+            self._has_pending.wait()
+            if self._closed.wait(self.flush_interval):
+                return
+            try:
+                self.flush()
+            except Exception:
+                # Still pending: the next read or flush tries again.
+                _FLUSH_FAILURES.inc()
+                self._closed.wait(self.flush_interval)
+
+    def close(self) -> None:
+        """Stop the background flush and write what is pending. Later puts
+        are written through."""
+        with self._lock:
+            self._closed.set()
+            flusher, self._flusher = self._flusher, None
+            self._has_pending.set()
+        if flusher is not None:
+            flusher.join()
+        self.flush()
+
+    # -- BaseCheckpointSaver -----------------------------------------------
+
+    def _tuple(self, row: dict) -> CheckpointTuple:
+        thread_id, ns = row["thread_id"], row["checkpoint_ns"]
+        writes = load_checkpoint_writes(thread_id, ns, row["checkpoint_id"])
+        parent_id = row.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": ns,
+                    "checkpoint_id": row["checkpoint_id"],
+                }
+            },
+            checkpoint=self._load(row["checkpoint"]),
+            metadata=self._load(row["metadata"]),
+            pending_writes=[
+                (w["task_id"], w["channel"], self._load(w["value"])) for w in writes
+            ],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        self.flush()
+        configurable = config["configurable"]
+        rows = load_checkpoints(
+            configurable["thread_id"],
+            configurable.get("checkpoint_ns", ""),
+            checkpoint_id=get_checkpoint_id(config),
+            limit=1,
+        )
+        return self._tuple(rows[0]) if rows else None
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        self.flush()
+        configurable = config["configurable"] if config else {}
+        rows = load_checkpoints(
+            configurable.get("thread_id"),
+            configurable.get("checkpoint_ns"),
+            checkpoint_id=get_checkpoint_id(config) if config else None,
+            before=get_checkpoint_id(before) if before else None,
+            # A metadata filter is applied here, after the limit would have cut.
+            limit=None if filter else limit,
+        )
+        returned = 0
+        for row in rows:
+            if filter:
+                metadata = self._load(row["metadata"])
+                if any(metadata.get(k) != v for k, v in filter.items()):
+                    continue
+            yield self._tuple(row)
+            returned += 1
+            if limit is not None and returned >= limit:
+                return
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        ns = configurable.get("checkpoint_ns", "")
+        row = {
+            "thread_id": thread_id,
+            "checkpoint_ns": ns,
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": configurable.get("checkpoint_id"),
+            "checkpoint": self._dump(checkpoint),
+            "metadata": self._dump(get_checkpoint_metadata(config, metadata)),
+        }
+        self._enqueue({(thread_id, ns, checkpoint["id"]): row}, {})
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        configurable = config["configurable"]
+        key = (
+            configurable["thread_id"],
+            configurable.get("checkpoint_ns", ""),
+            configurable["checkpoint_id"],
+        )
+        rows = {}
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            rows[(*key, task_id, idx)] = {
+                "thread_id": key[0],
+                "checkpoint_ns": key[1],
+                "checkpoint_id": key[2],
+                "task_id": task_id,
+                "task_path": task_path,
+                "idx": idx,
+                "channel": channel,
+                "value": self._dump(value),
+            }
+        self._enqueue({}, rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.flush()
+        delete_checkpoints(thread_id)
+
+    # The graph runs synchronously in a worker thread; these serve async
+    # callers (astream, aget_state) from the same implementation.
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(
+            lambda: [*self.list(config, filter=filter, before=before, limit=limit)]
+        )
+        for item in tuples:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
@@ -1,10 +1,171 @@
 import os
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _choice(name: str, default: str, choices: tuple[str, ...]) -> str:
+    """``name`` from the environment, lowercased. A value outside ``choices``
+    fails at startup instead of on first use."""
+    value = os.environ.get(name, default).lower()
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}, not {value!r}")
+    return value
+
+
 SUPABASE_URL = os.environ["SUPABASE_URL"]
 SUPABASE_KEY = os.environ["SUPABASE_ANON_KEY"]
 ANTHROPIC_API_KEY = os.environ["ANTHROPIC_API_KEY"]
 TMDB_API_KEY = os.environ["TMDB_API_KEY"]
 API_SECRET = os.environ["API_SECRET"]
+
+# Overridable so benchmarks can point the TMDB client at a local stub.
+TMDB_BASE_URL = os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+
+# TMDB request timeouts per endpoint (connect, then each read). Genre lists
+# are refreshed in the background, so they can afford to wait longer.
+TMDB_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get("TMDB_CONNECT_TIMEOUT_SECONDS", "2")
+)
+TMDB_SEARCH_TIMEOUT_SECONDS = float(os.environ.get("TMDB_SEARCH_TIMEOUT_SECONDS", "3"))
+TMDB_PROVIDERS_TIMEOUT_SECONDS = float(
+    os.environ.get("TMDB_PROVIDERS_TIMEOUT_SECONDS", "3")
+)
+TMDB_GENRES_TIMEOUT_SECONDS = float(os.environ.get("TMDB_GENRES_TIMEOUT_SECONDS", "10"))
+
+# Requests per second this process sends to TMDB (TMDB allows about 50 per IP;
+# split it between workers). 0 disables the limit.
+TMDB_MAX_RPS = float(os.environ.get("TMDB_MAX_RPS", "40"))
+
+# Hedged TMDB requests (off by default: hedges count against TMDB's rate
+# limit). With TMDB_HEDGE=1, a search or provider lookup that hasn't answered
+# within that endpoint's recent p95 latency (TMDB_HEDGE_DELAY_MS until enough
+# requests were seen, never below TMDB_HEDGE_MIN_DELAY_MS) is sent again and
+# the first answer wins. TMDB_HEDGE_WORKERS threads per worker send them.
+TMDB_HEDGE = os.environ.get("TMDB_HEDGE", "0") != "0"
+TMDB_HEDGE_DELAY_MS = float(os.environ.get("TMDB_HEDGE_DELAY_MS", "250"))
+TMDB_HEDGE_MIN_DELAY_MS = float(os.environ.get("TMDB_HEDGE_MIN_DELAY_MS", "20"))
+TMDB_HEDGE_WORKERS = int(os.environ.get("TMDB_HEDGE_WORKERS", "32"))
+
+# Streaming availability is checked for the region a session was started
+# with (POST /recommend/start {"region": "DE"}), or this ISO 3166-1 code.
+DEFAULT_REGION = os.environ.get("DEFAULT_REGION", "RO").upper()
+
+# Households (tenants). Each request names its household in the
+# X-Household-Id header; requests without one belong to DEFAULT_HOUSEHOLD, so
+# a single-household deployment needs no changes. The partners' names used in
+# prompts come from the households table, or DEFAULT_PARTNER_NAMES for a
+# household without a row there. Each worker keeps the lexical index of at
+# most LEXICAL_INDEX_CACHE_SIZE households, evicting the least recently
+# searched.
+DEFAULT_HOUSEHOLD = os.environ.get("DEFAULT_HOUSEHOLD", "default")
+DEFAULT_PARTNER_NAMES = [
+    name.strip()
+    for name in os.environ.get("DEFAULT_PARTNER_NAMES", "Mora,GF").split(",")
+]
+LEXICAL_INDEX_CACHE_SIZE = int(os.environ.get("LEXICAL_INDEX_CACHE_SIZE", "64"))
+
+# Supabase (PostgREST) connection pool, shared by every request thread and, in
+# a second pool, by async endpoints: size it to the server threadpool (40 by
+# default) and keep idle connections long enough to reuse between requests.
+# SUPABASE_TIMEOUT_SECONDS bounds one call; transient failures (connection
+# errors, PostgREST's PGRST00x, gateway 5xx) are retried up to DB_MAX_RETRIES
+# times with jittered exponential backoff from DB_RETRY_BACKOFF_MS.
+SUPABASE_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_MAX_CONNECTIONS", "40"))
+SUPABASE_KEEPALIVE_SECONDS = float(os.environ.get("SUPABASE_KEEPALIVE_SECONDS", "30"))
+SUPABASE_TIMEOUT_SECONDS = float(os.environ.get("SUPABASE_TIMEOUT_SECONDS", "15"))
+DB_MAX_RETRIES = int(os.environ.get("DB_MAX_RETRIES", "3"))
+DB_RETRY_BACKOFF_MS = float(os.environ.get("DB_RETRY_BACKOFF_MS", "100"))
+
+# Load the embedding model, chat model and graph in a background thread at
+# startup. Set to 0 for scale-to-zero deployments, where first-request latency
+# matters more than having everything hot: they then load on first use.
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") != "0"
+
+# Embedding micro-batching: concurrent embed() calls are grouped into one
+# model forward pass of up to EMBED_MAX_BATCH_SIZE texts, waiting at most
+# EMBED_MAX_WAIT_MS for the batch to fill.
+EMBED_MAX_BATCH_SIZE = int(os.environ.get("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.environ.get("EMBED_MAX_WAIT_MS", "2"))
+
+# Storage precision for embedding vectors: "float32" or "float16" (pair the
+# latter with a pgvector ``halfvec`` column).
+EMBEDDING_DTYPE = os.environ.get("EMBEDDING_DTYPE", "float32")
+
+# Sentence-transformer used for new embeddings. While rows are being re-indexed
+# onto a new model, set EMBEDDING_PREVIOUS_MODEL to the old one so searches
+# read from both until the re-index finishes (then unset it to cut over).
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_PREVIOUS_MODEL = os.environ.get("EMBEDDING_PREVIOUS_MODEL") or None
+
+# Responses smaller than this many bytes are sent uncompressed; gzip overhead
+# outweighs the savings on tiny JSON bodies.
+GZIP_MIN_BYTES = int(os.environ.get("GZIP_MIN_BYTES", "1024"))
+
+# /recommend/reply: merge streamed tokens into at most one SSE event per
+# SSE_COALESCE_MS (0 sends every token as its own event), flushing early once
+# SSE_COALESCE_MAX_CHARS are pending. Trades a little smoothness for fewer
+# frames when many streams run at high token rates.
+SSE_COALESCE_MS = float(os.environ.get("SSE_COALESCE_MS", "0"))
+SSE_COALESCE_MAX_CHARS = int(os.environ.get("SSE_COALESCE_MAX_CHARS", "1024"))
+
+# Admission control for recommendation graph runs (/recommend/reply),
+# separate from /search and /media: at most
+# GRAPH_MAX_CONCURRENCY run at once per worker, up to GRAPH_MAX_QUEUE more wait
+# for a slot for at most GRAPH_QUEUE_TIMEOUT_SECONDS, and the rest get a 503
+# with Retry-After: GRAPH_RETRY_AFTER_SECONDS.
+GRAPH_MAX_CONCURRENCY = int(os.environ.get("GRAPH_MAX_CONCURRENCY", "8"))
+GRAPH_MAX_QUEUE = int(os.environ.get("GRAPH_MAX_QUEUE", "16"))
+GRAPH_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("GRAPH_QUEUE_TIMEOUT_SECONDS", "10"))
+GRAPH_RETRY_AFTER_SECONDS = int(os.environ.get("GRAPH_RETRY_AFTER_SECONDS", "5"))
+
+# Graph checkpoints. CHECKPOINTER "memory" keeps each session in the worker
+# that started it (lost on restart; needs sticky routing across workers);
+# "supabase" stores them in the graph_checkpoints tables, upserting buffered
+# writes together once CHECKPOINT_BATCH_SIZE rows are pending or
+# CHECKPOINT_FLUSH_MS after the first (0 writes each one through).
+# CHECKPOINT_DURABILITY is when a graph run saves its steps: "sync" before the
+# next step starts (written through), "async" while it runs (LangGraph's
+# default) or "exit" only when the run stops at a question or finishes.
+# While writes fail, up to CHECKPOINT_MAX_PENDING rows are kept to retry;
+# past that, failed batches are dropped.
+CHECKPOINTER = _choice("CHECKPOINTER", "memory", ("memory", "supabase"))
+CHECKPOINT_DURABILITY = _choice(
+    "CHECKPOINT_DURABILITY", "async", ("sync", "async", "exit")
+)
+CHECKPOINT_BATCH_SIZE = int(os.environ.get("CHECKPOINT_BATCH_SIZE", "64"))
+CHECKPOINT_FLUSH_MS = float(os.environ.get("CHECKPOINT_FLUSH_MS", "20"))
+CHECKPOINT_MAX_PENDING = int(os.environ.get("CHECKPOINT_MAX_PENDING", "10000"))
+
+# Bulk imports (POST /media/import): up to IMPORT_TMDB_CONCURRENCY titles are
+# looked up on TMDB at once (within TMDB_MAX_RPS), and resolved titles are
+# embedded and inserted IMPORT_BATCH_SIZE at a time.
+IMPORT_TMDB_CONCURRENCY = int(os.environ.get("IMPORT_TMDB_CONCURRENCY", "16"))
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "64"))
+
+# Token budget for the watch-history block of the recommendation prompts
+# (app.context): longer reviews are cut down to their most relevant sentences
+# and the lowest-ranked hits dropped, so prompt size stays flat as reviews grow.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1000"))
+
+# Speculative search: after each question, search for the likeliest final
+# query (the answers so far, no genre preference) on up to SPECULATIVE_WORKERS
+# background threads, so the last answer finds it done. Set to 0 to disable.
+SPECULATIVE_SEARCH = os.environ.get("SPECULATIVE_SEARCH", "1") != "0"
+SPECULATIVE_WORKERS = int(os.environ.get("SPECULATIVE_WORKERS", "4"))
+
+# Span exporter for app.tracing: "none", "console" (readable lines on stderr),
+# "json" (one JSON object per span on stderr) or "otel" (OpenTelemetry API,
+# which must be installed separately: `uv pip install opentelemetry-api` plus an
+# SDK/exporter, configured through the usual OTEL_* environment variables).
+TRACING_EXPORTER = _choice(
+    "TRACING_EXPORTER", "none", ("none", "console", "json", "otel")
+)
+
+# Admin endpoints (/admin/*: memory report, tracemalloc snapshots, CPU
+# profiles) are off unless ADMIN_SECRET is set, and then also need it in an
+# X-Admin-Secret header on top of the API bearer token. A CPU profile runs for
+# at most PROFILE_MAX_SECONDS.
+ADMIN_SECRET = os.environ.get("ADMIN_SECRET", "")
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
@@ -0,0 +1,142 @@
+"""The watch-history block of the recommendation prompts, within a token budget.
+
+Each search hit becomes one line: title, type and rating, then both reviews.
+Reviews are free text of any length, so build_watch_context fits the block
+into ``budget`` tokens: hits keep their search order and are dropped from the
+end once even their title line no longer fits, and the budget left after the
+title lines is shared between the reviews (a short review's unused share goes
+to the longer ones). A review over its share keeps the sentences that share
+the most words with the session's answers, in their original order.
+
+Tokens are estimated at four characters each, close enough for English text
+with Claude's tokenizer; the model's own count of every prompt is recorded in
+``popchoice_llm_input_tokens``.
+"""
+
+import math
+import re
+from collections.abc import Sequence
+from itertools import pairwise
+
+from app.config import DEFAULT_PARTNER_NAMES
+from app.database import SearchHit
+from app.retrieval import tokenize
+
+NO_MATCHES = "No strong matches found in their watch history."
+
+_CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_ELLIPSIS = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def _header(hit: SearchHit) -> str:
+    rating = hit.get("user_rating") or "?"
+    return f"- {hit['title']} ({hit['type']}, rated {rating}/10): "
+
+
+def _line(header: str, user_review: str, gf_review: str, names: Sequence[str]) -> str:
+    return f'{header}{names[0]} said "{user_review}". {names[1]} said "{gf_review}".'
+
+
+def _cut(text: str, max_chars: int) -> str:
+    """``text`` cut at a word boundary to at most ``max_chars``."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[: max(max_chars - len(_ELLIPSIS), 0)].rsplit(" ", 1)[0]
+    return cut + _ELLIPSIS if cut else ""
+
+
+def compact_review(review: str, max_chars: int, terms: set[str]) -> str:
+    """The sentences of ``review`` most relevant to ``terms`` that fit in
+    ``max_chars``, in their original order. Ties go to earlier sentences."""
+    if len(review) <= max_chars:
+        return review
+    sentences = [s for s in _SENTENCE_END.split(review.strip()) if s]
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(terms & set(tokenize(sentences[i]))), i),
+    )
+    kept: list[int] = []
+    used = 0
+    for i in ranked:
+        # One character joins each sentence to the next.
+        cost = len(sentences[i]) + (1 if kept else 0)
+        if used + cost <= max_chars:
+            kept.append(i)
+            used += cost
+    if not kept:
+        return _cut(sentences[ranked[0]], max_chars)
+
+    kept.sort()
+    parts = [sentences[kept[0]]]
+    for previous, i in pairwise(kept):
+        # Mark skipped sentences when there is room for the marker.
+        if i > previous + 1 and used + len(_ELLIPSIS) + 1 <= max_chars:
+            parts.append(_ELLIPSIS)
+            used += len(_ELLIPSIS) + 1
+        parts.append(sentences[i])
+    return " ".join(parts)
+
+
+def _shares(lengths: list[int], total: int) -> list[int]:
+    """Split ``total`` characters between texts of ``lengths``: each gets an
+    equal share, and what short texts leave unused goes to the longer ones."""
+    shares = [0] * len(lengths)
+    remaining = total
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for position, i in enumerate(order):
+        share = min(lengths[i], remaining // (len(order) - position))
+        shares[i] = share
+        remaining -= share
+    return shares
+
+
+def build_watch_context(
+    hits: Sequence[SearchHit],
+    budget: int,
+    query: Sequence[str] = (),
+    names: Sequence[str] = DEFAULT_PARTNER_NAMES,
+) -> str:
+    """The watch-history lines for ``hits`` in at most ``budget`` tokens.
+
+    ``query`` is the session's answers (moods, genres, nostalgic title);
+    reviews that don't fit whole keep the sentences matching them. ``names``
+    are the two partners whose reviews these are.
+    """
+    if not hits:
+        return NO_MATCHES
+
+    max_chars = budget * _CHARS_PER_TOKEN
+    headers: list[str] = []
+    used = 0
+    for hit in hits:
+        # The line around the reviews, plus the newline before the next one.
+        size = len(_line(_header(hit), "", "", names)) + 1
+        if used + size > max_chars:
+            break
+        headers.append(_header(hit))
+        used += size
+    if not headers:
+        return NO_MATCHES
+
+    reviews = [
+        (review or "").strip()
+        for hit in hits[: len(headers)]
+        for review in (hit.get("user_review"), hit.get("gf_review"))
+    ]
+    shares = _shares([len(r) for r in reviews], max_chars - used)
+    terms = set(tokenize(" ".join(query)))
+    compacted = [
+        compact_review(review, share, terms)
+        for review, share in zip(reviews, shares, strict=True)
+    ]
+    return "\n".join(
+        _line(header, compacted[2 * i], compacted[2 * i + 1], names)
+        for i, header in enumerate(headers)
+    )
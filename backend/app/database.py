@@ -1,30 +1,629 @@
-from supabase import create_client, Client
-from app.config import SUPABASE_URL, SUPABASE_KEY
-from app.embeddings import build_embedding_text, embed
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Iterator, Mapping
+from typing import TYPE_CHECKING, Any, TypedDict
 
-_client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+import httpx
+import numpy as np
 
+from app import profiling
+from app.config import (
+    DB_MAX_RETRIES,
+    DB_RETRY_BACKOFF_MS,
+    DEFAULT_HOUSEHOLD,
+    DEFAULT_PARTNER_NAMES,
+    EMBEDDING_MODEL,
+    EMBEDDING_PREVIOUS_MODEL,
+    SUPABASE_KEEPALIVE_SECONDS,
+    SUPABASE_KEY,
+    SUPABASE_MAX_CONNECTIONS,
+    SUPABASE_TIMEOUT_SECONDS,
+    SUPABASE_URL,
+)
+from app.embeddings import (
+    TEMPLATE_VERSION,
+    build_embedding_text,
+    content_hash,
+    embed,
+    embed_batch,
+    to_pgvector,
+)
+from app.metrics import Counter
+from app.tracing import traced
 
-def add_media(entry: dict) -> dict:
+if TYPE_CHECKING:
+    from supabase import AsyncClient, Client
+
+
+def _pool_settings() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_MAX_CONNECTIONS,
+            keepalive_expiry=SUPABASE_KEEPALIVE_SECONDS,
+        ),
+        "timeout": httpx.Timeout(SUPABASE_TIMEOUT_SECONDS, connect=5.0),
+    }
+
+
+# Created on first use: importing supabase and building the client is a
+# noticeable part of cold start, and /search never needs it.
+_client: "Client | None" = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> "Client":
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from supabase import ClientOptions, create_client
+
+                options = ClientOptions(httpx_client=httpx.Client(**_pool_settings()))
+                _client = create_client(SUPABASE_URL, SUPABASE_KEY, options)
+    return _client
+
+
+# The async client's pool belongs to the event loop that first used it: one
+# per worker under uvicorn. close_async_client() releases it at shutdown.
+_async_client: "AsyncClient | None" = None
+_async_client_lock = asyncio.Lock()
+
+
+async def get_async_client() -> "AsyncClient":
+    global _async_client
+    if _async_client is None:
+        async with _async_client_lock:
+            if _async_client is None:
+                from supabase import AsyncClientOptions, acreate_client
+
+                options = AsyncClientOptions(
+                    httpx_client=httpx.AsyncClient(**_pool_settings())
+                )
+                _async_client = await acreate_client(
+                    SUPABASE_URL, SUPABASE_KEY, options
+                )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None and client.options.httpx_client is not None:
+        await client.options.httpx_client.aclose()
+
+
+# ---------------------------------------------------------------------------
+# Retries
+# ---------------------------------------------------------------------------
+
+_RETRIES = Counter(
+    "popchoice_db_retries_total",
+    "Supabase calls retried after a transient failure, by operation.",
+    labels=("op",),
+)
+
+# The request never reached PostgREST, so retrying can't apply a write twice.
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# PostgREST couldn't get a database connection (PGRST000-003), or Postgres
+# rolled the transaction back and asks for a retry (serialization failure,
+# deadlock): nothing was applied either way.
+_RETRYABLE_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "40001", "40P01"}
+# Gateway errors without a PostgREST body: the statement may or may not have
+# run, so only reads and upserts are retried on these.
+_GATEWAY_STATUSES = {"502", "503", "504", "520"}
+
+
+def _is_transient(exc: Exception, idempotent: bool) -> bool:
+    if isinstance(exc, _NOT_SENT):
+        return True
+    from postgrest.exceptions import APIError
+
+    if isinstance(exc, APIError):
+        code = str(exc.code)
+        return code in _RETRYABLE_CODES or (idempotent and code in _GATEWAY_STATUSES)
+    return idempotent and isinstance(exc, httpx.TransportError)
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff, in seconds, capped at 2s."""
+    return random.uniform(0, min(2.0, DB_RETRY_BACKOFF_MS / 1000 * 2**attempt))
+
+
+def _execute(op: str, query: Any, idempotent: bool = True) -> Any:
+    """``query.execute()``, retrying transient failures up to DB_MAX_RETRIES."""
+    attempt = 0
+    while True:
+        try:
+            return query.execute()
+        except Exception as exc:
+            if attempt >= DB_MAX_RETRIES or not _is_transient(exc, idempotent):
+                raise
+        _RETRIES.inc(op=op)
+        time.sleep(_backoff(attempt))
+        attempt += 1
+
+
+async def _aexecute(op: str, query: Any, idempotent: bool = True) -> Any:
+    """Async counterpart of _execute, for queries built on the async client."""
+    attempt = 0
+    while True:
+        try:
+            return await query.execute()
+        except Exception as exc:
+            if attempt >= DB_MAX_RETRIES or not _is_transient(exc, idempotent):
+                raise
+        _RETRIES.inc(op=op)
+        await asyncio.sleep(_backoff(attempt))
+        attempt += 1
+
+
+# Everything build_embedding_text reads, plus the primary key and household, so
+# a row fetched with these columns can be re-embedded and written back whole.
+_MEDIA_COLUMNS = (
+    "id,household_id,tmdb_id,title,type,genres,description,"
+    "user_rating,gf_rating,user_review,gf_review"
+)
+
+
+# Bumped on every write to a household's library, so in-process caches built
+# from it (e.g. its lexical index in app.retrieval) know to rebuild.
+_library_versions: dict[str, int] = {}
+
+
+def library_version(household: str = DEFAULT_HOUSEHOLD) -> int:
+    return _library_versions.get(household, 0)
+
+
+def _bump_library_version(household: str) -> None:
+    _library_versions[household] = _library_versions.get(household, 0) + 1
+
+
+def _embedding_fields(vector: np.ndarray, text: str) -> dict:
+    return {
+        "embedding": to_pgvector(vector),
+        "embedding_model": EMBEDDING_MODEL,
+        "embedding_version": TEMPLATE_VERSION,
+        "content_hash": content_hash(text),
+    }
+
+
+def _media_row(entry: dict) -> dict:
     text = build_embedding_text(entry)
-    vector = embed(text)
+    return {**entry, **_embedding_fields(embed(text), text)}
+
+
+# ---------------------------------------------------------------------------
+# Library writes, deduplicated on media_key
+# ---------------------------------------------------------------------------
+
+# What _plan compares an entry against: every column a write may set.
+_STORED_COLUMNS = _MEDIA_COLUMNS + ",media_key,content_hash,embedding_model"
+
+# The unique key library writes upsert on.
+_CONFLICT_KEY = "household_id,media_key"
+
+_MEDIA_WRITES = Counter(
+    "popchoice_media_writes_total",
+    "Library writes by outcome: added, reembedded, updated (without a new "
+    "embedding) or unchanged (nothing written).",
+    labels=("result",),
+)
+
 
-    row = {**entry, "embedding": vector}
+def media_key(entry: dict) -> str:
+    """The identity library entries are deduplicated on: the TMDB id when
+    known, else the title with case and whitespace normalized, within the
+    entry's type."""
+    if entry.get("tmdb_id") is not None:
+        return f"tmdb:{entry['type']}:{entry['tmdb_id']}"
+    return f"title:{entry['type']}:{' '.join(entry['title'].lower().split())}"
 
-    result = _client.table("watched_media").insert(row).execute()
-    return result.data[0]
 
+def _plan(entry: dict, stored: dict | None, household: str) -> tuple[str, dict]:
+    """Compare ``entry`` with the row stored under its key in ``household``'s
+    library (None if there is none), and return the outcome and what to write.
 
-def search_similar(query: str, limit: int = 5) -> list[dict]:
-    query_vector = embed(query)
+    "added" and "reembedded" return the full row, still to be embedded.
+    "updated" returns only the changed columns: the embedded text is the
+    same, so the stored embedding stays. "unchanged" returns the stored row.
+    """
+    row = {**entry, "household_id": household, "media_key": media_key(entry)}
+    if stored is None:
+        return "added", row
+    if (
+        stored.get("content_hash") != content_hash(build_embedding_text(row))
+        or stored.get("embedding_model") != EMBEDDING_MODEL
+    ):
+        return "reembedded", row
+    changed = {k: v for k, v in row.items() if stored.get(k) != v}
+    return ("updated", changed) if changed else ("unchanged", stored)
 
-    result = _client.rpc(
+
+def _stored_query(client: Any, household: str, keys: list[str]) -> Any:
+    return (
+        client.table("watched_media")
+        .select(_STORED_COLUMNS)
+        .eq("household_id", household)
+        .in_("media_key", keys)
+    )
+
+
+def _write_query(client: Any, outcome: str, row: dict, household: str, key: str) -> Any:
+    table = client.table("watched_media")
+    if outcome == "updated":
+        return table.update(row).eq("household_id", household).eq("media_key", key)
+    return table.upsert(row, on_conflict=_CONFLICT_KEY)
+
+
+@traced("db.add_media")
+def add_media(entry: dict, household: str = DEFAULT_HOUSEHOLD) -> dict:
+    """Add ``entry`` to ``household``'s library, or update the row stored
+    under its media_key. The model runs only if the embedded text changed,
+    and an entry identical to its row isn't written at all."""
+    key = media_key(entry)
+    query = _stored_query(get_client(), household, [key])
+    stored = _execute("stored_media", query).data
+    outcome, row = _plan(entry, stored[0] if stored else None, household)
+    if outcome == "unchanged":
+        _MEDIA_WRITES.inc(result=outcome)
+        return row
+    if outcome == "updated":
+        query = _write_query(get_client(), outcome, row, household, key)
+        written = _execute("add_media", query).data
+        if not written:
+            # The row was deleted since the lookup: add the entry afresh.
+            outcome, row = _plan(entry, None, household)
+    if outcome != "updated":
+        row = _media_row(row)
+        query = _write_query(get_client(), outcome, row, household, key)
+        written = _execute("add_media", query).data
+    _MEDIA_WRITES.inc(result=outcome)
+    _bump_library_version(household)
+    return written[0]
+
+
+@traced("db.add_media")
+async def add_media_async(entry: dict, household: str = DEFAULT_HOUSEHOLD) -> dict:
+    """add_media for async endpoints: embeds in a worker thread, and talks to
+    the async client without holding a thread for the round trips."""
+    client = await get_async_client()
+    key = media_key(entry)
+    query = _stored_query(client, household, [key])
+    stored = (await _aexecute("stored_media", query)).data
+    outcome, row = _plan(entry, stored[0] if stored else None, household)
+    if outcome == "unchanged":
+        _MEDIA_WRITES.inc(result=outcome)
+        return row
+    if outcome == "updated":
+        query = _write_query(client, outcome, row, household, key)
+        written = (await _aexecute("add_media", query)).data
+        if not written:
+            # The row was deleted since the lookup: add the entry afresh.
+            outcome, row = _plan(entry, None, household)
+    if outcome != "updated":
+        row = await asyncio.to_thread(_media_row, row)
+        query = _write_query(client, outcome, row, household, key)
+        written = (await _aexecute("add_media", query)).data
+    _MEDIA_WRITES.inc(result=outcome)
+    _bump_library_version(household)
+    return written[0]
+
+
+@traced("db.add_media_batch")
+def add_media_batch(
+    entries: list[dict], household: str = DEFAULT_HOUSEHOLD
+) -> list[tuple[str, dict]]:
+    """add_media for many entries: one lookup, one forward pass for the
+    entries whose embedded text changed and one upsert for them. Returns the
+    outcome and row for each entry, in order.
+
+    An entry repeated within the batch is written as its last copy, as if
+    the copies had been added one by one; the earlier copies are "unchanged"
+    and return the row the last one wrote.
+    """
+    keys = [media_key(entry) for entry in entries]
+    query = _stored_query(get_client(), household, sorted(set(keys)))
+    rows = {row["media_key"]: row for row in _execute("stored_media", query).data}
+    last = {key: i for i, key in enumerate(keys)}
+    outcomes: list[str] = []
+    to_embed: dict[str, dict] = {}
+    to_update: dict[str, dict] = {}
+    for i, (key, entry) in enumerate(zip(keys, entries, strict=True)):
+        if i != last[key]:
+            outcomes.append("unchanged")
+            continue
+        outcome, row = _plan(entry, rows.get(key), household)
+        outcomes.append(outcome)
+        if outcome == "updated":
+            to_update[key] = row
+        elif outcome != "unchanged":
+            to_embed[key] = row
+
+    for key, changed in to_update.items():
+        query = _write_query(get_client(), "updated", changed, household, key)
+        written = _execute("add_media", query).data
+        if written:
+            rows[key] = written[0]
+        else:
+            # The row was deleted since the lookup: add the entry afresh.
+            outcomes[last[key]], to_embed[key] = _plan(
+                entries[last[key]], None, household
+            )
+    if to_embed:
+        texts = [build_embedding_text(row) for row in to_embed.values()]
+        payload = [
+            {**row, **_embedding_fields(vector, text)}
+            for row, vector, text in zip(
+                to_embed.values(), embed_batch(texts), texts, strict=True
+            )
+        ]
+        query = (
+            get_client()
+            .table("watched_media")
+            .upsert(payload, on_conflict=_CONFLICT_KEY)
+        )
+        for row in _execute("add_media_batch", query).data:
+            rows[row["media_key"]] = row
+    if to_embed or to_update:
+        _bump_library_version(household)
+    for outcome in outcomes:
+        _MEDIA_WRITES.inc(result=outcome)
+    return [(outcome, rows[key]) for outcome, key in zip(outcomes, keys, strict=True)]
+
+
+def list_media(household: str = DEFAULT_HOUSEHOLD, page_size: int = 1000) -> list[dict]:
+    """Return every row in ``household``'s library (without embeddings)."""
+    rows: list[dict] = []
+    while True:
+        query = (
+            get_client()
+            .table("watched_media")
+            .select(_MEDIA_COLUMNS)
+            .eq("household_id", household)
+            .order("id")
+            .range(len(rows), len(rows) + page_size - 1)
+        )
+        page = _execute("list_media", query).data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+# Partner names per household, read from the households table at most once
+# per _NAMES_TTL_SECONDS per worker.
+_NAMES_TTL_SECONDS = 300
+_partner_names: dict[str, tuple[list[str], float]] = {}
+profiling.track("database.partner_names", lambda: _partner_names)
+
+
+def partner_names(household: str = DEFAULT_HOUSEHOLD) -> list[str]:
+    """The two partners' names the prompts use: the household's ``names``
+    in the households table, else DEFAULT_PARTNER_NAMES."""
+    cached = _partner_names.get(household)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    query = get_client().table("households").select("names").eq("id", household)
+    rows = _execute("partner_names", query).data
+    names = (rows[0].get("names") if rows else None) or []
+    if len(names) < 2:
+        names = DEFAULT_PARTNER_NAMES
+    _partner_names[household] = (names, time.monotonic() + _NAMES_TTL_SECONDS)
+    return names
+
+
+class SearchHit(TypedDict):
+    """The part of a library row a recommendation uses.
+
+    Hits are stored in the graph state, which is checkpointed after every
+    node, so they leave out descriptions, genres and (whatever the RPC
+    returns) the embedding.
+    """
+
+    id: str | None
+    tmdb_id: int | None
+    title: str
+    type: str
+    user_rating: float | None
+    gf_rating: float | None
+    user_review: str
+    gf_review: str
+    similarity: float | None
+
+
+def to_search_hit(row: Mapping[str, Any]) -> SearchHit:
+    return {
+        "id": row.get("id"),
+        "tmdb_id": row.get("tmdb_id"),
+        "title": row["title"],
+        "type": row["type"],
+        "user_rating": row.get("user_rating"),
+        "gf_rating": row.get("gf_rating"),
+        "user_review": row.get("user_review") or "",
+        "gf_review": row.get("gf_review") or "",
+        "similarity": row.get("similarity"),
+    }
+
+
+def _match(
+    query_vector: np.ndarray, model: str, limit: int, filters: dict
+) -> list[SearchHit]:
+    query = get_client().rpc(
         "search_similar_media",
         {
-            "query_embedding": query_vector,
+            "query_embedding": to_pgvector(query_vector),
             "match_threshold": 0.2,
             "match_count": limit,
+            "filter_model": model,
+            **filters,
         },
-    ).execute()
+    )
+    return [to_search_hit(row) for row in _execute("search_similar", query).data]
+
+
+@traced("db.search_similar")
+def search_similar(
+    query: str,
+    limit: int = 5,
+    media_type: str | None = None,
+    genres: list[str] | None = None,
+    min_rating: float | None = None,
+    household: str = DEFAULT_HOUSEHOLD,
+) -> list[SearchHit]:
+    """Return the closest rows of ``household``'s library to ``query``, as
+    SearchHits.
+
+    The filters are applied inside the RPC, before ranking and the limit, so
+    a search reads one household's rows however many share the table:
+    ``media_type`` ("movie" or "series") must match exactly, at least one of
+    ``genres`` must match (case-insensitive substring), and the couple's
+    average rating must be at least ``min_rating``.
+    """
+    filters = {
+        "filter_household": household,
+        "filter_type": media_type,
+        "filter_genres": genres or None,
+        "min_rating": min_rating,
+    }
+    results = _match(embed(query), EMBEDDING_MODEL, limit, filters)
+    if EMBEDDING_PREVIOUS_MODEL is None:
+        return results
+
+    # Mid re-index: rows not yet migrated only match a query embedded with the
+    # model they were stored with, so read both and keep the best hits.
+    previous_vector = embed(query, EMBEDDING_PREVIOUS_MODEL)
+    results += _match(previous_vector, EMBEDDING_PREVIOUS_MODEL, limit, filters)
+    results.sort(key=lambda r: r["similarity"] or 0, reverse=True)
+    return results[:limit]
+
+
+def iter_stale_media(
+    batch_size: int, after_id: str | None = None
+) -> Iterator[list[dict]]:
+    """Yield pages of rows embedded with another model or template version.
+
+    Pages are keyed on ``id`` (not offset), so rows fixed by an earlier page
+    don't shift later ones and a run can resume from the last id it wrote.
+    Rows carry their content_hash, which update_embeddings checks.
+    """
+    stale = (
+        f'embedding_model.is.null,embedding_model.neq."{EMBEDDING_MODEL}",'
+        f"embedding_version.is.null,embedding_version.neq.{TEMPLATE_VERSION}"
+    )
+    while True:
+        query = (
+            get_client()
+            .table("watched_media")
+            .select(_MEDIA_COLUMNS + ",content_hash")
+            .or_(stale)
+            .order("id")
+            .limit(batch_size)
+        )
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        rows = _execute("iter_stale_media", query).data
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1]["id"]
+
+
+@traced("db.update_embeddings")
+def update_embeddings(rows: list[dict], vectors: np.ndarray) -> int:
+    """Write the embeddings of re-embedded rows from iter_stale_media back,
+    and return how many were written.
+
+    One update per row, of the embedding columns only, and only while the
+    row's content_hash is still the one it was read with: a row whose text
+    was edited in the meantime is left alone (add_media embedded the new
+    text), and other edits are never written over.
+    """
+    written = 0
+    households: set[str] = set()
+    for row, vector in zip(rows, vectors, strict=True):
+        fields = _embedding_fields(vector, build_embedding_text(row))
+        query = get_client().table("watched_media").update(fields).eq("id", row["id"])
+        if row.get("content_hash") is None:
+            query = query.is_("content_hash", "null")
+        else:
+            query = query.eq("content_hash", row["content_hash"])
+        if _execute("update_embeddings", query).data:
+            written += 1
+            households.add(row.get("household_id") or DEFAULT_HOUSEHOLD)
+    for household in households:
+        _bump_library_version(household)
+    return written
+
+
+# ---------------------------------------------------------------------------
+# Graph checkpoints (read and written by app.checkpoints.SupabaseSaver)
+# ---------------------------------------------------------------------------
+
+_CHECKPOINT_KEY = "thread_id,checkpoint_ns,checkpoint_id"
+_CHECKPOINT_WRITE_KEY = "thread_id,checkpoint_ns,checkpoint_id,task_id,idx"
+
+
+@traced("db.save_checkpoints")
+def save_checkpoints(checkpoints: list[dict], writes: list[dict]) -> None:
+    """Upsert checkpoint and pending-write rows: one request per table, however
+    many rows. Upserts, so a retried or repeated batch is harmless."""
+    client = get_client()
+    if checkpoints:
+        query = client.table("graph_checkpoints").upsert(
+            checkpoints, on_conflict=_CHECKPOINT_KEY
+        )
+        _execute("save_checkpoints", query)
+    if writes:
+        query = client.table("graph_checkpoint_writes").upsert(
+            writes, on_conflict=_CHECKPOINT_WRITE_KEY
+        )
+        _execute("save_checkpoint_writes", query)
+
+
+@traced("db.load_checkpoints")
+def load_checkpoints(
+    thread_id: str | None,
+    checkpoint_ns: str | None = None,
+    checkpoint_id: str | None = None,
+    before: str | None = None,
+    limit: int | None = None,
+) -> list[dict]:
+    """Checkpoint rows, newest first (checkpoint ids sort by creation time)."""
+    query = get_client().table("graph_checkpoints").select("*")
+    if thread_id is not None:
+        query = query.eq("thread_id", thread_id)
+    if checkpoint_ns is not None:
+        query = query.eq("checkpoint_ns", checkpoint_ns)
+    if checkpoint_id is not None:
+        query = query.eq("checkpoint_id", checkpoint_id)
+    if before is not None:
+        query = query.lt("checkpoint_id", before)
+    query = query.order("checkpoint_id", desc=True)
+    if limit is not None:
+        query = query.limit(limit)
+    return _execute("load_checkpoints", query).data
+
+
+@traced("db.load_checkpoint_writes")
+def load_checkpoint_writes(
+    thread_id: str, checkpoint_ns: str, checkpoint_id: str
+) -> list[dict]:
+    """Pending writes of one checkpoint, in the order the graph applies them."""
+    query = (
+        get_client()
+        .table("graph_checkpoint_writes")
+        .select("*")
+        .eq("thread_id", thread_id)
+        .eq("checkpoint_ns", checkpoint_ns)
+        .eq("checkpoint_id", checkpoint_id)
+    )
+    rows = _execute("load_checkpoint_writes", query).data
+    return sorted(rows, key=lambda r: (r["task_path"], r["task_id"], r["idx"]))
+
 
-    return result.data
+def delete_checkpoints(thread_id: str) -> None:
+    for table in ("graph_checkpoint_writes", "graph_checkpoints"):
+        query = get_client().table(table).delete().eq("thread_id", thread_id)
+        _execute("delete_checkpoints", query)
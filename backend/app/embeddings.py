@@ -1,6 +1,164 @@
-from sentence_transformers import SentenceTransformer
+import base64
+import hashlib
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from queue import Empty, SimpleQueue
 
-_model = SentenceTransformer("all-MiniLM-L6-v2")
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from app import profiling
+from app.config import (
+    EMBED_MAX_BATCH_SIZE,
+    EMBED_MAX_WAIT_MS,
+    EMBEDDING_DTYPE,
+    EMBEDDING_MODEL,
+    EMBEDDING_PREVIOUS_MODEL,
+)
+from app.tracing import traced
+
+# Bump whenever build_embedding_text changes what gets embedded; rows stored
+# with an older version are picked up by the re-index job (app.reindex).
+TEMPLATE_VERSION = 1
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# Loaded on first use (or by load_model() at startup): importing torch and
+# reading the weights takes seconds, which shouldn't sit on the import path.
+_model: "SentenceTransformer | None" = None
+_previous_model: "SentenceTransformer | None" = None
+_model_lock = threading.Lock()
+profiling.track("embeddings.model", lambda: _model)
+profiling.track("embeddings.previous_model", lambda: _previous_model)
+
+
+def load_model(name: str = EMBEDDING_MODEL) -> "SentenceTransformer":
+    """Return the model for ``name``, loading it on first call."""
+    global _model, _previous_model
+    if name not in (EMBEDDING_MODEL, EMBEDDING_PREVIOUS_MODEL):
+        raise ValueError(f"Embedding model {name!r} is not configured")
+    loaded = _model if name == EMBEDDING_MODEL else _previous_model
+    if loaded is not None:
+        return loaded
+    with _model_lock:
+        from sentence_transformers import SentenceTransformer
+
+        if name == EMBEDDING_MODEL:
+            if _model is None:
+                _model = SentenceTransformer(name)
+            return _model
+        if _previous_model is None:
+            _previous_model = SentenceTransformer(name)
+        return _previous_model
+
+
+_dtype = np.dtype(EMBEDDING_DTYPE)
+
+# Significant digits written per component in the pgvector text literal.
+# Anything past the storage dtype's precision is noise for cosine similarity.
+_TEXT_DIGITS = {np.dtype(np.float32): 7, np.dtype(np.float16): 4}
+
+
+class EmbeddingBatcher:
+    """Runs concurrent encode requests through the model as a single batch.
+
+    Callers submit one text each; a background thread collects requests for up
+    to ``max_wait_ms`` (or until ``max_batch_size`` texts are queued), encodes
+    them in one forward pass and hands each caller its own row back.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[list[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+    ) -> None:
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._encode = encode
+        self._queue: SimpleQueue[tuple[str, Future]] = SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._ensure_started()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _reset(self) -> None:
+        # After fork() the child has none of the parent's threads: drop the
+        # dead worker, any queued requests (they belong to parent callers) and
+        # locks that may have been held mid-fork.
+        self._queue = SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _collect(self) -> list[tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                vectors = self._encode([text for text, _ in batch])
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future), vector in zip(batch, vectors, strict=True):
+                future.set_result(vector)
+
+
+def _encode_batch(texts: list[str]) -> np.ndarray:
+    return load_model().encode(texts, batch_size=len(texts))
+
+
+_batcher = EmbeddingBatcher(
+    _encode_batch,
+    max_batch_size=EMBED_MAX_BATCH_SIZE,
+    max_wait_ms=EMBED_MAX_WAIT_MS,
+)
+
+
+def _reinit_after_fork() -> None:
+    global _model_lock
+    _model_lock = threading.Lock()
+    _batcher._reset()
+
+
+# Pre-fork servers (gunicorn.conf.py) load the model in the master and fork
+# workers from it; the weights are shared, the batcher thread is not.
+os.register_at_fork(after_in_child=_reinit_after_fork)
 
 
 def build_embedding_text(entry: dict) -> str:
@@ -25,6 +183,52 @@ def build_embedding_text(entry: dict) -> str:
     return ". ".join(parts)
 
 
-def embed(text: str) -> list[float]:
-    vector = _model.encode(text)
-    return vector.tolist()
+def content_hash(text: str) -> str:
+    """Fingerprint of an embedding text. A row stored with the same hash (and
+    model) already has this text's embedding."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+@traced("embed")
+def embed(text: str, model: str = EMBEDDING_MODEL) -> np.ndarray:
+    """Embed ``text`` as a contiguous vector in the configured storage dtype.
+
+    ``model`` may name EMBEDDING_PREVIOUS_MODEL to query rows that haven't
+    been re-indexed yet.
+    """
+    if model == EMBEDDING_MODEL:
+        vector = _batcher.encode(text)
+    else:
+        vector = load_model(model).encode(text)
+    return np.ascontiguousarray(vector, dtype=_dtype)
+
+
+@traced("embed_batch")
+def embed_batch(texts: list[str]) -> np.ndarray:
+    """Embed many texts in one forward pass; returns one row per text."""
+    if not texts:
+        dims = load_model().get_sentence_embedding_dimension() or 0
+        return np.empty((0, dims), _dtype)
+    return np.ascontiguousarray(_encode_batch(texts), dtype=_dtype)
+
+
+def to_pgvector(vector: np.ndarray, dtype: np.dtype = _dtype) -> str:
+    """Encode a vector as a compact pgvector text literal, e.g. ``[0.1,-0.02]``.
+
+    PostgREST only accepts vectors in this text form, so this is the wire format
+    for Supabase; it is roughly half the size of a JSON list of Python floats.
+    """
+    array = np.asarray(vector, dtype=dtype)
+    spec = f".{_TEXT_DIGITS.get(array.dtype, 9)}g"
+    return "[" + ",".join([format(x, spec) for x in array.tolist()]) + "]"
+
+
+def pack_vector(vector: np.ndarray, dtype: np.dtype = _dtype) -> str:
+    """Base64-encode the raw little-endian buffer, for stores that accept binary."""
+    array = np.asarray(vector, dtype=np.dtype(dtype).newbyteorder("<"))
+    return base64.b64encode(array.tobytes()).decode("ascii")
+
+
+def unpack_vector(data: str, dtype: np.dtype = _dtype) -> np.ndarray:
+    raw = base64.b64decode(data)
+    return np.frombuffer(raw, dtype=np.dtype(dtype).newbyteorder("<"))
@@ -0,0 +1,132 @@
+"""Hedged calls for tail latency.
+
+A Hedger runs an idempotent call and, if no answer has come back after the
+recent p95 latency of that call, starts a second copy and takes whichever
+answers first. Only the slowest ~5% of calls are sent twice, and those are
+the ones most likely stuck behind a slow server or a lost packet. A losing
+copy that hasn't started yet is cancelled; one already running can't be
+interrupted, so it finishes (within its own timeout) and its result is
+dropped.
+
+Until ``min_samples`` latencies have been seen, the delay is ``delay_ms``.
+A copy that fails doesn't end the call while the other may still answer.
+A caller can veto the second copy (say, when a rate limit has no room for
+it) with ``may_hedge``; the call then just waits for the first.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import TypeVar
+
+from app.metrics import Counter
+
+T = TypeVar("T")
+
+_HEDGES = Counter(
+    "popchoice_hedged_requests_total",
+    "Hedged calls by name and outcome (fired: a second copy was sent, won: "
+    "the second copy answered first, skipped: may_hedge vetoed the copy).",
+    labels=("name", "result"),
+)
+
+
+class Hedger:
+    def __init__(
+        self,
+        name: str,
+        enabled: bool,
+        delay_ms: float,
+        min_delay_ms: float,
+        workers: int,
+        window: int = 256,
+        min_samples: int = 20,
+    ) -> None:
+        self.name = name
+        self.enabled = enabled
+        self.default_delay = delay_ms / 1000
+        self.min_delay = min_delay_ms / 1000
+        self.workers = workers
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        # Created on first use, so pre-forked workers each start their own.
+        self._executor: ThreadPoolExecutor | None = None
+
+    def delay(self) -> float:
+        """Seconds to wait before sending the second copy: the recent p95."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < self.min_samples:
+            return self.default_delay
+        p95 = latencies[math.ceil(0.95 * len(latencies)) - 1]
+        return max(p95, self.min_delay)
+
+    def _timed(self, fn: Callable[[], T]) -> Callable[[], T]:
+        """``fn`` wrapped to record its latency."""
+
+        def timed() -> T:
+            started = time.perf_counter()
+            result = fn()
+            with self._lock:
+                self._latencies.append(time.perf_counter() - started)
+            return result
+
+        return timed
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix=f"hedge-{self.name}"
+                )
+            return self._executor
+
+    def call(
+        self, fn: Callable[[], T], may_hedge: Callable[[], bool] | None = None
+    ) -> T:
+        """``fn()``, hedged when enabled. ``fn`` must be safe to run twice.
+
+        ``may_hedge`` is asked when the delay is up; if it returns False, no
+        second copy is sent.
+        """
+        timed = self._timed(fn)
+        if not self.enabled:
+            return timed()
+
+        executor = self._get_executor()
+        primary = executor.submit(timed)
+        try:
+            return primary.result(timeout=self.delay())
+        except FutureTimeout:
+            pass
+
+        if may_hedge is not None and not may_hedge():
+            _HEDGES.inc(name=self.name, result="skipped")
+            return primary.result()
+        _HEDGES.inc(name=self.name, result="fired")
+        hedge = executor.submit(timed)
+        pending: set[Future[T]] = {primary, hedge}
+        errors: list[BaseException] = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                exc = future.exception()
+                if exc is not None:
+                    errors.append(exc)
+                    continue
+                if future is hedge:
+                    _HEDGES.inc(name=self.name, result="won")
+                for other in pending:
+                    other.cancel()
+                return future.result()
+        raise errors[0]
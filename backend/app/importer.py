@@ -0,0 +1,122 @@
+"""Bulk import of a plain title list into the library.
+
+Each title is looked up with search_media on a pool of
+IMPORT_TMDB_CONCURRENCY threads (TMDB requests stay within TMDB_MAX_RPS, see
+app.tmdb), and its best match supplies the TMDB id, type, genres and
+description. Resolved titles are written IMPORT_BATCH_SIZE at a time with
+add_media_batch (one embedding pass and one upsert; titles already in the
+library with the same embedded text aren't embedded again), while the pool
+keeps resolving the next ones. import_titles yields a status per title as
+soon as it is known, in completion order; ``index`` ties it back to the
+input.
+"""
+
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import httpx
+
+from app.config import DEFAULT_HOUSEHOLD, IMPORT_BATCH_SIZE, IMPORT_TMDB_CONCURRENCY
+from app.database import add_media_batch
+from app.metrics import Counter
+from app.tmdb import search_media
+
+_IMPORTED = Counter(
+    "popchoice_import_items_total",
+    "Bulk-imported titles by outcome (added, updated, unchanged, not_found, failed).",
+    labels=("status",),
+)
+
+
+def _pick(results: list[dict], title: str, media_type: str | None) -> dict | None:
+    """The search result to import for ``title``: an exact title match of the
+    wanted type if there is one, else the first of that type, else the top
+    result."""
+    candidates = [r for r in results if media_type in (None, r["type"])]
+    if not candidates:
+        return None
+    wanted = title.strip().casefold()
+    for result in candidates:
+        if (result["title"] or "").casefold() == wanted:
+            return result
+    return candidates[0]
+
+
+def _resolve(item: dict) -> dict | None:
+    match = _pick(search_media(item["title"]), item["title"], item.get("type"))
+    if match is None:
+        return None
+    entry = {
+        "title": match["title"],
+        "type": match["type"],
+        "genres": match["genres"],
+        "description": match["description"],
+        "tmdb_id": match["tmdb_id"],
+        "user_review": item.get("user_review") or "",
+        "gf_review": item.get("gf_review") or "",
+    }
+    # A missing rating is left out rather than stored as None: the embedded
+    # text shows it as "?", and a re-import keeps the rating already stored.
+    for rating in ("user_rating", "gf_rating"):
+        if item.get(rating) is not None:
+            entry[rating] = item[rating]
+    return entry
+
+
+def _status(index: int, item: dict, status: str, **fields) -> dict:
+    _IMPORTED.inc(status=status)
+    return {"index": index, "title": item["title"], "status": status, **fields}
+
+
+def _store(batch: list[tuple[int, dict, dict]], household: str) -> Iterator[dict]:
+    try:
+        written = add_media_batch([entry for _, _, entry in batch], household)
+    except Exception as exc:
+        # The whole batch shares one upsert; report it and carry on.
+        for index, item, _ in batch:
+            yield _status(index, item, "failed", error=type(exc).__name__)
+        return
+    for (index, item, _), (outcome, row) in zip(batch, written, strict=True):
+        # Re-embedded or not, an existing row was updated.
+        status = "updated" if outcome == "reembedded" else outcome
+        yield _status(index, item, status, id=row.get("id"), tmdb_id=row.get("tmdb_id"))
+
+
+def import_titles(
+    items: list[dict],
+    concurrency: int = IMPORT_TMDB_CONCURRENCY,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    household: str = DEFAULT_HOUSEHOLD,
+) -> Iterator[dict]:
+    """Resolve and store ``items`` (dicts with at least a ``title``) in
+    ``household``'s library, yielding one status per item: added, updated,
+    unchanged, not_found or failed.
+
+    Closing the iterator early (a client that went away) cancels the lookups
+    not yet started.
+    """
+    pool = ThreadPoolExecutor(max(1, concurrency), thread_name_prefix="import")
+    try:
+        futures: dict[Future, int] = {
+            pool.submit(_resolve, item): index for index, item in enumerate(items)
+        }
+        batch: list[tuple[int, dict, dict]] = []
+        for future in as_completed(futures):
+            index = futures[future]
+            item = items[index]
+            try:
+                entry = future.result()
+            except httpx.HTTPError as exc:
+                yield _status(index, item, "failed", error=type(exc).__name__)
+                continue
+            if entry is None:
+                yield _status(index, item, "not_found")
+                continue
+            batch.append((index, item, entry))
+            if len(batch) >= batch_size:
+                yield from _store(batch, household)
+                batch = []
+        if batch:
+            yield from _store(batch, household)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
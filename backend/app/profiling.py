@@ -0,0 +1,227 @@
+"""In-process memory and CPU profiling, served by the /admin endpoints.
+
+- structures(): approximate sizes of the long-lived structures modules
+  register with track() (caches, the checkpointer, loaded models).
+- tracemalloc: start_tracemalloc() records allocations from then on;
+  tracemalloc_report() lists where traced memory grew since the previous
+  report (or since the start).
+- profile_cpu(): samples every thread's Python stack for a few seconds and
+  returns them in collapsed-stack format ("thread;frame;frame count" lines),
+  which speedscope and flamegraph.pl read.
+
+Nothing here needs an external service or a restart; all of it is stdlib.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from collections.abc import Callable, Sized
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any
+
+# Stop walking an object graph after this many objects; sizes are estimates.
+_MAX_OBJECTS = 2_000_000
+
+
+class ProfilingError(RuntimeError):
+    """The request conflicts with profiling state (a profile already running,
+    tracemalloc not started)."""
+
+
+# ---------------------------------------------------------------------------
+# Sizes of known structures
+# ---------------------------------------------------------------------------
+
+_tracked: dict[str, Callable[[], Any]] = {}
+
+# Walking into these would measure code and the import system, not data.
+_OPAQUE = (type, ModuleType, FunctionType, MethodType, BuiltinFunctionType)
+
+
+def track(name: str, get: Callable[[], Any]) -> None:
+    """Report ``get()`` under ``name`` in structures(). ``get`` is called on
+    every report, so it can follow a global that is rebuilt or swapped."""
+    _tracked[name] = get
+
+
+def deep_size(obj: Any) -> int:
+    """Approximate bytes held by ``obj`` and everything it references through
+    containers and instance attributes, counting shared objects once. Arrays
+    and tensors count their buffers."""
+    seen: set[int] = set()
+    pending = [obj]
+    total = 0
+    while pending and len(seen) < _MAX_OBJECTS:
+        item = pending.pop()
+        if id(item) in seen or isinstance(item, _OPAQUE):
+            continue
+        seen.add(id(item))
+        nbytes = getattr(item, "nbytes", None)
+        if isinstance(nbytes, int):  # numpy arrays
+            total += nbytes
+            continue
+        if callable(getattr(item, "element_size", None)) and callable(
+            getattr(item, "nelement", None)
+        ):  # torch tensors and parameters
+            total += item.element_size() * item.nelement()
+            continue
+        total += sys.getsizeof(item, 0)
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, list | tuple | set | frozenset | deque):
+            pending.extend(item)
+        elif not isinstance(item, str | bytes | bytearray | int | float):
+            pending.extend(getattr(item, "__dict__", {}).values())
+    return total
+
+
+def structures() -> dict[str, dict]:
+    """Entries (where the structure has a length) and approximate bytes of
+    every tracked structure that exists in this process."""
+    report = {}
+    for name, get in sorted(_tracked.items()):
+        obj = get()
+        if obj is None:
+            continue
+        report[name] = {
+            "entries": len(obj) if isinstance(obj, Sized) else None,
+            "bytes": deep_size(obj),
+        }
+    return report
+
+
+def rss_bytes() -> int | None:
+    """This process's resident set size, or None where /proc isn't there."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# tracemalloc
+# ---------------------------------------------------------------------------
+
+_tracemalloc_lock = threading.Lock()
+_baseline: tracemalloc.Snapshot | None = None
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def start_tracemalloc(frames: int = 1) -> None:
+    """Trace allocations from now on, keeping ``frames`` frames of each one's
+    traceback. Restarts tracing if it is already on."""
+    global _baseline
+    with _tracemalloc_lock:
+        tracemalloc.stop()
+        tracemalloc.start(frames)
+        _baseline = _snapshot()
+
+
+def stop_tracemalloc() -> None:
+    global _baseline
+    with _tracemalloc_lock:
+        tracemalloc.stop()
+        _baseline = None
+
+
+def tracemalloc_report(limit: int = 25) -> dict:
+    """Traced memory now and at its peak, and the ``limit`` allocation sites
+    whose size changed most since the previous report."""
+    global _baseline
+    with _tracemalloc_lock:
+        if not tracemalloc.is_tracing() or _baseline is None:
+            raise ProfilingError("tracemalloc is not running")
+        snapshot = _snapshot()
+        stats = snapshot.compare_to(_baseline, "traceback")
+        _baseline = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+    return {
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "top": [
+            {
+                "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+                "size": stat.size,
+                "size_diff": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats[:limit]
+        ],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Sampling CPU profile
+# ---------------------------------------------------------------------------
+
+_profile_lock = threading.Lock()
+
+# Innermost frames of a thread that is waiting rather than running Python:
+# worker pools, the event loop's select and condition/queue waits.
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+def _label(frame: Any) -> str:
+    code = frame.f_code
+    path = os.path.join(*code.co_filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _is_idle(frame: Any) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+
+
+def _collapse(thread: str, frame: Any) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame))
+        frame = frame.f_back
+    return ";".join([thread.replace(";", ":"), *reversed(labels)])
+
+
+def profile_cpu(seconds: float, interval: float = 0.01, idle: bool = False) -> str:
+    """Sample every other thread's stack every ``interval`` seconds for
+    ``seconds``, in collapsed-stack format, most frequent stacks first.
+
+    Samples are wall-clock: a thread blocked in I/O is counted where it
+    blocked. Threads parked in a known wait are left out unless ``idle``.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilingError("a CPU profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks: Counter[str] = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (not idle and _is_idle(frame)):
+                    continue
+                stacks[_collapse(names.get(ident, str(ident)), frame)] += 1
+            time.sleep(interval)
+    finally:
+        _profile_lock.release()
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
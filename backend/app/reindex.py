@@ -0,0 +1,74 @@
+"""Re-embed rows stored with an outdated model or embedding template.
+
+Runs online: rows are rewritten a page at a time, and searches keep working
+throughout (see EMBEDDING_PREVIOUS_MODEL for model changes). Progress is saved
+after every page, so an interrupted run picks up where it stopped.
+
+Usage (from backend/):
+    uv run python -m app.reindex --batch-size 64
+"""
+
+import argparse
+import json
+from collections.abc import Iterator
+from pathlib import Path
+
+from app.config import EMBEDDING_MODEL
+from app.database import iter_stale_media, update_embeddings
+from app.embeddings import TEMPLATE_VERSION, build_embedding_text, embed_batch
+
+DEFAULT_STATE_FILE = Path(".reindex-state.json")
+
+
+def _target() -> dict:
+    return {"model": EMBEDDING_MODEL, "version": TEMPLATE_VERSION}
+
+
+def _load_cursor(state_file: Path) -> str | None:
+    if not state_file.exists():
+        return None
+    state = json.loads(state_file.read_text())
+    # A cursor saved for a different target would skip rows that are stale
+    # again, so only resume a run aimed at the same model and template.
+    if state.get("target") != _target():
+        return None
+    return state.get("after_id")
+
+
+def _save_cursor(state_file: Path, after_id: str) -> None:
+    tmp = state_file.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"target": _target(), "after_id": after_id}))
+    tmp.replace(state_file)
+
+
+def reindex(
+    batch_size: int = 64, state_file: Path = DEFAULT_STATE_FILE
+) -> Iterator[int]:
+    """Re-embed stale rows page by page, yielding the count written per page.
+
+    The cursor file is removed once no stale rows remain.
+    """
+    after_id = _load_cursor(state_file)
+    for rows in iter_stale_media(batch_size, after_id):
+        vectors = embed_batch([build_embedding_text(row) for row in rows])
+        written = update_embeddings(rows, vectors)
+        _save_cursor(state_file, str(rows[-1]["id"]))
+        yield written
+    state_file.unlink(missing_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--state-file", type=Path, default=DEFAULT_STATE_FILE)
+    args = parser.parse_args()
+
+    total = 0
+    for written in reindex(args.batch_size, args.state_file):
+        total += written
+        print(f"re-embedded {total} rows")
+    print(f"done: {total} rows re-embedded")
+
+
+if __name__ == "__main__":
+    main()
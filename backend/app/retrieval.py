@@ -0,0 +1,236 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+from app import profiling
+from app.config import DEFAULT_HOUSEHOLD, LEXICAL_INDEX_CACHE_SIZE
+from app.database import (
+    SearchHit,
+    library_version,
+    list_media,
+    search_similar,
+    to_search_hit,
+)
+from app.metrics import Counter as MetricCounter
+from app.tracing import traced
+
+# How many candidates each retriever contributes before fusion.
+_CANDIDATES = 20
+
+# Reciprocal rank fusion constant (Cormack et al.); damps the head of each list
+# so one retriever's top hit can't drown out agreement between both.
+_RRF_K = 60
+
+# Rebuild the lexical index at least this often, so rows written by other
+# workers show up even though library_version() only sees local writes.
+_INDEX_TTL_SECONDS = 300
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or "
+    "so that the this to was were with you your we our they them".split()
+)
+
+# Field weights: a title or genre hit says more than a word in a review.
+_FIELD_WEIGHTS = {"title": 3, "genres": 2, "user_review": 1, "gf_review": 1}
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 inverted index over titles, genres and reviews of library rows."""
+
+    def __init__(self, rows: list[dict], k1: float = 1.2, b: float = 0.75) -> None:
+        self.rows = rows
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._lengths: list[int] = []
+
+        for doc_id, row in enumerate(rows):
+            counts: Counter[str] = Counter()
+            for field, weight in _FIELD_WEIGHTS.items():
+                value = row.get(field) or ""
+                if isinstance(value, list):
+                    value = " ".join(value)
+                for token in tokenize(value):
+                    counts[token] += weight
+            for token, tf in counts.items():
+                self._postings[token].append((doc_id, tf))
+            self._lengths.append(sum(counts.values()))
+
+        self._avg_length = sum(self._lengths) / len(rows) if rows else 0.0
+
+    def _idf(self, token: str) -> float:
+        df = len(self._postings.get(token, ()))
+        return math.log(1 + (len(self.rows) - df + 0.5) / (df + 0.5))
+
+    def _allowed(
+        self,
+        media_type: str | None,
+        genres: list[str] | None,
+        min_rating: float | None,
+    ) -> set[int] | None:
+        if not (media_type or genres or min_rating is not None):
+            return None
+        return {
+            doc_id
+            for doc_id, row in enumerate(self.rows)
+            if matches_filters(row, media_type, genres, min_rating)
+        }
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        media_type: str | None = None,
+        genres: list[str] | None = None,
+        min_rating: float | None = None,
+    ) -> list[dict]:
+        """Rank rows by BM25; filtered-out rows are skipped before scoring."""
+        allowed = self._allowed(media_type, genres, min_rating)
+        scores: dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = self._idf(token)
+            for doc_id, tf in postings:
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = 1 - self.b + self.b * self._lengths[doc_id] / self._avg_length
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)[:limit]
+        return [self.rows[doc_id] for doc_id in ranked]
+
+
+_INDEX_LOOKUPS = MetricCounter(
+    "popchoice_lexical_index_lookups_total",
+    "Per-household lexical index lookups: hit, build (missing, stale or "
+    "expired) or evicted (least recently searched, over the cache size).",
+    labels=("result",),
+)
+
+# household -> (index, library version it was built at, build time), least
+# recently searched first. A search only ever reads its own household's index.
+_indexes: OrderedDict[str, tuple[LexicalIndex, int, float]] = OrderedDict()
+_index_lock = threading.Lock()
+profiling.track("retrieval.lexical_indexes", lambda: _indexes)
+
+
+def _get_index(household: str) -> LexicalIndex:
+    version = library_version(household)
+    with _index_lock:
+        cached = _indexes.get(household)
+        if cached is not None:
+            index, built_version, built_at = cached
+            fresh = time.monotonic() - built_at < _INDEX_TTL_SECONDS
+            if built_version == version and fresh:
+                _indexes.move_to_end(household)
+                _INDEX_LOOKUPS.inc(result="hit")
+                return index
+
+    # Built outside the lock, so a cold household's list_media round trip
+    # doesn't hold up searches in the others.
+    _INDEX_LOOKUPS.inc(result="build")
+    index = LexicalIndex(list_media(household))
+    with _index_lock:
+        _indexes[household] = (index, version, time.monotonic())
+        _indexes.move_to_end(household)
+        while len(_indexes) > max(1, LEXICAL_INDEX_CACHE_SIZE):
+            _indexes.popitem(last=False)
+            _INDEX_LOOKUPS.inc(result="evicted")
+    return index
+
+
+def _row_key(row: Mapping[str, Any]) -> str:
+    return str(row.get("id") or (row.get("title"), row.get("type")))
+
+
+def _matches_genres(row: dict, genres: list[str]) -> bool:
+    row_genres = [g.lower() for g in row.get("genres") or []]
+    return any(
+        wanted in have or have in wanted
+        for wanted in (g.lower() for g in genres)
+        for have in row_genres
+    )
+
+
+def matches_filters(
+    row: dict,
+    media_type: str | None = None,
+    genres: list[str] | None = None,
+    min_rating: float | None = None,
+) -> bool:
+    """Local equivalent of the search_similar_media RPC filters."""
+    if media_type and row.get("type") != media_type:
+        return False
+    if genres and not _matches_genres(row, genres):
+        return False
+    if min_rating is not None:
+        ratings = [row.get("user_rating") or 0, row.get("gf_rating") or 0]
+        if sum(ratings) / 2 < min_rating:
+            return False
+    return True
+
+
+def reciprocal_rank_fusion(
+    *rankings: Sequence[Mapping[str, Any]],
+) -> list[Mapping[str, Any]]:
+    """Merge ranked lists of rows by summing 1 / (k + rank) per row."""
+    scores: dict[str, float] = defaultdict(float)
+    rows: dict[str, Mapping[str, Any]] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            key = _row_key(row)
+            scores[key] += 1 / (_RRF_K + rank)
+            # Keep the first copy seen; vector hits carry a similarity score.
+            rows.setdefault(key, row)
+    return [rows[key] for key in sorted(scores, key=scores.__getitem__, reverse=True)]
+
+
+def _retrieve(
+    query: str, keywords: str, household: str, **filters
+) -> list[Mapping[str, Any]]:
+    vector_hits = search_similar(
+        query, limit=_CANDIDATES, household=household, **filters
+    )
+    lexical_hits = _get_index(household).search(keywords, limit=_CANDIDATES, **filters)
+    return reciprocal_rank_fusion(vector_hits, lexical_hits)
+
+
+@traced("retrieval.hybrid_search")
+def hybrid_search(
+    query: str,
+    keywords: str,
+    media_type: str | None = None,
+    genres: list[str] | None = None,
+    limit: int = 5,
+    household: str = DEFAULT_HOUSEHOLD,
+) -> list[SearchHit]:
+    """Fuse vector similarity for ``query`` with BM25 matches for ``keywords``,
+    within ``household``'s library.
+
+    ``media_type`` ("movie" or "series") and ``genres`` are pushed down into
+    both retrievers as filters. If too few rows match the genres, the rest of
+    the slots are backfilled from the same type without the genre filter.
+    Lexical hits are full library rows, so the result is projected to
+    SearchHits like the vector hits.
+    """
+    results = _retrieve(
+        query, keywords, household, media_type=media_type, genres=genres
+    )
+    if genres and len(results) < limit:
+        seen = {_row_key(row) for row in results}
+        backfill = _retrieve(query, keywords, household, media_type=media_type)
+        results += [row for row in backfill if _row_key(row) not in seen]
+
+    return [to_search_hit(row) for row in results[:limit]]
@@ -0,0 +1,92 @@
+"""Speculative work for recommendation threads.
+
+While a user is still answering, the input of a later graph step can often be
+guessed already. A Speculator runs that step in the background under a key
+describing the input it guessed; when the step really runs it takes the
+result if the key matches and computes it itself otherwise. Speculation is
+best-effort: it is dropped rather than queued when every worker is busy, and
+a failed speculation just means the step runs as usual.
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from app.metrics import Counter
+
+T = TypeVar("T")
+
+_SPECULATIONS = Counter(
+    "popchoice_speculation_total",
+    "Speculative work by kind and outcome (started, skipped, hit, stale, miss, "
+    "failed).",
+    labels=("kind", "result"),
+)
+
+
+class Speculator:
+    def __init__(self, kind: str, workers: int, max_threads: int = 1024) -> None:
+        self.kind = kind
+        self.workers = workers
+        self.max_threads = max_threads
+        self._pending: OrderedDict[str, tuple[Hashable, Future]] = OrderedDict()
+        self._running = 0
+        self._lock = threading.Lock()
+        # Created on first use, so pre-forked workers each start their own.
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _start(self, fn: Callable[..., Any], *args: Any) -> Future | None:
+        with self._lock:
+            if self._running >= self.workers:
+                _SPECULATIONS.inc(kind=self.kind, result="skipped")
+                return None
+            self._running += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix=f"speculate-{self.kind}"
+                )
+        _SPECULATIONS.inc(kind=self.kind, result="started")
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self._running -= 1
+
+    def submit(
+        self, thread_id: str, key: Hashable, fn: Callable[..., Any], *args: Any
+    ) -> None:
+        """Compute ``fn(*args)`` for ``thread_id`` ahead of time, replacing
+        any earlier guess for that thread."""
+        future = self._start(fn, *args)
+        if future is None:
+            return
+        with self._lock:
+            self._pending[thread_id] = (key, future)
+            self._pending.move_to_end(thread_id)
+            while len(self._pending) > self.max_threads:
+                self._pending.popitem(last=False)
+
+    def take(self, thread_id: str | None, key: Hashable, compute: Callable[[], T]) -> T:
+        """The speculative result for ``thread_id`` if it was computed for
+        ``key`` (waiting for it if still running), else ``compute()``."""
+        if thread_id is None:
+            return compute()
+        with self._lock:
+            key_guessed, future = self._pending.pop(thread_id, (None, None))
+        if future is None:
+            _SPECULATIONS.inc(kind=self.kind, result="miss")
+            return compute()
+        if key_guessed != key:
+            _SPECULATIONS.inc(kind=self.kind, result="stale")
+            return compute()
+        try:
+            result = future.result()
+        except Exception:
+            _SPECULATIONS.inc(kind=self.kind, result="failed")
+            return compute()
+        _SPECULATIONS.inc(kind=self.kind, result="hit")
+        return result
@@ -0,0 +1,46 @@
+"""Signed thread tokens handed out by /recommend/start.
+
+A token names a graph thread that doesn't exist yet, plus the region and the
+household the session was started with:
+``<thread id>.<region>.<household>.<signature>``. The server keeps nothing
+until the first reply, so the signature (an HMAC keyed from API_SECRET) is
+what stops clients from minting threads or switching region or household.
+"""
+
+import base64
+import hashlib
+import hmac
+import uuid
+from dataclasses import dataclass
+
+from app.config import API_SECRET, DEFAULT_HOUSEHOLD
+
+_KEY = hmac.new(API_SECRET.encode(), b"popchoice thread token", "sha256").digest()
+
+
+@dataclass(frozen=True)
+class ThreadToken:
+    thread_id: str
+    region: str
+    household: str
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_KEY, payload.encode(), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue(region: str, household: str = DEFAULT_HOUSEHOLD) -> str:
+    payload = f"{uuid.uuid4().hex}.{region}.{household}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def read(token: str) -> ThreadToken | None:
+    """The thread a token names, or None if it is malformed or forged."""
+    parts = token.split(".")
+    if len(parts) != 4 or not all(parts):
+        return None
+    thread_id, region, household, signature = parts
+    if not hmac.compare_digest(signature, _sign(f"{thread_id}.{region}.{household}")):
+        return None
+    return ThreadToken(thread_id=thread_id, region=region, household=household)
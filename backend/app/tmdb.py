@@ -1,45 +1,239 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
 import httpx
 
-from app.config import TMDB_API_KEY
+from app import profiling
+from app.config import (
+    TMDB_API_KEY,
+    TMDB_BASE_URL,
+    TMDB_CONNECT_TIMEOUT_SECONDS,
+    TMDB_GENRES_TIMEOUT_SECONDS,
+    TMDB_HEDGE,
+    TMDB_HEDGE_DELAY_MS,
+    TMDB_HEDGE_MIN_DELAY_MS,
+    TMDB_HEDGE_WORKERS,
+    TMDB_MAX_RPS,
+    TMDB_PROVIDERS_TIMEOUT_SECONDS,
+    TMDB_SEARCH_TIMEOUT_SECONDS,
+)
+from app.hedging import Hedger
+from app.metrics import Counter
+from app.tracing import traced
 
-_BASE = "https://api.themoviedb.org/3"
+_BASE = TMDB_BASE_URL
 
-_movie_genres: dict[int, str] = {}
-_tv_genres: dict[int, str] = {}
+_TIMEOUTS = {
+    endpoint: httpx.Timeout(seconds, connect=TMDB_CONNECT_TIMEOUT_SECONDS)
+    for endpoint, seconds in (
+        ("genres", TMDB_GENRES_TIMEOUT_SECONDS),
+        ("search", TMDB_SEARCH_TIMEOUT_SECONDS),
+        ("providers", TMDB_PROVIDERS_TIMEOUT_SECONDS),
+    )
+}
 
+# Searches and provider lookups are GETs, safe to send twice. Each endpoint
+# tracks its own latency, so a hedge fires after that endpoint's p95.
+_hedgers = {
+    endpoint: Hedger(
+        f"tmdb.{endpoint}",
+        enabled=TMDB_HEDGE,
+        delay_ms=TMDB_HEDGE_DELAY_MS,
+        min_delay_ms=TMDB_HEDGE_MIN_DELAY_MS,
+        workers=TMDB_HEDGE_WORKERS,
+    )
+    for endpoint in ("search", "providers")
+}
 
-def _load_genres() -> None:
-    with httpx.Client() as client:
-        movie_resp = client.get(
-            f"{_BASE}/genre/movie/list", params={"api_key": TMDB_API_KEY}
-        )
-        tv_resp = client.get(f"{_BASE}/genre/tv/list", params={"api_key": TMDB_API_KEY})
-    movie_resp.raise_for_status()
-    tv_resp.raise_for_status()
-    for g in movie_resp.json()["genres"]:
-        _movie_genres[g["id"]] = g["name"]
-    for g in tv_resp.json()["genres"]:
-        _tv_genres[g["id"]] = g["name"]
 
+class _RateLimiter:
+    """Token bucket shared by every TMDB request in the process: up to
+    ``rate`` requests per second, in bursts of up to ``rate``. A request over
+    the limit reserves the next free slot and sleeps until it comes up."""
 
-def search_media(query: str) -> list[dict]:
-    if not _movie_genres:
-        _load_genres()
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
 
-    with httpx.Client() as client:
-        resp = client.get(
-            f"{_BASE}/search/multi",
-            params={"api_key": TMDB_API_KEY, "query": query, "include_adult": False},
-        )
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.rate, self._tokens + elapsed * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is free now; never waits."""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.rate, self._tokens + elapsed * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+_rate_limiter = _RateLimiter(TMDB_MAX_RPS)
+
+
+# One pooled client per process. Building an httpx.Client loads the CA bundle,
+# ~40ms of CPU: more than most TMDB round trips.
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> httpx.Client:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client()
+    return _client
+
+
+def _reset_after_fork() -> None:
+    global _client, _client_lock, _rate_limiter
+    _client = None
+    _client_lock = threading.Lock()
+    _rate_limiter = _RateLimiter(TMDB_MAX_RPS)
+
+
+# The gunicorn master refreshes the genre maps before forking; workers must not
+# share its connections.
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _send(path: str, params: dict, timeout: httpx.Timeout) -> httpx.Response:
+    return _get_client().get(
+        f"{_BASE}/{path}",
+        params={"api_key": TMDB_API_KEY, **params},
+        timeout=timeout,
+    )
+
+
+def _get(endpoint: str, path: str, params: dict) -> httpx.Response:
+    """GET ``path`` with ``endpoint``'s timeout, hedged if enabled.
+
+    The losing copy of a hedged request is not interrupted: it finishes or
+    times out in the background and its response is dropped.
+
+    The request waits for the rate limit before the hedge delay starts, so
+    that wait isn't taken for a slow answer. A second copy takes a token too,
+    but only if one is free: it is never sent late, after waiting its turn.
+    """
+    _rate_limiter.acquire()
+    return _hedgers[endpoint].call(
+        lambda: _send(path, params, _TIMEOUTS[endpoint]),
+        may_hedge=_rate_limiter.try_acquire,
+    )
+
+
+# Genre id -> name per TMDB media type ("movie", "tv"). Starts from the
+# bundled snapshot so no search waits on TMDB, and is replaced wholesale (never
+# mutated) when a refresh comes back, so readers always see a complete map.
+_SNAPSHOT = Path(__file__).parent / "data" / "tmdb_genres.json"
+
+# TMDB rarely changes its genre lists; refresh daily, and retry a failed
+# refresh after a minute (the current maps stay in use meanwhile).
+_GENRE_TTL_SECONDS = 24 * 60 * 60
+_GENRE_RETRY_SECONDS = 60
+
+_refresh_lock = threading.Lock()
+_next_refresh = 0.0
+
+
+def _genre_map(genres: list[dict]) -> dict[int, str]:
+    return {g["id"]: g["name"] for g in genres}
+
+
+def _load_snapshot() -> dict[str, dict[int, str]]:
+    data = json.loads(_SNAPSHOT.read_text())
+    return {media_type: _genre_map(genres) for media_type, genres in data.items()}
+
+
+_genre_maps = _load_snapshot()
+profiling.track("tmdb.genre_maps", lambda: _genre_maps)
+
+
+@traced("tmdb.refresh_genres")
+def refresh_genres() -> None:
+    """Fetch both genre lists from TMDB and swap them in.
+
+    Only one refresh runs at a time; callers arriving while one is in flight
+    return immediately and keep using the current maps.
+    """
+    global _genre_maps, _next_refresh
+    if not _refresh_lock.acquire(blocking=False):
+        return
+    try:
+        _next_refresh = time.monotonic() + _GENRE_RETRY_SECONDS
+        _rate_limiter.acquire()
+        movie_resp = _send("genre/movie/list", {}, _TIMEOUTS["genres"])
+        _rate_limiter.acquire()
+        tv_resp = _send("genre/tv/list", {}, _TIMEOUTS["genres"])
+        movie_resp.raise_for_status()
+        tv_resp.raise_for_status()
+        _genre_maps = {
+            "movie": _genre_map(movie_resp.json()["genres"]),
+            "tv": _genre_map(tv_resp.json()["genres"]),
+        }
+        _next_refresh = time.monotonic() + _GENRE_TTL_SECONDS
+    finally:
+        _refresh_lock.release()
+
+
+def _refresh_in_background() -> None:
+    try:
+        refresh_genres()
+    except httpx.HTTPError:
+        pass  # retried after _GENRE_RETRY_SECONDS; the snapshot still applies
+
+
+def warm_up() -> None:
+    """Fetch current genre maps now (at startup) instead of in the background.
+
+    A no-op while the maps are fresh: workers forked from a preloaded master
+    keep the maps it fetched (shared copy-on-write) instead of each fetching
+    and replacing them.
+    """
+    if time.monotonic() < _next_refresh:
+        return
+    refresh_genres()
+
+
+@traced("tmdb.search_media")
+def _fetch_search(query: str) -> list[dict]:
+    resp = _get("search", "search/multi", {"query": query, "include_adult": False})
     resp.raise_for_status()
 
+    genre_maps = _genre_maps
     results = []
     for item in resp.json().get("results", []):
         media_type = item.get("media_type")
-        if media_type not in ("movie", "tv"):
+        genre_map = genre_maps.get(media_type)
+        if genre_map is None:  # people, collections
             continue
         is_movie = media_type == "movie"
-        genre_map = _movie_genres if is_movie else _tv_genres
         genres = [
             genre_map[gid] for gid in item.get("genre_ids", []) if gid in genre_map
         ]
@@ -59,12 +253,124 @@ def search_media(query: str) -> list[dict]:
     return results[:10]
 
 
-def get_watch_providers(tmdb_id: int, media_type: str) -> dict:
-    endpoint = "movie" if media_type == "movie" else "tv"
-    with httpx.Client() as client:
-        resp = client.get(
-            f"{_BASE}/{endpoint}/{tmdb_id}/watch/providers",
-            params={"api_key": TMDB_API_KEY},
-        )
+@dataclass(frozen=True)
+class SearchPage:
+    """One cached /search/multi result: shaped results, their JSON, an ETag."""
+
+    results: list[dict]
+    body: bytes
+    etag: str
+    expires_at: float  # time.monotonic()
+
+    @property
+    def max_age(self) -> int:
+        return max(0, int(self.expires_at - time.monotonic()))
+
+
+_CACHE_LOOKUPS = Counter(
+    "popchoice_tmdb_cache_total",
+    "TMDB cache lookups by cache and result.",
+    labels=("cache", "result"),
+)
+
+
+class _TTLCache:
+    """Thread-safe LRU whose entries also expire at a given monotonic time."""
+
+    def __init__(self, name: str, maxsize: int) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                _CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+                return None
+            self._entries.move_to_end(key)
+        _CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Autocomplete sends the same prefixes over and over; TMDB search results for
+# a query barely move within an hour.
+_SEARCH_TTL_SECONDS = 60 * 60
+_search_cache = _TTLCache("search", maxsize=1024)
+profiling.track("tmdb.search_cache", lambda: _search_cache)
+
+
+def search_page(query: str) -> SearchPage:
+    """Search results for ``query``, from the cache while they're fresh.
+
+    The ETag is a hash of the serialized results, so a refetch that returns
+    the same results keeps the same ETag and clients can still revalidate.
+    """
+    key = " ".join(query.lower().split())
+    page = _search_cache.get(key)
+    if page is not None:
+        return page
+
+    if time.monotonic() >= _next_refresh and not _refresh_lock.locked():
+        threading.Thread(
+            target=_refresh_in_background, name="tmdb-genres", daemon=True
+        ).start()
+
+    results = _fetch_search(query)
+    body = json.dumps(results, separators=(",", ":")).encode()
+    page = SearchPage(
+        results=results,
+        body=body,
+        etag='"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"',
+        expires_at=time.monotonic() + _SEARCH_TTL_SECONDS,
+    )
+    _search_cache.put(key, page, page.expires_at)
+    return page
+
+
+def search_media(query: str) -> list[dict]:
+    return search_page(query).results
+
+
+# Provider availability changes a few times a day at most. One entry holds
+# every region TMDB returned for the title, so households in different
+# countries share it.
+_PROVIDERS_TTL_SECONDS = 6 * 60 * 60
+_providers_cache = _TTLCache("providers", maxsize=4096)
+profiling.track("tmdb.providers_cache", lambda: _providers_cache)
+
+
+@traced("tmdb.get_watch_providers")
+def _fetch_watch_providers(endpoint: str, tmdb_id: int) -> dict:
+    resp = _get("providers", f"{endpoint}/{tmdb_id}/watch/providers", {})
     resp.raise_for_status()
     return resp.json().get("results", {})
+
+
+def get_watch_providers(tmdb_id: int, media_type: str) -> dict:
+    """Watch providers for a title in every region, keyed by country code."""
+    endpoint = "movie" if media_type == "movie" else "tv"
+    providers = _providers_cache.get((endpoint, tmdb_id))
+    if providers is None:
+        providers = _fetch_watch_providers(endpoint, tmdb_id)
+        expires_at = time.monotonic() + _PROVIDERS_TTL_SECONDS
+        _providers_cache.put((endpoint, tmdb_id), providers, expires_at)
+    return providers
@@ -0,0 +1,143 @@
+"""Request tracing for graph nodes, embeddings, database, TMDB and LLM calls.
+
+Every span's duration is recorded in the ``popchoice_span_duration_seconds``
+histogram. Spans are only exported when TRACING_EXPORTER is set: "console" and
+"json" write to stderr, "otel" hands spans to the OpenTelemetry API so any
+configured SDK/exporter picks them up. Spans opened while a thread scope is
+active are tagged with its ``thread_id``.
+"""
+
+import functools
+import importlib
+import inspect
+import json
+import os
+import sys
+import time
+from collections.abc import Callable, Generator
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, ParamSpec, TypeVar, cast
+
+from app.config import TRACING_EXPORTER
+from app.metrics import Histogram
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+_SPAN_SECONDS = Histogram(
+    "popchoice_span_duration_seconds",
+    "Duration of traced operations.",
+    labels=("span",),
+)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start: float
+    attributes: dict[str, Any] = field(default_factory=dict)
+    duration: float = 0.0
+    error: str | None = None
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_thread_id: ContextVar[str | None] = ContextVar("thread_id", default=None)
+
+
+@contextmanager
+def thread_scope(thread_id: str | None) -> Generator[None]:
+    """Tag spans opened inside this block with ``thread_id``."""
+    token = _thread_id.set(thread_id)
+    try:
+        yield
+    finally:
+        _thread_id.reset(token)
+
+
+def current_thread_id() -> str | None:
+    """The graph thread of the enclosing thread_scope, if any."""
+    return _thread_id.get()
+
+
+def _export(finished: Span) -> None:
+    if TRACING_EXPORTER == "console":
+        attrs = " ".join(f"{k}={v}" for k, v in finished.attributes.items())
+        error = f" error={finished.error}" if finished.error else ""
+        print(
+            f"[trace {finished.trace_id[:8]}] {finished.name} "
+            f"{finished.duration * 1000:.1f}ms {attrs}{error}".rstrip(),
+            file=sys.stderr,
+        )
+    elif TRACING_EXPORTER == "json":
+        print(json.dumps(asdict(finished), default=str), file=sys.stderr)
+
+
+@functools.cache
+def _otel_tracer() -> Any:
+    # opentelemetry-api isn't a dependency: only TRACING_EXPORTER=otel needs
+    # it, installed alongside whatever SDK exports the spans.
+    trace = importlib.import_module("opentelemetry.trace")
+    return trace.get_tracer("popchoice")
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Generator[Span]:
+    parent = _current_span.get()
+    thread_id = _thread_id.get()
+    if thread_id is not None:
+        attributes.setdefault("thread_id", thread_id)
+
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent else None,
+        start=time.time(),
+        attributes=attributes,
+    )
+    otel = (
+        _otel_tracer().start_as_current_span(name, attributes=attributes)
+        if TRACING_EXPORTER == "otel"
+        else nullcontext()
+    )
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        with otel:
+            yield current
+    except BaseException as exc:
+        current.error = type(exc).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        _SPAN_SECONDS.observe(current.duration, span=name)
+        _export(current)
+
+
+def traced(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Decorator: run the function (or coroutine function) inside ``span(name)``."""
+
+    def decorator(fn: Callable[P, R]) -> Callable[P, R]:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> Any:
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return cast(Callable[P, R], async_wrapper)
+
+        @functools.wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
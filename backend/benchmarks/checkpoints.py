@@ -0,0 +1,188 @@
+"""Per-reply latency by checkpointer and checkpoint durability.
+
+Runs recommendation sessions (three replies each, as /recommend/reply runs
+them) straight against the graph, with every combination of:
+
+- checkpointer: MemorySaver; SupabaseSaver writing each put through
+  (``CHECKPOINT_FLUSH_MS=0``); SupabaseSaver batching puts
+  (``--flush-ms``; with "sync" it writes through too). Supabase is the in-memory store with ``--db-latency-ms``
+  per request.
+- durability: "sync", "async", "exit" (CHECKPOINT_DURABILITY).
+
+Reports reply latency percentiles and checkpoint requests (writes and reads)
+per reply.
+TMDB and the chat model are local stubs as in benchmarks.run.
+
+Usage (from backend/):
+    uv run python -m benchmarks.checkpoints --sessions 40 --db-latency-ms 10
+    uv run python -m benchmarks.checkpoints --concurrency 8
+    uv run python -m benchmarks.checkpoints --fake-embeddings
+"""
+
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.run import _percentiles
+from benchmarks.stubs import (
+    FakeChatModel,
+    HashingEncoder,
+    InMemorySupabase,
+    TMDBStub,
+    fixed_latency,
+)
+
+DURABILITIES = ("sync", "async", "exit")
+ANSWERS = ("tense, dark", "movie", "no preference")
+
+
+def _setup(args: argparse.Namespace) -> InMemorySupabase:
+    """Point the app at the stubs; app modules are imported after this."""
+    tmdb = TMDBStub(fixed_latency(args.tmdb_latency_ms)).start()
+    os.environ["TMDB_BASE_URL"] = tmdb.url
+    for name in ("SUPABASE_URL", "SUPABASE_ANON_KEY", "ANTHROPIC_API_KEY"):
+        os.environ.setdefault(name, "http://localhost" if "URL" in name else "bench")
+    os.environ.setdefault("TMDB_API_KEY", "bench")
+    os.environ.setdefault("API_SECRET", "bench")
+
+    if args.fake_embeddings:
+        import sentence_transformers
+
+        sentence_transformers.SentenceTransformer = HashingEncoder  # type: ignore[misc]
+
+    import app.agent
+    import app.database
+    from benchmarks.run import _library_entry, _seed_library
+
+    store = InMemorySupabase(fixed_latency(args.db_latency_ms))
+    app.database._client = store  # type: ignore[assignment]
+    rng = random.Random(0)
+    rows = [{**_library_entry(i, rng), "id": f"{i:06d}"} for i in range(200)]
+    _seed_library(store, rows)
+
+    llm = FakeChatModel(tokens_per_second=2000, first_token_ms=args.first_token_ms)
+    app.agent._llm = llm
+    app.agent._llm_with_tools = llm.bind_tools([app.agent.check_streaming_availability])
+    return store
+
+
+def _reply(graph, config: dict, answer: str, durability: str) -> str | None:
+    """What /recommend/reply does with the graph for one answer."""
+    from langgraph.types import Command
+
+    from app.agent import begin_thread
+
+    if graph.get_state(config).values:
+        graph_input = Command(resume=answer)
+    else:
+        begin_thread(config, "RO", answer)
+        graph_input = None
+    question = None
+    for mode, payload in graph.stream(
+        graph_input,
+        config,
+        stream_mode=["messages", "updates"],
+        durability=durability,
+    ):
+        if mode == "updates" and "__interrupt__" in payload:
+            question = payload["__interrupt__"][0].value
+    return question
+
+
+def _count_requests(requests: Counter):
+    """Wrap app.database._execute to count checkpoint requests by op."""
+    import app.database
+
+    execute = app.database._execute
+
+    def counted(op: str, query, idempotent: bool = True):
+        if "checkpoint" in op:
+            requests[op] += 1
+        return execute(op, query, idempotent)
+
+    app.database._execute = counted
+
+
+def _measure(
+    checkpointer, durability: str, requests: Counter, args: argparse.Namespace
+) -> dict:
+    import app.agent
+
+    graph = app.agent.build_graph(checkpointer)
+    app.agent._recommender = graph
+    requests.clear()
+    latencies: list[float] = []
+
+    def session(i: int) -> None:
+        config = {"configurable": {"thread_id": f"{durability}-{i}-{time.time()}"}}
+        for answer in ANSWERS:
+            started = time.perf_counter()
+            _reply(graph, config, answer, durability)
+            latencies.append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(session, range(args.sessions)))
+    if hasattr(checkpointer, "close"):
+        checkpointer.close()
+    writes = sum(n for op, n in requests.items() if op.startswith("save_"))
+    reads = sum(n for op, n in requests.items() if op.startswith("load_"))
+    return {
+        "latency_ms": _percentiles(latencies),
+        "writes_per_reply": writes / len(latencies),
+        "reads_per_reply": reads / len(latencies),
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--db-latency-ms", type=float, default=10)
+    parser.add_argument("--tmdb-latency-ms", type=float, default=30)
+    parser.add_argument("--first-token-ms", type=float, default=50)
+    parser.add_argument("--flush-ms", type=float, default=20)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    _setup(args)
+    requests: Counter = Counter()
+    _count_requests(requests)
+
+    from langgraph.checkpoint.memory import MemorySaver
+
+    from app.checkpoints import SupabaseSaver
+
+    checkpointers = {
+        "memory": lambda durability: MemorySaver(),
+        "supabase, write-through": lambda durability: SupabaseSaver(
+            flush_ms=0, durability=durability
+        ),
+        "supabase, batched": lambda durability: SupabaseSaver(
+            flush_ms=args.flush_ms, durability=durability
+        ),
+    }
+    print(
+        f"{args.sessions} sessions x {len(ANSWERS)} replies at concurrency "
+        f"{args.concurrency}, {args.db_latency_ms:.0f}ms per database request\n"
+        f"{'checkpointer':<24} {'durability':<10} {'p50':>8} {'p95':>8} "
+        f"{'mean':>8} {'writes/reply':>13} {'reads/reply':>12}"
+    )
+    for name, make in checkpointers.items():
+        for durability in DURABILITIES:
+            result = _measure(make(durability), durability, requests, args)
+            latency = result["latency_ms"]
+            print(
+                f"{name:<24} {durability:<10} {latency['p50']:6.1f}ms "
+                f"{latency['p95']:6.1f}ms {latency['mean']:6.1f}ms "
+                f"{result['writes_per_reply']:13.1f} {result['reads_per_reply']:12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Cold-start profile: import-time breakdown and time to first /search.
+
+Runs ``python -X importtime -c "import main"`` and lists the slowest top-level
+packages, then launches uvicorn in a fresh process against the TMDB stub and
+times spawn -> first successful /search. Exits non-zero if that exceeds the
+budget.
+
+Usage (from backend/):
+    uv run python -m benchmarks.cold_start --budget-ms 2500
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.stubs import TMDBStub
+
+# Time from process spawn to the first /search response, with startup warm-up
+# disabled (the scale-to-zero configuration).
+DEFAULT_BUDGET_MS = 2500
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _env(**extra: str) -> dict[str, str]:
+    env = {
+        "SUPABASE_URL": "http://localhost",
+        "SUPABASE_ANON_KEY": "bench",
+        "ANTHROPIC_API_KEY": "bench",
+        "TMDB_API_KEY": "bench",
+        "API_SECRET": "bench",
+        **os.environ,
+    }
+    env.update(extra)
+    return env
+
+
+def import_profile(top: int) -> dict:
+    """Cumulative import time of main and its slowest top-level packages."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True,
+        text=True,
+        env=_env(),
+        check=True,
+    )
+    packages: dict[str, int] = defaultdict(int)
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        packages[module.split(".")[0]] += int(self_us)
+        if module == "main":
+            total_us = int(cumulative_us)
+    slowest = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {
+        "import_main_ms": total_us / 1000,
+        "slowest_packages_ms": {name: us / 1000 for name, us in slowest},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_search(tmdb_url: str, warmup: bool, timeout: float = 120) -> float:
+    port = _free_port()
+    env = _env(TMDB_BASE_URL=tmdb_url, WARMUP_ON_STARTUP="1" if warmup else "0")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        headers = {"Authorization": f"Bearer {env['API_SECRET']}"}
+        with httpx.Client(headers=headers) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    resp = client.get(
+                        f"http://127.0.0.1:{port}/search", params={"q": "heat"}
+                    )
+                    if resp.status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise TimeoutError("server never answered /search")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args()
+
+    report = import_profile(args.top)
+    tmdb = TMDBStub().start()
+    try:
+        report["first_search_ms"] = {
+            "warmup_off": time_to_first_search(tmdb.url, warmup=False) * 1000,
+            "warmup_on": time_to_first_search(tmdb.url, warmup=True) * 1000,
+        }
+    finally:
+        tmdb.stop()
+    report["budget_ms"] = args.budget_ms
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import main: {report['import_main_ms']:.0f}ms")
+        for name, ms in report["slowest_packages_ms"].items():
+            print(f"  {name:<28} {ms:8.1f}ms")
+        for mode, ms in report["first_search_ms"].items():
+            print(f"first /search ({mode}): {ms:.0f}ms")
+
+    over = report["first_search_ms"]["warmup_off"] > args.budget_ms
+    if over:
+        print(f"over budget ({args.budget_ms:.0f}ms)", file=sys.stderr)
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
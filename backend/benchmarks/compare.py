@@ -0,0 +1,55 @@
+"""Compare two benchmark result files written by benchmarks.run.
+
+Usage (from backend/):
+    uv run python -m benchmarks.compare results/old.json results/new.json
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+METRICS = (
+    ("requests_per_second", None),
+    ("latency_ms", "p50"),
+    ("latency_ms", "p95"),
+    ("latency_ms", "p99"),
+    ("time_to_first_chunk_ms", "p50"),
+    ("time_to_first_chunk_ms", "p95"),
+    ("wire_bytes_per_response", None),
+)
+
+
+def _value(summary: dict, metric: str, key: str | None) -> float | None:
+    value = summary.get(metric)
+    if key is not None:
+        value = (value or {}).get(key)
+    return value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    args = parser.parse_args()
+
+    old = json.loads(args.baseline.read_text())
+    new = json.loads(args.candidate.read_text())
+    print(f"{old['commit']} -> {new['commit']}")
+
+    for scenario, new_summary in new["scenarios"].items():
+        old_summary = old["scenarios"].get(scenario)
+        if old_summary is None:
+            continue
+        print(f"\n{scenario}")
+        for metric, key in METRICS:
+            before = _value(old_summary, metric, key)
+            after = _value(new_summary, metric, key)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            label = f"{metric}.{key}" if key else metric
+            print(f"  {label:<28} {before:10.1f} {after:10.1f} {change:+7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
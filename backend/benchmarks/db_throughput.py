@@ -0,0 +1,237 @@
+"""Supabase data-access throughput against a local PostgREST stand-in.
+
+Points the real supabase-py clients at benchmarks.stubs.PostgRESTStub (each
+call takes ``--latency-ms``, and fails with PostgREST's 503 at
+``--failure-rate``) and runs the search_similar_media RPC and watched_media
+inserts at ``--concurrency``:
+
+- sync, library pool: the client as create_client builds it (keeps at most
+  20 idle connections), called from a thread pool, no retries — how
+  app.database worked before it tuned the pool.
+- sync, tuned pool: app.database.get_client() from a thread pool, with retries.
+- async, tuned pool: app.database.get_async_client() from one event loop, with
+  retries.
+
+Reports ops/s, latency percentiles, calls that still failed and the number of
+TCP connections the stub accepted.
+
+Usage (from backend/):
+    uv run python -m benchmarks.db_throughput --concurrency 64 --requests 2000
+    uv run python -m benchmarks.db_throughput --failure-rate 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+from postgrest.exceptions import APIError
+
+from benchmarks.run import _free_port, _percentiles
+from benchmarks.stubs import PostgRESTStub, fixed_latency
+
+DIMENSIONS = 384
+
+
+def _vector(rng: np.random.Generator) -> np.ndarray:
+    return rng.standard_normal(DIMENSIONS).astype(np.float32)
+
+
+def _search_params(vector: np.ndarray) -> dict:
+    from app.embeddings import to_pgvector
+
+    return {
+        "query_embedding": to_pgvector(vector),
+        "match_threshold": 0.0,
+        "match_count": 5,
+        "filter_model": None,
+    }
+
+
+def _row(i: int, vector: np.ndarray) -> dict:
+    from app.embeddings import to_pgvector
+
+    return {"title": f"Bench {i}", "type": "movie", "embedding": to_pgvector(vector)}
+
+
+def _query(client, op: str, i: int, vector: np.ndarray):
+    if op == "search":
+        return client.rpc("search_similar_media", _search_params(vector))
+    return client.table("watched_media").insert(_row(i, vector))
+
+
+def _run_sync(client, op: str, vectors, concurrency: int, retries: bool) -> dict:
+    from app.database import _execute
+
+    latencies: list[float] = []
+    errors = 0
+
+    def call(i: int) -> None:
+        nonlocal errors
+        query = _query(client, op, i, vectors[i])
+        started = time.perf_counter()
+        try:
+            if retries:
+                _execute(op, query, idempotent=op == "search")
+            else:
+                query.execute()
+        except (httpx.HTTPError, APIError):
+            errors += 1
+            return
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(len(vectors))))
+    return _summary(latencies, errors, time.perf_counter() - started)
+
+
+async def _run_async(op: str, vectors, concurrency: int) -> dict:
+    from app.database import _aexecute, close_async_client, get_async_client
+
+    client = await get_async_client()
+    latencies: list[float] = []
+    errors = 0
+    next_index = iter(range(len(vectors)))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in next_index:
+            query = _query(client, op, i, vectors[i])
+            started = time.perf_counter()
+            try:
+                await _aexecute(op, query, idempotent=op == "search")
+            except (httpx.HTTPError, APIError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    # Each asyncio.run() is a new loop; the pool can't outlive this one.
+    await close_async_client()
+    return _summary(latencies, errors, elapsed)
+
+
+def _summary(latencies: list[float], errors: int, elapsed: float) -> dict:
+    return {
+        "ops_per_second": len(latencies) / elapsed,
+        "latency_ms": _percentiles(latencies),
+        "errors": errors,
+    }
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Run the stub in this process (the benchmark starts it as a child, so
+    the stub's threads don't compete with the clients for the GIL)."""
+    stub = PostgRESTStub(
+        fixed_latency(args.latency_ms, args.jitter_ms), args.failure_rate, args.port
+    )
+    rng = np.random.default_rng(1)
+    for i in range(args.library_size):
+        stub.store.write(_row(i, _vector(rng)))
+    stub.start()
+    threading.Event().wait()
+
+
+def _connections(url: str) -> int:
+    return httpx.get(f"{url}/_stub/stats").json()["connections"]
+
+
+def _wait_ready(url: str, timeout: float = 30) -> None:
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        try:
+            _connections(url)
+            return
+        except httpx.TransportError:
+            time.sleep(0.05)
+    raise TimeoutError("PostgREST stub never came up")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", nargs="?", choices=("bench", "serve"), default="bench")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--library-size", type=int, default=500)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    if args.mode == "serve":
+        serve(args)
+        return
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    os.environ["SUPABASE_URL"] = url
+    for name in ("SUPABASE_ANON_KEY", "ANTHROPIC_API_KEY", "TMDB_API_KEY"):
+        os.environ.setdefault(name, "bench")
+    os.environ.setdefault("API_SECRET", "bench")
+
+    command = [sys.executable, "-m", "benchmarks.db_throughput", "serve"]
+    for flag in ("latency_ms", "jitter_ms", "failure_rate", "library_size", "port"):
+        value = port if flag == "port" else getattr(args, flag)
+        command += [f"--{flag.replace('_', '-')}", str(value)]
+    stub = subprocess.Popen(command)
+
+    from supabase import create_client
+
+    from app.database import get_client
+
+    rng = np.random.default_rng(0)
+    vectors = [_vector(rng) for _ in range(args.requests)]
+    library_client = create_client(url, os.environ["SUPABASE_ANON_KEY"])
+    modes = {
+        "sync, library pool": lambda op: _run_sync(
+            library_client, op, vectors, args.concurrency, retries=False
+        ),
+        "sync, tuned pool": lambda op: _run_sync(
+            get_client(), op, vectors, args.concurrency, retries=True
+        ),
+        "async, tuned pool": lambda op: asyncio.run(
+            _run_async(op, vectors, args.concurrency)
+        ),
+    }
+
+    print(
+        f"{args.requests} calls at concurrency {args.concurrency}, "
+        f"{args.latency_ms:.0f}+{args.jitter_ms:.0f}ms per call, "
+        f"failure rate {args.failure_rate:.0%}\n"
+        f"{'op':<7} {'mode':<19} {'ops/s':>8} {'p50':>8} {'p95':>8} "
+        f"{'errors':>7} {'conns':>6}"
+    )
+    try:
+        _wait_ready(url)
+        for op in ("search", "insert"):
+            for name, run in modes.items():
+                connections = _connections(url)
+                result = run(op)
+                latency = result["latency_ms"] or {"p50": 0.0, "p95": 0.0}
+                # -1: the stats request itself.
+                opened = _connections(url) - connections - 1
+                print(
+                    f"{op:<7} {name:<19} {result['ops_per_second']:8.0f} "
+                    f"{latency['p50']:6.1f}ms {latency['p95']:6.1f}ms "
+                    f"{result['errors']:7} {opened:6}"
+                )
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Embedding throughput: per-request encode vs. the micro-batching worker.
+
+Usage (from backend/):
+    uv run python -m benchmarks.embedding_throughput --requests 256
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.embeddings import EmbeddingBatcher, _encode_batch, load_model
+
+CONCURRENCY_LEVELS = (1, 8, 64)
+
+
+def _texts(n: int) -> list[str]:
+    return [
+        f"Title: Movie {i}. Type: movie. Genres: drama, thriller. "
+        f"Description: A story about person number {i} and their long night."
+        for i in range(n)
+    ]
+
+
+def _run(encode_one, texts: list[str], concurrency: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(encode_one, texts))
+    elapsed = time.perf_counter() - start
+    return len(texts) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    texts = _texts(args.requests)
+    model = load_model()
+    batcher = EmbeddingBatcher(
+        _encode_batch,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+    )
+    # Warm up both paths so model initialisation isn't measured.
+    model.encode(texts[0])
+    batcher.encode(texts[0])
+
+    print(f"{'callers':>8} {'direct req/s':>14} {'batched req/s':>14} {'speedup':>8}")
+    for concurrency in CONCURRENCY_LEVELS:
+        direct = _run(model.encode, texts, concurrency)
+        batched = _run(batcher.encode, texts, concurrency)
+        print(
+            f"{concurrency:>8} {direct:>14.1f} {batched:>14.1f} "
+            f"{batched / direct:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
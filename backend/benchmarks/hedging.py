@@ -0,0 +1,120 @@
+"""TMDB lookup latency with and without hedged requests.
+
+Points app.tmdb at a TMDB stub whose response times follow a heavy-tailed
+(Pareto) distribution of at least ``--tmdb-latency-ms``, then runs
+``--requests`` watch-provider lookups (a different title each, so the cache
+never answers) at ``--concurrency``, first with hedging off and then on.
+``--max-rps`` sets TMDB_MAX_RPS (0, the default here, is no limit); with a
+limit, hedges the limit has no room for are skipped.
+
+Reports lookup latency percentiles, lookups that failed (timeouts), requests
+that reached TMDB, and hedges fired, won and skipped.
+
+Usage (from backend/):
+    uv run python -m benchmarks.hedging --requests 1000 --concurrency 16
+    uv run python -m benchmarks.hedging --tmdb-latency-ms 20 --alpha 1.2
+    uv run python -m benchmarks.hedging --max-rps 40
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.run import _percentiles
+from benchmarks.stubs import TMDBStub, heavy_tailed_latency
+
+
+def _setup(args: argparse.Namespace) -> TMDBStub:
+    """Point the app at the stub; app modules are imported after this."""
+    tmdb = TMDBStub(heavy_tailed_latency(args.tmdb_latency_ms, args.alpha)).start()
+    os.environ["TMDB_BASE_URL"] = tmdb.url
+    os.environ["TMDB_MAX_RPS"] = str(args.max_rps)
+    for name in ("SUPABASE_URL", "SUPABASE_ANON_KEY", "ANTHROPIC_API_KEY"):
+        os.environ.setdefault(name, "http://localhost" if "URL" in name else "bench")
+    os.environ.setdefault("TMDB_API_KEY", "bench")
+    os.environ.setdefault("API_SECRET", "bench")
+    return tmdb
+
+
+def _measure(
+    hedged: bool, first_id: int, stub: TMDBStub, args: argparse.Namespace
+) -> dict:
+    import httpx
+
+    from app import tmdb
+    from app.hedging import _HEDGES
+
+    hedger = tmdb._hedgers["providers"]
+    hedger.enabled = hedged
+    hedger._latencies = deque(maxlen=hedger._latencies.maxlen)
+    fired = _HEDGES.value(name=hedger.name, result="fired")
+    won = _HEDGES.value(name=hedger.name, result="won")
+    skipped = _HEDGES.value(name=hedger.name, result="skipped")
+    requests = stub.requests
+    latencies: list[float] = []
+    failed = 0
+
+    def lookup(tmdb_id: int) -> None:
+        nonlocal failed
+        started = time.perf_counter()
+        try:
+            tmdb.get_watch_providers(tmdb_id, "movie")
+        except httpx.HTTPError:
+            failed += 1
+            return
+        latencies.append(time.perf_counter() - started)
+
+    ids = range(first_id, first_id + args.requests)
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(lookup, ids))
+    return {
+        "latency_ms": _percentiles(latencies),
+        "failed": failed,
+        "tmdb_requests": stub.requests - requests,
+        "hedges_fired": _HEDGES.value(name=hedger.name, result="fired") - fired,
+        "hedges_won": _HEDGES.value(name=hedger.name, result="won") - won,
+        "hedges_skipped": (_HEDGES.value(name=hedger.name, result="skipped") - skipped),
+        "delay_ms": hedger.delay() * 1000,
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--tmdb-latency-ms", type=float, default=30)
+    parser.add_argument(
+        "--alpha", type=float, default=1.5, help="Pareto shape; lower is heavier"
+    )
+    parser.add_argument("--max-rps", type=float, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    stub = _setup(args)
+    print(
+        f"{args.requests} provider lookups at concurrency {args.concurrency}, "
+        f"TMDB latency >= {args.tmdb_latency_ms:.0f}ms (Pareto alpha {args.alpha})\n"
+        f"{'hedging':<8} {'p50':>8} {'p95':>8} {'p99':>8} {'failed':>7} "
+        f"{'tmdb reqs':>10} {'fired':>6} {'won':>6} {'skipped':>8} {'delay':>8}"
+    )
+    try:
+        for i, hedged in enumerate((False, True)):
+            result = _measure(hedged, 1 + i * args.requests, stub, args)
+            latency = result["latency_ms"] or {"p50": 0, "p95": 0, "p99": 0}
+            print(
+                f"{'on' if hedged else 'off':<8} {latency['p50']:6.1f}ms "
+                f"{latency['p95']:6.1f}ms {latency['p99']:6.1f}ms "
+                f"{result['failed']:7d} {result['tmdb_requests']:10d} "
+                f"{result['hedges_fired']:6.0f} {result['hedges_won']:6.0f} "
+                f"{result['hedges_skipped']:8.0f} {result['delay_ms']:6.1f}ms"
+            )
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
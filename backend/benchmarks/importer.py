@@ -0,0 +1,138 @@
+"""Bulk import throughput: app.importer against one title at a time.
+
+Imports ``--titles`` distinct titles into an in-memory library:
+
+- one at a time, the way a client adding titles through /search and /media
+  does: a TMDB search, then add_media (embed one, insert one) per title;
+- with app.importer.import_titles: ``--concurrency`` TMDB lookups in flight,
+  embeddings and upserts in batches of ``--batch-size``;
+- the same bulk import again, into the library it just filled: every title
+  is unchanged, so nothing is embedded or written.
+
+TMDB is the local stub with ``--tmdb-latency-ms`` per request and
+``TMDB_MAX_RPS`` still applies (``--max-rps``, 0 for no limit). Supabase is
+the in-memory store with ``--db-latency-ms`` per request.
+
+Reports wall time, titles per second, TMDB requests, library rows and the
+outcome counts.
+
+Usage (from backend/):
+    uv run python -m benchmarks.importer --titles 1000 --concurrency 16
+    uv run python -m benchmarks.importer --fake-embeddings --max-rps 0
+"""
+
+import argparse
+import os
+import time
+from collections import Counter
+
+from benchmarks.stubs import HashingEncoder, InMemorySupabase, TMDBStub, fixed_latency
+
+
+def _setup(args: argparse.Namespace) -> TMDBStub:
+    """Point the app at the stubs; app modules are imported after this."""
+    tmdb = TMDBStub(fixed_latency(args.tmdb_latency_ms)).start()
+    os.environ["TMDB_BASE_URL"] = tmdb.url
+    os.environ["TMDB_MAX_RPS"] = str(args.max_rps)
+    for name in ("SUPABASE_URL", "SUPABASE_ANON_KEY", "ANTHROPIC_API_KEY"):
+        os.environ.setdefault(name, "http://localhost" if "URL" in name else "bench")
+    os.environ.setdefault("TMDB_API_KEY", "bench")
+    os.environ.setdefault("API_SECRET", "bench")
+
+    if args.fake_embeddings:
+        import sentence_transformers
+
+        sentence_transformers.SentenceTransformer = HashingEncoder  # type: ignore[misc]
+    return tmdb
+
+
+def _one_at_a_time(titles: list[str]) -> Counter:
+    from app.database import add_media
+    from app.importer import _pick
+    from app.tmdb import search_media
+
+    outcomes: Counter = Counter()
+    for title in titles:
+        match = _pick(search_media(title), title, None)
+        if match is None:
+            outcomes["not_found"] += 1
+            continue
+        add_media({**match, "user_review": "", "gf_review": ""})
+        outcomes["added"] += 1
+    return outcomes
+
+
+def _bulk(titles: list[str], args: argparse.Namespace) -> Counter:
+    from app.importer import import_titles
+
+    items = [{"title": title} for title in titles]
+    return Counter(
+        status["status"]
+        for status in import_titles(items, args.concurrency, args.batch_size)
+    )
+
+
+def _measure(
+    name: str, titles: list[str], store: InMemorySupabase, stub: TMDBStub, args
+) -> None:
+    import app.database
+    from app import tmdb
+
+    app.database._client = store  # type: ignore[assignment]
+    tmdb._search_cache.clear()
+    requests = stub.requests
+
+    started = time.perf_counter()
+    if name == "one-at-a-time":
+        outcomes = _one_at_a_time(titles)
+    else:
+        outcomes = _bulk(titles, args)
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{name:<14} {elapsed:8.2f}s {len(titles) / elapsed:9.1f} "
+        f"{stub.requests - requests:10d} {len(store.rows):6d} "
+        f"{dict(sorted(outcomes.items()))}"
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--titles", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-rps", type=float, default=40)
+    parser.add_argument("--tmdb-latency-ms", type=float, default=60)
+    parser.add_argument("--db-latency-ms", type=float, default=10)
+    parser.add_argument(
+        "--sequential-titles",
+        type=int,
+        default=200,
+        help="titles for the one-at-a-time run (it is slow); rate is comparable",
+    )
+    parser.add_argument("--fake-embeddings", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    stub = _setup(args)
+    titles = [f"imported title {i}" for i in range(args.titles)]
+    print(
+        f"TMDB {args.tmdb_latency_ms:.0f}ms, max {args.max_rps:g} req/s; "
+        f"Supabase {args.db_latency_ms:.0f}ms\n"
+        f"{'mode':<14} {'wall':>9} {'titles/s':>9} {'tmdb reqs':>10} "
+        f"{'rows':>6} outcomes"
+    )
+    try:
+        store = InMemorySupabase(fixed_latency(args.db_latency_ms))
+        _measure("one-at-a-time", titles[: args.sequential_titles], store, stub, args)
+        store = InMemorySupabase(fixed_latency(args.db_latency_ms))
+        _measure("bulk", titles, store, stub, args)
+        _measure("re-import", titles, store, stub, args)
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Pre-fork serving: memory per worker and throughput vs. worker count.
+
+For each worker count, serves main.app through gunicorn with gunicorn.conf.py
+(the in-memory Supabase store and the TMDB stub stand in for the real
+services), drives /search and /media, then reads every worker's
+/proc/<pid>/smaps_rollup. RSS counts shared pages in full; PSS divides them
+between the processes sharing them, so PSS per worker is what a worker
+really costs. ``--no-preload`` loads everything per worker for comparison.
+
+Linux only (smaps_rollup). Usage (from backend/):
+    uv run python -m benchmarks.prefork --workers 1 2 4
+    uv run python -m benchmarks.prefork --workers 2 4 --no-preload
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import runpy
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.run import _drive, _free_port
+from benchmarks.stubs import (
+    AsyncInMemorySupabase,
+    HashingEncoder,
+    InMemorySupabase,
+    TMDBStub,
+)
+
+CONFIG = Path(__file__).parent.parent / "gunicorn.conf.py"
+SCENARIOS = ("search", "media")
+
+
+# ---------------------------------------------------------------------------
+# Server (runs in a child process: ``python -m benchmarks.prefork serve``)
+# ---------------------------------------------------------------------------
+
+
+def serve(args: argparse.Namespace) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    if args.fake_embeddings:
+        import sentence_transformers
+
+        sentence_transformers.SentenceTransformer = HashingEncoder  # type: ignore[misc]
+
+    import app.database
+    import main
+
+    store = InMemorySupabase()
+    app.database._client = store  # type: ignore[assignment]
+    app.database._async_client = AsyncInMemorySupabase(store)  # type: ignore[assignment]
+
+    class Server(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in runpy.run_path(str(CONFIG)).items():
+                if key in self.cfg.settings:
+                    self.cfg.set(key, value)
+            self.cfg.set("bind", f"127.0.0.1:{args.port}")
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("preload_app", not args.no_preload)
+            self.cfg.set("loglevel", "warning")
+
+        def load(self):
+            return main.app
+
+    Server().run()
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+
+def _children(pid: int) -> list[int]:
+    path = Path(f"/proc/{pid}/task/{pid}/children")
+    return [int(child) for child in path.read_text().split()]
+
+
+def _memory_mb(pid: int) -> dict[str, float]:
+    """RSS, PSS and USS (private pages) of one process, in MiB."""
+    fields: dict[str, int] = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, value, *_ = line.split()
+        fields[name.rstrip(":")] = int(value)
+    private = fields["Private_Clean"] + fields["Private_Dirty"]
+    return {
+        "rss": fields["Rss"] / 1024,
+        "pss": fields["Pss"] / 1024,
+        "uss": private / 1024,
+    }
+
+
+def _wait_ready(base_url: str, token: str, timeout: float = 300) -> None:
+    started = time.monotonic()
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.monotonic() - started < timeout:
+        try:
+            resp = httpx.get(
+                f"{base_url}/search", params={"q": "heat"}, headers=headers
+            )
+            if resp.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError("gunicorn never answered /search")
+
+
+def measure(workers: int, tmdb_url: str, args: argparse.Namespace) -> dict:
+    port = _free_port()
+    env = {**os.environ, "TMDB_BASE_URL": tmdb_url}
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.prefork",
+        "serve",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+    ]
+    if args.no_preload:
+        command.append("--no-preload")
+    if args.fake_embeddings:
+        command.append("--fake-embeddings")
+    master = subprocess.Popen(command, env=env)
+
+    base_url, token = f"http://127.0.0.1:{port}", env["API_SECRET"]
+    try:
+        _wait_ready(base_url, token)
+        # Warm every worker (each loads lazily without preload) before timing.
+        asyncio.run(_drive(base_url, token, "media", workers * 8, workers * 4))
+
+        result: dict = {"workers": workers, "scenarios": {}}
+        for scenario in args.scenarios:
+            samples = asyncio.run(
+                _drive(base_url, token, scenario, args.requests, args.concurrency)
+            )
+            result["scenarios"][scenario] = samples.summary()
+
+        pids = _children(master.pid)
+        per_worker = [_memory_mb(pid) for pid in pids]
+        result["master_mb"] = _memory_mb(master.pid)
+        result["worker_mb"] = {
+            key: sum(m[key] for m in per_worker) / len(per_worker)
+            for key in ("rss", "pss", "uss")
+        }
+        result["total_pss_mb"] = result["master_mb"]["pss"] + sum(
+            m["pss"] for m in per_worker
+        )
+        return result
+    finally:
+        master.terminate()
+        master.wait()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", nargs="?", choices=("bench", "serve"), default="bench")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--no-preload", action="store_true")
+    parser.add_argument("--fake-embeddings", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    if args.mode == "serve":
+        args.workers = args.workers[0]
+        serve(args)
+        return
+
+    for name in ("SUPABASE_URL", "SUPABASE_ANON_KEY", "ANTHROPIC_API_KEY"):
+        os.environ.setdefault(name, "http://localhost" if "URL" in name else "bench")
+    os.environ.setdefault("TMDB_API_KEY", "bench")
+    os.environ.setdefault("API_SECRET", "bench")
+
+    tmdb = TMDBStub().start()
+    try:
+        results = [measure(n, tmdb.url, args) for n in args.workers]
+    finally:
+        tmdb.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"preload: {'off' if args.no_preload else 'on'}")
+    for result in results:
+        worker, master = result["worker_mb"], result["master_mb"]
+        throughput = "  ".join(
+            f"{name} {summary['requests_per_second']:7.1f} req/s"
+            for name, summary in result["scenarios"].items()
+        )
+        print(
+            f"{result['workers']} worker(s): {throughput}  "
+            f"worker rss {worker['rss']:6.1f} pss {worker['pss']:6.1f} "
+            f"uss {worker['uss']:6.1f} MiB  master rss {master['rss']:6.1f} MiB  "
+            f"total pss {result['total_pss_mb']:7.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""End-to-end latency/throughput benchmark against local stand-ins.
+
+Starts a TMDB stub, swaps the Supabase client for an in-memory vector store
+and the chat model for a fake streaming one, serves main.app with uvicorn on a
+local port and drives /search, /media and the /recommend/start + reply flow at
+the requested concurrency. Results are printed and written to
+benchmarks/results/<timestamp>-<commit>.json; compare two runs with
+``python -m benchmarks.compare old.json new.json``.
+
+Usage (from backend/):
+    uv run python -m benchmarks.run --concurrency 8 --requests 200
+    uv run python -m benchmarks.run --fake-embeddings  # no model download
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+
+import httpx
+
+from benchmarks.stubs import (
+    AsyncInMemorySupabase,
+    FakeChatModel,
+    HashingEncoder,
+    InMemorySupabase,
+    TMDBStub,
+    fixed_latency,
+)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SCENARIOS = ("search", "search_revalidate", "media", "start", "recommend")
+# Pause between a question and its answer in the recommend flow (--think-ms).
+THINK_SECONDS = 0.0
+
+GENRES = ["Action", "Comedy", "Drama", "Horror", "Thriller", "Crime", "Romance"]
+WORDS = "dark cozy tense funny slow epic heist family twist romantic gory".split()
+
+
+def _library_entry(i: int, rng: random.Random) -> dict:
+    return {
+        "title": f"Library Title {i}",
+        "type": rng.choice(["movie", "series"]),
+        "genres": rng.sample(GENRES, 2),
+        "description": " ".join(rng.choices(WORDS, k=20)),
+        "user_rating": rng.randint(4, 10),
+        "gf_rating": rng.randint(4, 10),
+        "user_review": " ".join(rng.choices(WORDS, k=12)),
+        "gf_review": " ".join(rng.choices(WORDS, k=12)),
+    }
+
+
+def _seed_library(store: InMemorySupabase, rows: list[dict]) -> None:
+    """Store ``rows`` in ``store``'s library, embedded as add_media would."""
+    from app.database import _embedding_fields
+    from app.embeddings import build_embedding_text, embed_batch
+
+    texts = [build_embedding_text(row) for row in rows]
+    payload = [
+        {**row, **_embedding_fields(vector, text)}
+        for row, vector, text in zip(rows, embed_batch(texts), texts, strict=True)
+    ]
+    store.table("watched_media").upsert(payload).execute()
+
+
+@dataclass
+class Samples:
+    latencies: list[float] = field(default_factory=list)
+    first_chunk: list[float] = field(default_factory=list)
+    wire_bytes: list[int] = field(default_factory=list)
+    errors: int = 0
+    # 503s from admission control: load deliberately shed, not failures.
+    rejected: int = 0
+    wall: float = 0.0
+
+    def summary(self) -> dict:
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "requests_per_second": len(self.latencies) / self.wall if self.wall else 0,
+            "latency_ms": _percentiles(self.latencies),
+            "time_to_first_chunk_ms": _percentiles(self.first_chunk),
+            "wire_bytes_per_response": (
+                statistics.fmean(self.wire_bytes) if self.wire_bytes else None
+            ),
+        }
+
+
+def _percentiles(values: list[float]) -> dict | None:
+    if not values:
+        return None
+    ms = sorted(v * 1000 for v in values)
+    if len(ms) == 1:
+        return {"p50": ms[0], "p95": ms[0], "p99": ms[0], "mean": ms[0]}
+    cuts = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "p50": cuts[49],
+        "p95": cuts[94],
+        "p99": cuts[98],
+        "mean": statistics.fmean(ms),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+
+async def _search(client: httpx.AsyncClient, i: int, samples: Samples) -> None:
+    started = time.perf_counter()
+    resp = await client.get("/search", params={"q": f"query {i % 50}"})
+    resp.raise_for_status()
+    samples.latencies.append(time.perf_counter() - started)
+    samples.wire_bytes.append(resp.num_bytes_downloaded)
+
+
+# ETag per query, as a browser cache would keep it.
+_etags: dict[str, str] = {}
+
+
+async def _search_revalidate(
+    client: httpx.AsyncClient, i: int, samples: Samples
+) -> None:
+    """Repeat queries with If-None-Match once an ETag is known (expect 304s)."""
+    query = f"query {i % 50}"
+    headers = {"If-None-Match": _etags[query]} if query in _etags else {}
+    started = time.perf_counter()
+    resp = await client.get("/search", params={"q": query}, headers=headers)
+    if resp.status_code != 304:
+        resp.raise_for_status()
+        _etags[query] = resp.headers["etag"]
+    samples.latencies.append(time.perf_counter() - started)
+    samples.wire_bytes.append(resp.num_bytes_downloaded)
+
+
+async def _media(client: httpx.AsyncClient, i: int, samples: Samples) -> None:
+    entry = _library_entry(100_000 + i, random.Random(i))
+    started = time.perf_counter()
+    resp = await client.post("/media", json=entry)
+    resp.raise_for_status()
+    samples.latencies.append(time.perf_counter() - started)
+
+
+async def _reply(
+    client: httpx.AsyncClient, thread_id: str, answer: str
+) -> tuple[list[dict], float | None]:
+    """Send one answer; return the SSE events and when the first chunk came."""
+    events, first_chunk = [], None
+    async with client.stream(
+        "POST", "/recommend/reply", json={"thread_id": thread_id, "answer": answer}
+    ) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event["type"] == "chunk" and first_chunk is None:
+                first_chunk = time.perf_counter()
+            events.append(event)
+    return events, first_chunk
+
+
+async def _start(client: httpx.AsyncClient, i: int, samples: Samples) -> None:
+    """Open a session and walk away, as a visitor who never answers does."""
+    started = time.perf_counter()
+    resp = await client.post("/recommend/start")
+    resp.raise_for_status()
+    samples.latencies.append(time.perf_counter() - started)
+
+
+def _answers(i: int) -> tuple[str, str, str]:
+    """Session i's answers to the mood, type and genre questions."""
+    rng = random.Random(i)
+    genres = ", ".join(rng.sample(GENRES, 2)).lower()
+    return (
+        ", ".join(rng.sample(WORDS, 2)),
+        rng.choice(["movie", "series", "both"]),
+        rng.choice([genres, "no preference"]),
+    )
+
+
+async def _recommend(client: httpx.AsyncClient, i: int, samples: Samples) -> None:
+    started = time.perf_counter()
+    resp = await client.post("/recommend/start")
+    resp.raise_for_status()
+    thread_id = resp.json()["thread_id"]
+
+    answers = _answers(i)
+    for n, answer in enumerate(answers):
+        if n:
+            # The user reading the question and typing an answer.
+            await asyncio.sleep(THINK_SECONDS)
+        sent = time.perf_counter()
+        events, first_chunk = await _reply(client, thread_id, answer)
+        if events and events[0]["type"] == "question" and n == len(answers) - 1:
+            # Too few matches: the graph asks for a nostalgic title.
+            sent = time.perf_counter()
+            events, first_chunk = await _reply(client, thread_id, "Heat")
+    if first_chunk is None:
+        raise RuntimeError(f"recommendation flow produced no chunks: {events}")
+    samples.first_chunk.append(first_chunk - sent)
+    samples.latencies.append(time.perf_counter() - started)
+
+
+_RUNNERS = {
+    "search": _search,
+    "search_revalidate": _search_revalidate,
+    "media": _media,
+    "start": _start,
+    "recommend": _recommend,
+}
+
+
+async def _drive(
+    base_url: str, token: str, scenario: str, requests: int, concurrency: int
+) -> Samples:
+    samples = Samples()
+    semaphore = asyncio.Semaphore(concurrency)
+    runner = _RUNNERS[scenario]
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=120,
+        limits=limits,
+    ) as client:
+
+        async def one(i: int) -> None:
+            async with semaphore:
+                try:
+                    await runner(client, i, samples)
+                except httpx.HTTPStatusError as exc:
+                    if exc.response.status_code == 503:
+                        samples.rejected += 1
+                        return
+                    samples.errors += 1
+                    print(f"  {scenario} #{i} failed: {exc!r}", file=sys.stderr)
+                except (httpx.HTTPError, RuntimeError) as exc:
+                    samples.errors += 1
+                    print(f"  {scenario} #{i} failed: {exc!r}", file=sys.stderr)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        samples.wall = time.perf_counter() - started
+    return samples
+
+
+# ---------------------------------------------------------------------------
+# Environment
+# ---------------------------------------------------------------------------
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+@dataclass
+class Stack:
+    base_url: str
+    token: str
+    tmdb: TMDBStub
+    stop: threading.Event
+
+
+def start_stack(args: argparse.Namespace) -> Stack:
+    """Start the stubs and serve main.app; app modules are imported here so
+    the stub URLs and fake model are in place before they load."""
+    tmdb = TMDBStub(fixed_latency(args.tmdb_latency_ms, args.tmdb_jitter_ms)).start()
+    os.environ["TMDB_BASE_URL"] = tmdb.url
+    for name in ("SUPABASE_URL", "SUPABASE_ANON_KEY", "ANTHROPIC_API_KEY"):
+        os.environ.setdefault(name, "http://localhost" if "URL" in name else "bench")
+    os.environ.setdefault("TMDB_API_KEY", "bench")
+    os.environ.setdefault("API_SECRET", "bench")
+
+    if args.fake_embeddings:
+        import sentence_transformers
+
+        sentence_transformers.SentenceTransformer = HashingEncoder  # type: ignore[misc]
+
+    import uvicorn
+
+    import app.agent
+    import app.database
+    import main
+
+    store = InMemorySupabase(fixed_latency(args.db_latency_ms))
+    app.database._client = store  # type: ignore[assignment]
+    app.database._async_client = AsyncInMemorySupabase(store)  # type: ignore[assignment]
+    rng = random.Random(0)
+    rows = [
+        {**_library_entry(i, rng), "id": f"{i:06d}"} for i in range(args.library_size)
+    ]
+    _seed_library(store, rows)
+
+    llm = FakeChatModel(
+        tokens_per_second=args.tokens_per_second, first_token_ms=args.first_token_ms
+    )
+    app.agent._llm = llm
+    app.agent._llm_with_tools = llm.bind_tools([app.agent.check_streaming_availability])
+
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    stop = threading.Event()
+
+    def shutdown() -> None:
+        stop.wait()
+        server.should_exit = True
+        tmdb.stop()
+
+    threading.Thread(target=shutdown, daemon=True).start()
+    return Stack(f"http://127.0.0.1:{port}", os.environ["API_SECRET"], tmdb, stop)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--library-size", type=int, default=200)
+    parser.add_argument("--tmdb-latency-ms", type=float, default=30)
+    parser.add_argument("--tmdb-jitter-ms", type=float, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=10)
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--first-token-ms", type=float, default=150)
+    parser.add_argument("--think-ms", type=float, default=0)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    parser.add_argument("--output", type=Path, help="defaults to benchmarks/results/")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> dict:
+    global THINK_SECONDS
+    args = parse_args(argv)
+    THINK_SECONDS = args.think_ms / 1000
+    stack = start_stack(args)
+
+    report = {
+        "commit": _commit(),
+        "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+        "config": {k: str(v) for k, v in vars(args).items() if k != "output"},
+        "scenarios": {},
+    }
+    try:
+        for scenario in args.scenarios:
+            samples = asyncio.run(
+                _drive(
+                    stack.base_url,
+                    stack.token,
+                    scenario,
+                    args.requests,
+                    args.concurrency,
+                )
+            )
+            report["scenarios"][scenario] = summary = samples.summary()
+            latency = summary["latency_ms"] or {}
+            ttfc = summary["time_to_first_chunk_ms"]
+            wire = summary["wire_bytes_per_response"]
+            print(
+                f"{scenario:<18} {summary['requests_per_second']:8.1f} req/s  "
+                f"p50 {latency.get('p50', 0):7.1f}ms  "
+                f"p95 {latency.get('p95', 0):7.1f}ms  "
+                f"p99 {latency.get('p99', 0):7.1f}ms"
+                + (f"  first chunk p50 {ttfc['p50']:.1f}ms" if ttfc else "")
+                + (f"  {wire:.0f} B/response" if wire else "")
+                + (f"  errors {summary['errors']}" if summary["errors"] else "")
+                + (f"  shed {summary['rejected']}" if summary["rejected"] else "")
+            )
+        report["tmdb_requests"] = stack.tmdb.requests
+    finally:
+        stack.stop.set()
+
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{report['commit']}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"results written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
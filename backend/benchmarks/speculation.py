@@ -0,0 +1,84 @@
+"""Last-answer latency with and without speculative search.
+
+Runs the /recommend scenario of benchmarks.run twice, in fresh processes (the
+setting is read at import, and each run should start with cold TMDB caches),
+with SPECULATIVE_SEARCH=0 and =1. Users pause ``--think-ms`` before each
+answer, which is the time speculation has to work in. Reports the time from
+sending the last answer to the first streamed chunk, and how many requests
+reached TMDB.
+
+Usage (from backend/):
+    uv run python -m benchmarks.speculation --think-ms 1500 --requests 100
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+
+def _run(speculative: bool, args: argparse.Namespace, output: Path) -> dict:
+    env = {**os.environ, "SPECULATIVE_SEARCH": "1" if speculative else "0"}
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.run",
+        "--scenarios",
+        "recommend",
+        "--requests",
+        str(args.requests),
+        "--concurrency",
+        str(args.concurrency),
+        "--think-ms",
+        str(args.think_ms),
+        "--library-size",
+        str(args.library_size),
+        "--db-latency-ms",
+        str(args.db_latency_ms),
+        "--tmdb-latency-ms",
+        str(args.tmdb_latency_ms),
+        "--output",
+        str(output),
+    ]
+    if args.fake_embeddings:
+        command.append("--fake-embeddings")
+    subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+    return json.loads(output.read_text())
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--think-ms", type=float, default=1500)
+    parser.add_argument("--library-size", type=int, default=2000)
+    parser.add_argument("--db-latency-ms", type=float, default=10)
+    parser.add_argument("--tmdb-latency-ms", type=float, default=30)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    print(
+        f"{args.requests} sessions at concurrency {args.concurrency}, "
+        f"{args.think_ms:.0f}ms per answer, {args.library_size} titles\n"
+        f"{'speculation':<12} {'last answer p50':>16} {'p95':>8} {'p99':>8} "
+        f"{'tmdb requests':>14}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for speculative in (False, True):
+            report = _run(speculative, args, Path(tmp) / f"{speculative}.json")
+            latency = report["scenarios"]["recommend"]["time_to_first_chunk_ms"]
+            print(
+                f"{'on' if speculative else 'off':<12} {latency['p50']:14.1f}ms "
+                f"{latency['p95']:6.1f}ms {latency['p99']:6.1f}ms "
+                f"{report['tmdb_requests']:14}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Events/sec for SSE chunk framing, and frames saved by coalescing.
+
+Compares the old per-token ``f"data: {json.dumps({...})}\\n\\n"`` framing with
+app.sse.chunk on the stdlib encoder and on orjson, over realistic tokens.
+Then replays a stream at ``--tokens-per-second`` through app.sse.coalesce for
+a few windows and reports how many frames and bytes go over the wire.
+
+Usage (from backend/):
+    uv run python -m benchmarks.sse_encoding --events 200000
+"""
+
+import argparse
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import app.sse as sse_module
+from app import sse
+
+# A recommendation as the model streams it: short word-piece tokens, markdown,
+# quotes, newlines and the odd non-ASCII character.
+SAMPLE = (
+    '## Heat (1995)\n\nA "slow-burn" heist epic — Pacino vs. De Niro, the diner '
+    "scene alone is worth it. Matches your tense, nostalgic mood and you both "
+    "rated crime dramas highly.\n\n### Available on: `Netflix`, `Max`\n\n"
+)
+TOKENS = [SAMPLE[i : i + 4] for i in range(0, len(SAMPLE), 4)]
+
+
+def _legacy(text: str) -> bytes:
+    return f"data: {json.dumps({'type': 'chunk', 'content': text})}\n\n".encode()
+
+
+def _stdlib_json(value: str | dict) -> bytes:
+    """What app.sse encodes with orjson, on the stdlib; the same bytes."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _events_per_second(encode, events: int) -> float:
+    tokens = (TOKENS * (events // len(TOKENS) + 1))[:events]
+    started = time.perf_counter()
+    for token in tokens:
+        encode(token)
+    return events / (time.perf_counter() - started)
+
+
+def rates(events: int) -> dict[str, float]:
+    result = {"f-string + json.dumps": _events_per_second(_legacy, events)}
+    with patch.object(sse_module, "_json", _stdlib_json):
+        result["prebuilt frame, stdlib"] = _events_per_second(sse.chunk, events)
+    result["prebuilt frame, orjson"] = _events_per_second(sse.chunk, events)
+    return result
+
+
+def coalesced(tokens_per_second: float, window_ms: float, tokens: int) -> dict:
+    """Frames and bytes for ``tokens`` arriving at a steady rate."""
+    clock = SimpleNamespace(now=0.0)
+
+    def stream():
+        for i in range(tokens):
+            clock.now = i / tokens_per_second
+            yield TOKENS[i % len(TOKENS)]
+
+    with patch.object(sse_module, "time", SimpleNamespace(monotonic=lambda: clock.now)):
+        frames = [sse.chunk(t) for t in sse.coalesce(stream(), window_ms)]
+    return {"frames": len(frames), "bytes": sum(len(f) for f in frames)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--stream-tokens", type=int, default=400)
+    args = parser.parse_args()
+
+    print(f"{'encoder':<26} {'events/s':>12}")
+    for name, rate in rates(args.events).items():
+        print(f"{name:<26} {rate:12,.0f}")
+
+    print(
+        f"\n{args.stream_tokens} tokens at {args.tokens_per_second:.0f} tokens/s"
+        f"\n{'window':<10} {'frames':>8} {'bytes':>8}"
+    )
+    for window_ms in (0, 20, 50, 100):
+        result = coalesced(args.tokens_per_second, window_ms, args.stream_tokens)
+        print(f"{window_ms:>6}ms   {result['frames']:8} {result['bytes']:8}")
+
+
+if __name__ == "__main__":
+    main()
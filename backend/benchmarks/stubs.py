@@ -0,0 +1,723 @@
+"""Local stand-ins for the services the backend talks to.
+
+- TMDBStub: threaded HTTP server speaking the subset of the TMDB API we use,
+  with configurable per-request latency.
+- FakeChatModel: chat model that calls the availability tool once, then
+  streams a fixed recommendation at a configurable token rate.
+- InMemorySupabase: the slice of the supabase-py client used by app.database,
+  backed by a numpy matrix for the search_similar_media RPC.
+  AsyncInMemorySupabase is the same store behind the async client's API.
+- PostgRESTStub: threaded HTTP server in front of an InMemorySupabase store,
+  for exercising the real Supabase clients (pooling, retries) end to end.
+- HashingEncoder: dependency-free SentenceTransformer replacement (hashed bag
+  of words) for machines without the model weights.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# ---------------------------------------------------------------------------
+# TMDB
+# ---------------------------------------------------------------------------
+
+Latency = Callable[[], float]
+
+
+def fixed_latency(ms: float, jitter_ms: float = 0.0) -> Latency:
+    """Each request takes ``ms`` plus up to ``jitter_ms`` of uniform noise."""
+    return lambda: (ms + random.uniform(0, jitter_ms)) / 1000
+
+
+def heavy_tailed_latency(
+    ms: float, alpha: float = 1.5, max_ms: float = 5000
+) -> Latency:
+    """Pareto-distributed latency of at least ``ms``: with the default
+    ``alpha``, p95 is ~7x and p99 ~22x the minimum, like a server that
+    occasionally stalls. Capped at ``max_ms``."""
+    return lambda: min(ms * random.paretovariate(alpha), max_ms) / 1000
+
+
+MOVIE_GENRES = [
+    {"id": 28, "name": "Action"},
+    {"id": 35, "name": "Comedy"},
+    {"id": 18, "name": "Drama"},
+    {"id": 27, "name": "Horror"},
+    {"id": 53, "name": "Thriller"},
+]
+TV_GENRES = [
+    {"id": 35, "name": "Comedy"},
+    {"id": 18, "name": "Drama"},
+    {"id": 80, "name": "Crime"},
+]
+
+
+def _stub_id(text: str) -> int:
+    return int(hashlib.sha256(text.encode()).hexdigest()[:7], 16)
+
+
+def _search_results(query: str) -> list[dict]:
+    results = []
+    for i in range(12):
+        media_id = _stub_id(f"{query}:{i}")
+        if i % 2 == 0:
+            results.append(
+                {
+                    "id": media_id,
+                    "media_type": "movie",
+                    "title": f"{query.title()} {i or ''}".strip(),
+                    "release_date": f"{1990 + i}-01-01",
+                    "overview": f"A film about {query}. " * 8,
+                    "genre_ids": [35, 18],
+                }
+            )
+        else:
+            results.append(
+                {
+                    "id": media_id,
+                    "media_type": "tv",
+                    "name": f"{query.title()} Show {i}",
+                    "first_air_date": f"{2000 + i}-01-01",
+                    "overview": f"A series about {query}. " * 8,
+                    "genre_ids": [80],
+                }
+            )
+    results.insert(3, {"id": 1, "media_type": "person", "name": "Some Actor"})
+    return results
+
+
+def _providers(media_id: int) -> dict:
+    netflix = {"provider_id": 8, "provider_name": "Netflix"}
+    # Roughly a third of titles aren't streamable anywhere, so the agent
+    # sometimes has to check a second candidate.
+    if media_id % 3 == 0:
+        return {}
+    return {region: {"flatrate": [netflix]} for region in ("RO", "US", "GB", "DE")}
+
+
+class _TMDBHandler(BaseHTTPRequestHandler):
+    server: "_TMDBServer"
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        self.server.requests += 1
+        time.sleep(self.server.latency())
+
+        path = url.path.removeprefix("/3")
+        if path == "/genre/movie/list":
+            body: Any = {"genres": MOVIE_GENRES}
+        elif path == "/genre/tv/list":
+            body = {"genres": TV_GENRES}
+        elif path == "/search/multi":
+            body = {"results": _search_results(params.get("query", [""])[0])}
+        elif match := re.fullmatch(r"/(movie|tv)/(\d+)/watch/providers", path):
+            body = {"id": int(match[2]), "results": _providers(int(match[2]))}
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class _TMDBServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: Latency) -> None:
+        super().__init__(("127.0.0.1", 0), _TMDBHandler)
+        self.latency = latency
+        self.requests = 0
+
+
+class TMDBStub:
+    def __init__(self, latency: Latency = fixed_latency(0)) -> None:
+        self._server = _TMDBServer(latency)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="tmdb-stub", daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/3"
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    def start(self) -> "TMDBStub":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ---------------------------------------------------------------------------
+# Chat model
+# ---------------------------------------------------------------------------
+
+RECOMMENDATION = (
+    "## Heat\n\n"
+    "This slow-burning crime epic fits your tense mood tonight. Mora loved the "
+    "long heist sequences in similar films and your girlfriend enjoys strong "
+    "character drama, so the duel between De Niro and Pacino should land for "
+    "both of you.\n\n"
+    "### Available on: `Netflix`"
+)
+
+
+class FakeChatModel(BaseChatModel):
+    """Checks availability once through the bound tool, then recommends.
+
+    ``first_token_ms`` models time-to-first-token, ``tokens_per_second`` the
+    streaming rate of the final answer (one token per whitespace-separated
+    word).
+    """
+
+    tokens_per_second: float = 100.0
+    first_token_ms: float = 0.0
+    tool_name: str | None = None
+    response: str = RECOMMENDATION
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def bind_tools(self, tools: list, **kwargs: Any) -> "FakeChatModel":  # type: ignore[override]
+        return self.model_copy(update={"tool_name": tools[0].name})
+
+    def _wants_tool(self, messages: list[BaseMessage]) -> bool:
+        return self.tool_name is not None and not any(
+            isinstance(m, ToolMessage) for m in messages
+        )
+
+    def _tool_call(self) -> dict:
+        return {
+            "name": self.tool_name,
+            "args": {"title": "Heat"},
+            "id": f"call_{uuid.uuid4().hex[:8]}",
+        }
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.first_token_ms / 1000)
+        if self._wants_tool(messages):
+            message = AIMessage(content="", tool_calls=[self._tool_call()])
+        else:
+            words = len(self.response.split())
+            time.sleep(words / self.tokens_per_second)
+            message = AIMessage(content=self.response)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_ms / 1000)
+        if self._wants_tool(messages):
+            call = self._tool_call()
+            chunk = AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {
+                        "name": call["name"],
+                        "args": json.dumps(call["args"]),
+                        "id": call["id"],
+                        "index": 0,
+                    }
+                ],
+            )
+            yield ChatGenerationChunk(message=chunk)
+            return
+
+        delay = 1 / self.tokens_per_second
+        for token in re.findall(r"\S+\s*", self.response):
+            time.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+# ---------------------------------------------------------------------------
+# Supabase
+# ---------------------------------------------------------------------------
+
+
+def _parse_vector(value: Any) -> np.ndarray:
+    if isinstance(value, str):
+        return np.array(value.strip("[]").split(","), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _split_or(expr: str) -> list[str]:
+    return re.findall(r'(?:[^,"]|"[^"]*")+', expr)
+
+
+def _or_predicate(expr: str) -> Callable[[dict], bool]:
+    """Parse the PostgREST or=(...) filters app.database uses (eq/neq/is)."""
+    clauses = []
+    for part in _split_or(expr):
+        column, op, value = part.split(".", 2)
+        clauses.append((column, op, value.strip('"')))
+
+    def matches(row: dict) -> bool:
+        for column, op, value in clauses:
+            actual = row.get(column)
+            if op == "is" and value == "null" and actual is None:
+                return True
+            if op == "eq" and actual is not None and str(actual) == value:
+                return True
+            if op == "neq" and actual is not None and str(actual) != value:
+                return True
+        return False
+
+    return matches
+
+
+class _Result:
+    def __init__(self, data: list[dict]) -> None:
+        self.data = data
+
+
+class _Query:
+    def __init__(self, store: "InMemorySupabase", table: str) -> None:
+        self._store = store
+        self._table = table
+        self._op = "select"
+        self._columns: list[str] | None = None
+        self._payload: list[dict] = []
+        self._filters: list[Callable[[dict], bool]] = []
+        self._order: str | None = None
+        self._slice = slice(None)
+        self._on_conflict = "id"
+
+    def select(self, columns: str = "*") -> "_Query":
+        self._op = "select"
+        self._columns = None if columns == "*" else columns.split(",")
+        return self
+
+    def insert(self, rows: dict | list[dict]) -> "_Query":
+        self._op = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows: dict | list[dict], on_conflict: str = "id") -> "_Query":
+        self._op = "upsert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        self._on_conflict = on_conflict
+        return self
+
+    def update(self, fields: dict) -> "_Query":
+        self._op = "update"
+        self._payload = [fields]
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def gt(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda r: str(r.get(column)) > str(value))
+        return self
+
+    def in_(self, column: str, values: list) -> "_Query":
+        wanted = set(values)
+        self._filters.append(lambda r: r.get(column) in wanted)
+        return self
+
+    def or_(self, expr: str) -> "_Query":
+        self._filters.append(_or_predicate(expr))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_Query":
+        self._order = column
+        return self
+
+    def limit(self, count: int) -> "_Query":
+        self._slice = slice(self._slice.start, (self._slice.start or 0) + count)
+        return self
+
+    def range(self, start: int, end: int) -> "_Query":
+        self._slice = slice(start, end + 1)
+        return self
+
+    def execute(self) -> _Result:
+        time.sleep(self._store.latency())
+        return self._run()
+
+    def _run(self) -> _Result:
+        with self._store.lock:
+            if self._op in ("insert", "upsert"):
+                return _Result(
+                    [self._store.write(row, self._on_conflict) for row in self._payload]
+                )
+
+            rows = [r for r in self._store.rows if all(f(r) for f in self._filters)]
+            if self._op == "update":
+                for row in rows:
+                    row.update(self._payload[0])
+            if self._order:
+                rows.sort(key=lambda r: str(r.get(self._order)))
+            return _Result(
+                [self._store.project(r, self._columns) for r in rows][self._slice]
+            )
+
+
+class _TableQuery(_Query):
+    """A query on a plain table (anything but watched_media): rows are kept
+    by their on_conflict columns, without vectors."""
+
+    def __init__(self, store: "InMemorySupabase", table: str) -> None:
+        super().__init__(store, table)
+        self._conflict: list[str] = []
+        self._desc = False
+
+    def upsert(self, rows: dict | list[dict], on_conflict: str = "id") -> "_Query":
+        self._conflict = on_conflict.split(",")
+        return super().upsert(rows, on_conflict)
+
+    def delete(self) -> "_Query":
+        self._op = "delete"
+        return self
+
+    def lt(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda r: str(r.get(column)) < str(value))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_Query":
+        self._desc = desc
+        return super().order(column, desc)
+
+    def _run(self) -> _Result:
+        with self._store.lock:
+            table = self._store.tables.setdefault(self._table, {})
+            if self._op in ("insert", "upsert"):
+                for row in self._payload:
+                    key = tuple(row.get(c) for c in self._conflict) or uuid.uuid4()
+                    table[key] = {**row}
+                return _Result([{**row} for row in self._payload])
+
+            matched = {
+                key: row
+                for key, row in table.items()
+                if all(f(row) for f in self._filters)
+            }
+            if self._op == "delete":
+                for key in matched:
+                    del table[key]
+                return _Result(list(matched.values()))
+
+            rows = list(matched.values())
+            if self._order:
+                rows.sort(key=lambda r: str(r.get(self._order)), reverse=self._desc)
+            return _Result(
+                [self._store.project(r, self._columns) for r in rows][self._slice]
+            )
+
+
+class InMemorySupabase:
+    """Just enough of supabase.Client for app.database, kept in process."""
+
+    def __init__(self, latency: Latency = fixed_latency(0)) -> None:
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.rows: list[dict] = []
+        self._by_id: dict[str, int] = {}
+        # Row positions per household, like the btree the RPC filters on.
+        self._by_household: dict[str, list[int]] = {}
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        # Every other table (graph checkpoints), by primary key.
+        self.tables: dict[str, dict[Any, dict]] = {}
+
+    def table(self, name: str) -> _Query:
+        if name != "watched_media":
+            return _TableQuery(self, name)
+        return _Query(self, name)
+
+    def project(self, row: dict, columns: list[str] | None) -> dict:
+        if columns is None:
+            return {k: v for k, v in row.items() if k != "embedding"}
+        return {c: row.get(c) for c in columns}
+
+    def write(self, row: dict, conflict: str = "id") -> dict:
+        row = {**row}
+        columns = conflict.split(",")
+        if conflict != "id" and "id" not in row:
+            for stored in self.rows:
+                if all(stored.get(c) == row[c] for c in columns):
+                    row["id"] = stored["id"]
+                    break
+        row.setdefault("id", str(uuid.uuid4()))
+        vector = _parse_vector(row.pop("embedding"))
+        if len(self.rows) == len(self._vectors):
+            # Grown by doubling, so seeding a large library stays linear.
+            grown = np.empty((max(64, 2 * len(self.rows)), len(vector)), np.float32)
+            if self.rows:
+                grown[: len(self.rows)] = self._vectors
+            self._vectors = grown
+        if row["id"] in self._by_id:
+            index = self._by_id[row["id"]]
+            self.rows[index] = {**self.rows[index], **row}
+            self._vectors[index] = vector
+        else:
+            # household_id defaults like the column does.
+            row.setdefault("household_id", "default")
+            self._by_id[row["id"]] = len(self.rows)
+            self._by_household.setdefault(row["household_id"], []).append(
+                len(self.rows)
+            )
+            self._vectors[len(self.rows)] = vector
+            self.rows.append(row)
+        return self.project(self.rows[self._by_id[row["id"]]], None)
+
+    def rpc(self, name: str, params: dict) -> _Query:
+        assert name == "search_similar_media", name
+        return _RPC(self, params)  # type: ignore[return-value]
+
+    def search(self, params: dict) -> list[dict]:
+        from app.retrieval import matches_filters
+
+        positions = self._by_household.get(params.get("filter_household", "default"))
+        if not positions:
+            return []
+        query = _parse_vector(params["query_embedding"])
+        vectors = self._vectors[positions]
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+        similarities = vectors @ query / np.where(norms == 0, 1, norms)
+
+        hits = []
+        for index in np.argsort(-similarities):
+            row = self.rows[positions[index]]
+            similarity = float(similarities[index])
+            if similarity <= params["match_threshold"]:
+                break
+            model = params.get("filter_model")
+            if model and row.get("embedding_model") != model:
+                continue
+            if not matches_filters(
+                row,
+                params.get("filter_type"),
+                params.get("filter_genres"),
+                params.get("min_rating"),
+            ):
+                continue
+            hits.append({**self.project(row, None), "similarity": similarity})
+            if len(hits) == params["match_count"]:
+                break
+        return hits
+
+
+class _RPC:
+    def __init__(self, store: InMemorySupabase, params: dict) -> None:
+        self._store = store
+        self._params = params
+
+    def execute(self) -> _Result:
+        time.sleep(self._store.latency())
+        with self._store.lock:
+            return _Result(self._store.search(self._params))
+
+
+class _AsyncQuery(_Query):
+    async def execute(self) -> _Result:  # type: ignore[override]
+        await asyncio.sleep(self._store.latency())
+        return self._run()
+
+
+class AsyncInMemorySupabase:
+    """supabase.AsyncClient's view of an InMemorySupabase store."""
+
+    def __init__(self, store: InMemorySupabase) -> None:
+        self._store = store
+
+    def table(self, name: str) -> _AsyncQuery:
+        return _AsyncQuery(self._store, name)
+
+
+# ---------------------------------------------------------------------------
+# PostgREST
+# ---------------------------------------------------------------------------
+
+# What PostgREST answers when it can't get a database connection.
+_UNAVAILABLE = {
+    "code": "PGRST001",
+    "message": "Could not connect with the database",
+    "details": None,
+    "hint": None,
+}
+
+
+class _PostgRESTHandler(BaseHTTPRequestHandler):
+    server: "_PostgRESTServer"
+    # Keep-alive, like the real gateway, so client-side pooling shows up.
+    # Headers and body go out as separate writes; without TCP_NODELAY every
+    # reused connection waits out the client's delayed ACK (~40ms).
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        if self.path != "/_stub/stats":
+            self.send_error(404)
+            return
+        stats = {
+            "requests": self.server.requests,
+            "connections": self.server.connections,
+        }
+        self._send(200, stats)
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests += 1
+        time.sleep(self.server.latency())
+
+        store = self.server.store
+        path = urlparse(self.path).path
+        if random.random() < self.server.failure_rate:
+            status, payload = 503, _UNAVAILABLE
+        elif path == "/rest/v1/watched_media":
+            rows = body if isinstance(body, list) else [body]
+            with store.lock:
+                status, payload = 201, [store.write(row) for row in rows]
+        elif path == "/rest/v1/rpc/search_similar_media":
+            with store.lock:
+                status, payload = 200, store.search(body)
+        else:
+            self.send_error(404)
+            return
+
+        self._send(status, payload)
+
+    def _send(self, status: int, payload: Any) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class _PostgRESTServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # socketserver's default backlog of 5 refuses connections under load.
+    request_queue_size = 1024
+
+    def __init__(self, latency: Latency, failure_rate: float, port: int) -> None:
+        super().__init__(("127.0.0.1", port), _PostgRESTHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.store = InMemorySupabase()
+        self.requests = 0
+        self.connections = 0
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class PostgRESTStub:
+    """Supabase's REST gateway over an InMemorySupabase store: inserts into
+    watched_media and the search_similar_media RPC, each taking ``latency``
+    and failing with a 503 (PGRST001) at ``failure_rate``. GET /_stub/stats
+    returns the request and accepted-connection counts."""
+
+    def __init__(
+        self,
+        latency: Latency = fixed_latency(0),
+        failure_rate: float = 0.0,
+        port: int = 0,
+    ) -> None:
+        self._server = _PostgRESTServer(latency, failure_rate, port)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="postgrest-stub", daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def store(self) -> InMemorySupabase:
+        return self._server.store
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    @property
+    def connections(self) -> int:
+        return self._server.connections
+
+    def start(self) -> "PostgRESTStub":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ---------------------------------------------------------------------------
+# Embeddings
+# ---------------------------------------------------------------------------
+
+
+class HashingEncoder:
+    """SentenceTransformer stand-in: hashed bag of words, L2-normalised."""
+
+    def __init__(self, *args: Any, dims: int = 384, **kwargs: Any) -> None:
+        self.dims = dims
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dims
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            vector[_stub_id(token) % self.dims] += 1
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts: str | list[str], **kwargs: Any) -> np.ndarray:
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        if not texts:
+            return np.empty((0, self.dims), dtype=np.float32)
+        return np.stack([self._encode_one(t) for t in texts])
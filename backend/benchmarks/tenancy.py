@@ -0,0 +1,113 @@
+"""hybrid_search latency as the number of households on one deployment grows.
+
+Seeds an in-memory library with ``--titles`` titles for each of 1, 10 and 100
+households (``--households``), then runs ``--searches`` hybrid searches, each
+for a random household, the way the recommender's search_db node does. For
+comparison, the ``shared`` row puts every title of the largest run in one
+library, which is what a single-tenant deployment of that size searches.
+
+The vector side is scoped by the RPC's household filter; the lexical side
+builds one BM25 index per household and keeps ``--index-cache`` of them
+(LEXICAL_INDEX_CACHE_SIZE), least recently used evicted first.
+
+Reports search latency percentiles, lexical index builds and evictions.
+
+Usage (from backend/):
+    uv run python -m benchmarks.tenancy --titles 200 --searches 2000
+    uv run python -m benchmarks.tenancy --fake-embeddings --index-cache 16
+"""
+
+import argparse
+import os
+import random
+import time
+
+from benchmarks.run import _library_entry, _percentiles, _seed_library
+from benchmarks.stubs import HashingEncoder, InMemorySupabase, fixed_latency
+
+KEYWORDS = ["tense heist", "cozy funny", "dark twist", "epic romantic", "slow"]
+
+
+def _setup(args: argparse.Namespace) -> None:
+    """Configure the app before its modules are imported."""
+    os.environ["LEXICAL_INDEX_CACHE_SIZE"] = str(args.index_cache)
+    for name in ("SUPABASE_URL", "SUPABASE_ANON_KEY", "ANTHROPIC_API_KEY"):
+        os.environ.setdefault(name, "http://localhost" if "URL" in name else "bench")
+    os.environ.setdefault("TMDB_API_KEY", "bench")
+    os.environ.setdefault("API_SECRET", "bench")
+
+    if args.fake_embeddings:
+        import sentence_transformers
+
+        sentence_transformers.SentenceTransformer = HashingEncoder  # type: ignore[misc]
+
+
+def _seed(households: list[str], titles: int, args) -> None:
+    import app.database
+    from app import retrieval
+
+    store = InMemorySupabase(fixed_latency(args.db_latency_ms))
+    app.database._client = store  # type: ignore[assignment]
+    retrieval._indexes.clear()
+    rng = random.Random(0)
+    rows = [
+        {**_library_entry(i, rng), "id": f"{h}-{i:06d}", "household_id": household}
+        for h, household in enumerate(households)
+        for i in range(titles)
+    ]
+    _seed_library(store, rows)
+
+
+def _measure(name: str, households: list[str], titles: int, args) -> None:
+    from app.retrieval import _INDEX_LOOKUPS, hybrid_search
+
+    _seed(households, titles, args)
+    builds = _INDEX_LOOKUPS.value(result="build")
+    evictions = _INDEX_LOOKUPS.value(result="evicted")
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(args.searches):
+        household = rng.choice(households)
+        keywords = rng.choice(KEYWORDS)
+        started = time.perf_counter()
+        hybrid_search(keywords, keywords, household=household)
+        latencies.append(time.perf_counter() - started)
+
+    latency = _percentiles(latencies)
+    print(
+        f"{name:<10} {len(households):>10} {len(households) * titles:>8} "
+        f"{latency['p50']:8.1f}ms {latency['p95']:6.1f}ms "
+        f"{_INDEX_LOOKUPS.value(result='build') - builds:>7.0f} "
+        f"{_INDEX_LOOKUPS.value(result='evicted') - evictions:>9.0f}"
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--households", default="1,10,100")
+    parser.add_argument("--titles", type=int, default=200, help="per household")
+    parser.add_argument("--searches", type=int, default=2000)
+    parser.add_argument("--index-cache", type=int, default=64)
+    parser.add_argument("--db-latency-ms", type=float, default=0)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    _setup(args)
+    counts = [int(n) for n in args.households.split(",")]
+    print(
+        f"{args.titles} titles per household, {args.searches} searches, "
+        f"{args.index_cache} lexical indexes kept\n"
+        f"{'library':<10} {'households':>10} {'titles':>8} {'p50':>10} "
+        f"{'p95':>8} {'builds':>7} {'evictions':>9}"
+    )
+    for count in counts:
+        households = [f"household-{h}" for h in range(count)]
+        _measure("per-house", households, args.titles, args)
+    _measure("shared", ["default"], max(counts) * args.titles, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Memory and serialization cost of the embedding payloads sent to Supabase.
+
+Compares the old JSON list of Python floats against the pgvector text literal
+(float32 / float16) and the base64 buffer encoding, for the row written by
+add_media and the params sent by search_similar.
+
+Usage (from backend/):
+    uv run python -m benchmarks.vector_serialization
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.embeddings import pack_vector, to_pgvector
+
+ENTRY = {
+    "title": "Severance",
+    "type": "series",
+    "genres": ["Drama", "Mystery", "Sci-Fi & Fantasy"],
+    "description": "Mark leads a team of office workers whose memories have been "
+    "surgically divided between their work and personal lives.",
+    "user_rating": 9,
+    "gf_rating": 8,
+    "user_review": "Slow burn but the finale is unreal.",
+    "gf_review": "Creepy office vibes, loved it.",
+}
+
+ENCODINGS = {
+    "json float list": lambda v: v.tolist(),
+    "pgvector f32": lambda v: to_pgvector(v, np.float32),
+    "pgvector f16": lambda v: to_pgvector(v, np.float16),
+    "base64 f32": lambda v: pack_vector(v, np.float32),
+    "base64 f16": lambda v: pack_vector(v, np.float16),
+}
+
+
+def _payloads(vector_field) -> dict[str, dict]:
+    return {
+        "add_media": {**ENTRY, "embedding": vector_field},
+        "search_similar": {
+            "query_embedding": vector_field,
+            "match_threshold": 0.2,
+            "match_count": 5,
+        },
+    }
+
+
+def _measure(encode, vector: np.ndarray, iterations: int) -> dict[str, dict]:
+    results = {}
+    for name in ("add_media", "search_similar"):
+        tracemalloc.start()
+        field = encode(vector)
+        body = json.dumps(_payloads(field)[name]).encode()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            json.dumps(_payloads(encode(vector))[name]).encode()
+        elapsed = (time.perf_counter() - start) / iterations
+
+        results[name] = {
+            "bytes": len(body),
+            "peak_alloc_bytes": peak,
+            "serialize_us": elapsed * 1e6,
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vector = rng.standard_normal(args.dims).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+
+    print(
+        f"{'encoding':<16} {'payload':<15} {'bytes':>7} "
+        f"{'peak alloc':>11} {'serialize':>11}"
+    )
+    for encoding, encode in ENCODINGS.items():
+        for payload, stats in _measure(encode, vector, args.iterations).items():
+            print(
+                f"{encoding:<16} {payload:<15} {stats['bytes']:>7} "
+                f"{stats['peak_alloc_bytes']:>11} "
+                f"{stats['serialize_us']:>9.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
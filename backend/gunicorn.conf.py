@@ -0,0 +1,56 @@
+"""Pre-fork serving: ``gunicorn main:app`` picks this file up automatically.
+
+The master imports the app, loads the embedding model and the TMDB genre maps
+once, then forks the workers, which share those pages copy-on-write instead
+of each loading its own copy. See "Multi-worker serving" in the README.
+"""
+
+import gc
+import os
+
+import httpx
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Intra-op torch threads per worker. By default the cores are split between
+# the workers; N workers each running one thread per core just contend.
+_torch_threads = int(os.environ.get("TORCH_NUM_THREADS", "0")) or max(
+    1, (os.cpu_count() or 1) // workers
+)
+
+
+def when_ready(server) -> None:
+    if not server.cfg.preload_app:
+        return
+
+    import torch
+
+    from app import tmdb
+    from app.config import EMBEDDING_PREVIOUS_MODEL
+    from app.embeddings import load_model
+
+    # A multi-threaded OpenMP pool doesn't survive fork(): a worker's first
+    # forward pass would deadlock. Keep the master single-threaded (it never
+    # runs inference) and size the pool in post_fork.
+    torch.set_num_threads(1)
+    load_model()
+    if EMBEDDING_PREVIOUS_MODEL:
+        load_model(EMBEDDING_PREVIOUS_MODEL)
+    try:
+        tmdb.warm_up()
+    except httpx.HTTPError as exc:
+        server.log.warning("TMDB genre refresh failed (%s); using the snapshot", exc)
+
+    # Move everything loaded so far out of the collector's reach: otherwise
+    # each worker's first full collection writes to every object header and
+    # un-shares the pages.
+    gc.freeze()
+
+
+def post_fork(server, worker) -> None:
+    import torch
+
+    torch.set_num_threads(_torch_threads)
@@ -1,35 +1,63 @@
-import json
+import hmac
 import os
-import uuid
-
-from fastapi import Depends, FastAPI, HTTPException, Security, status
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated, Literal
+
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Security,
+    status,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from langgraph.types import Command
-from pydantic import BaseModel
-
-from app.agent import recommender
-from app.config import API_SECRET
-from app.database import add_media
-from app.tmdb import search_media as tmdb_search
-
-
-INITIAL_STATE = {
-    "mood": [],
-    "media_type": None,
-    "genres": [],
-    "nostalgic_title": None,
-    "search_results": [],
-    "recommendation": None,
-    "asked_nostalgic": False,
-    "availability_info": None,
-}
+from pydantic import BaseModel, Field
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from app import agent, importer, profiling, sse, thread_tokens, tmdb
+from app.admission import AdmissionGate, AdmittedStreamingResponse, Overloaded
+from app.agent import get_recommender
+from app.config import (
+    ADMIN_SECRET,
+    API_SECRET,
+    CHECKPOINT_DURABILITY,
+    DEFAULT_HOUSEHOLD,
+    DEFAULT_REGION,
+    GRAPH_MAX_CONCURRENCY,
+    GRAPH_MAX_QUEUE,
+    GRAPH_QUEUE_TIMEOUT_SECONDS,
+    GRAPH_RETRY_AFTER_SECONDS,
+    GZIP_MIN_BYTES,
+    PROFILE_MAX_SECONDS,
+    SSE_COALESCE_MAX_CHARS,
+    SSE_COALESCE_MS,
+    WARMUP_ON_STARTUP,
+)
+from app.database import add_media_async, close_async_client, get_client
+from app.embeddings import load_model
+from app.metrics import Histogram, render
 
 
 class MediaIn(BaseModel):
     title: str
     type: str
+    # Deduplicates on the TMDB id when given, else on the title (and type).
+    tmdb_id: int | None = None
     genres: list[str]
     description: str
     user_rating: int
@@ -38,6 +66,28 @@ class MediaIn(BaseModel):
     gf_review: str = ""
 
 
+class ImportItem(BaseModel):
+    title: str = Field(min_length=1)
+    # Narrows the TMDB match when known; otherwise the best match of either.
+    type: Literal["movie", "series"] | None = None
+    user_rating: int | None = None
+    gf_rating: int | None = None
+    user_review: str = ""
+    gf_review: str = ""
+
+
+class ImportRequest(BaseModel):
+    # Plain titles, or items that also carry ratings and reviews.
+    items: list[ImportItem | Annotated[str, Field(min_length=1)]] = Field(
+        max_length=5000
+    )
+
+
+class StartRequest(BaseModel):
+    # ISO 3166-1 alpha-2 country whose streaming catalogue to check.
+    region: str = Field(default=DEFAULT_REGION, pattern="^[A-Za-z]{2}$")
+
+
 class StartResponse(BaseModel):
     thread_id: str
     question: str
@@ -73,10 +123,55 @@ def _verify_token(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
-app = FastAPI(dependencies=[Depends(_verify_token)])
+def _verify_admin(x_admin_secret: str = Header(default="")) -> None:
+    # Without ADMIN_SECRET the admin endpoints don't exist.
+    if not ADMIN_SECRET:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not hmac.compare_digest(x_admin_secret, ADMIN_SECRET):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+
+# Household ids end up in a signed thread token (dot-separated) and in
+# PostgREST filters, so they are kept to a plain slug.
+_HOUSEHOLD_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _household(
+    x_household_id: str = Header(default=DEFAULT_HOUSEHOLD),
+) -> str:
+    if not _HOUSEHOLD_ID.match(x_household_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid household id"
+        )
+    return x_household_id
+
+
+def _warm_up() -> None:
+    get_client()
+    agent.warm_up()
+    load_model()
+    tmdb.warm_up()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy singletons are built lazily; warming them in a thread keeps
+    # startup (and the first /search) from waiting on torch.
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    yield
+    await run_in_threadpool(agent.close)
+    await close_async_client()
+
+
+app = FastAPI(dependencies=[Depends(_verify_token)], lifespan=lifespan)
 
 _cors_origins = os.environ.get("CORS_ORIGINS", "http://localhost:3000").split(",")
 
+# Only bodies over GZIP_MIN_BYTES are compressed; the text/event-stream
+# responses of /recommend/reply are excluded by GZipMiddleware itself.
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=_cors_origins,
@@ -84,39 +179,182 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_request_seconds = Histogram(
+    "popchoice_http_request_duration_seconds",
+    "Time until response headers are sent (streams keep running after).",
+    labels=("method", "route", "status"),
+)
+
+
+@app.middleware("http")
+async def _record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    _request_seconds.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    return response
+
+
+# Graph runs spend LLM calls and TMDB requests; this caps them per worker so
+# a spike gets 503s instead of starving /search and /media of threads.
+_graph_gate = AdmissionGate(
+    "graph",
+    limit=GRAPH_MAX_CONCURRENCY,
+    max_queue=GRAPH_MAX_QUEUE,
+    max_wait=GRAPH_QUEUE_TIMEOUT_SECONDS,
+    retry_after=GRAPH_RETRY_AFTER_SECONDS,
+)
+
+
+@app.exception_handler(Overloaded)
+async def _overloaded(request: Request, exc: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        {"detail": "The recommender is busy, try again shortly."},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 
-@app.get("/search")
-def search(q: str) -> list[SearchResult]:
-    return tmdb_search(q)
+@app.exception_handler(profiling.ProfilingError)
+async def _profiling_conflict(
+    request: Request, exc: profiling.ProfilingError
+) -> JSONResponse:
+    return JSONResponse({"detail": str(exc)}, status_code=status.HTTP_409_CONFLICT)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+_admin = [Depends(_verify_admin)]
+
+
+@app.get("/admin/memory", dependencies=_admin)
+def admin_memory() -> dict:
+    return {"rss_bytes": profiling.rss_bytes(), "structures": profiling.structures()}
+
+
+@app.post("/admin/tracemalloc/start", dependencies=_admin)
+def admin_tracemalloc_start(frames: int = Query(default=1, ge=1, le=64)) -> dict:
+    profiling.start_tracemalloc(frames)
+    return {"tracing": True}
+
+
+@app.post("/admin/tracemalloc/stop", dependencies=_admin)
+def admin_tracemalloc_stop() -> dict:
+    profiling.stop_tracemalloc()
+    return {"tracing": False}
+
+
+@app.get("/admin/tracemalloc", dependencies=_admin)
+def admin_tracemalloc(limit: int = Query(default=25, ge=1, le=500)) -> dict:
+    return profiling.tracemalloc_report(limit)
+
+
+@app.get("/admin/profile/cpu", dependencies=_admin, response_class=PlainTextResponse)
+def admin_profile_cpu(
+    seconds: float = Query(default=10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(default=10, ge=1, le=1000),
+    idle: bool = False,
+) -> PlainTextResponse:
+    # Runs in the threadpool, so the sampled threads keep serving meanwhile.
+    stacks = profiling.profile_cpu(seconds, interval_ms / 1000, idle)
+    return PlainTextResponse(stacks)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+@app.get("/search", response_model=list[SearchResult])
+def search(q: str, request: Request) -> Response:
+    page = tmdb.search_page(q)
+    headers = {"ETag": page.etag, "Cache-Control": f"private, max-age={page.max_age}"}
+    if _etag_matches(request.headers.get("if-none-match", ""), page.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(page.body, media_type="application/json", headers=headers)
 
 
 @app.post("/media")
-def save_media(body: MediaIn) -> dict:
-    saved = add_media(body.model_dump())
+async def save_media(body: MediaIn, household: str = Depends(_household)) -> dict:
+    saved = await add_media_async(body.model_dump(), household)
     return saved
 
 
+@app.post("/media/import")
+def import_media(
+    body: ImportRequest, household: str = Depends(_household)
+) -> StreamingResponse:
+    items = [
+        (ImportItem(title=item) if isinstance(item, str) else item).model_dump()
+        for item in body.items
+    ]
+
+    def event_stream():
+        for outcome in importer.import_titles(items, household=household):
+            yield sse.item(outcome)
+        yield sse.DONE
+
+    # Starlette runs the sync generator in its threadpool.
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.post("/recommend/start", response_model=StartResponse)
-def recommend_start() -> StartResponse:
-    thread_id = str(uuid.uuid4())
-    config = {"configurable": {"thread_id": thread_id}}
-    result = recommender.invoke(INITIAL_STATE, config)
-    question = result["__interrupt__"][0].value
-    return StartResponse(thread_id=thread_id, question=question)
+async def recommend_start(
+    body: StartRequest | None = None, household: str = Depends(_household)
+) -> StartResponse:
+    # The first question never changes, so the graph doesn't run until the
+    # first reply; the token carries everything that reply needs.
+    region = body.region.upper() if body else DEFAULT_REGION
+    return StartResponse(
+        thread_id=thread_tokens.issue(region, household), question=agent.MOOD_QUESTION
+    )
 
 
 @app.post("/recommend/reply")
-def recommend_reply(body: ReplyRequest) -> StreamingResponse:
-    config = {"configurable": {"thread_id": body.thread_id}}
-
-    def event_stream():
-        got_chunk = False
-        for chunk, metadata in recommender.stream(
-            Command(resume=body.answer),
+async def recommend_reply(
+    body: ReplyRequest, household: str = Depends(_household)
+) -> StreamingResponse:
+    token = thread_tokens.read(body.thread_id)
+    # Another household's thread is as unknown as a forged one.
+    if token is None or token.household != household:
+        raise HTTPException(status_code=404, detail="Unknown thread")
+    config = {"configurable": {"thread_id": token.thread_id}}
+
+    recommender = await run_in_threadpool(get_recommender)
+
+    def graph_input() -> Command | None:
+        if recommender.get_state(config).values:
+            return Command(resume=body.answer)
+        # First reply: this answers the mood question start asked.
+        agent.begin_thread(config, token.region, body.answer, token.household)
+        return None
+
+    # The question the graph stopped on, if it stopped on one; read from the
+    # stream rather than from the checkpoint after it.
+    question: list[str] = []
+
+    def recommendation_text():
+        for mode, payload in recommender.stream(
+            graph_input(),
             config,
-            stream_mode="messages",
+            stream_mode=["messages", "updates"],
+            durability=CHECKPOINT_DURABILITY,
         ):
-            node = metadata.get("langgraph_node")
+            if mode == "updates":
+                if "__interrupt__" in payload:
+                    question.append(payload["__interrupt__"][0].value)
+                continue
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") != "recommend":
+                continue
             content = chunk.content
 
             if isinstance(content, str):
@@ -130,18 +368,28 @@ def recommend_reply(body: ReplyRequest) -> StreamingResponse:
             else:
                 text = ""
 
-            if node == "recommend" and text:
-                got_chunk = True
-                yield f"data: {json.dumps({'type': 'chunk', 'content': text})}\n\n"
-
-        if not got_chunk:
-            state = recommender.get_state(config)
-            if state.tasks and state.tasks[0].interrupts:
-                question = state.tasks[0].interrupts[0].value
-                yield f"data: {json.dumps({'type': 'question', 'question': question})}\n\n"
-            else:
-                yield f"data: {json.dumps({'type': 'done'})}\n\n"
-        else:
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            if text:
+                yield text
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    def event_stream():
+        got_chunk = False
+        for text in sse.coalesce(
+            recommendation_text(), SSE_COALESCE_MS, SSE_COALESCE_MAX_CHARS
+        ):
+            got_chunk = True
+            yield sse.chunk(text)
+
+        if not got_chunk and question:
+            yield sse.question(question[0])
+            agent.speculate(token.thread_id, config)
+            return
+        yield sse.DONE
+
+    # The graph runs while the body streams, so the slot is held until the
+    # response is done (or the client goes away), not just until headers.
+    await _graph_gate.acquire()
+    return AdmittedStreamingResponse(
+        _graph_gate,
+        iterate_in_threadpool(event_stream()),
+        media_type="text/event-stream",
+    )
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from app.admission import (
+    _IN_FLIGHT,
+    _QUEUE_DEPTH,
+    _REJECTED,
+    AdmissionGate,
+    AdmittedStreamingResponse,
+    Overloaded,
+)
+
+
+def make_gate(name: str, **overrides) -> AdmissionGate:
+    settings = {"limit": 1, "max_queue": 1, "max_wait": 1.0, "retry_after": 7}
+    return AdmissionGate(name, **{**settings, **overrides})
+
+
+# ---------------------------------------------------------------------------
+# Admitting and queueing
+# ---------------------------------------------------------------------------
+
+
+def test_admits_up_to_the_limit_without_waiting():
+    gate = make_gate("test.limit", limit=2)
+
+    async def scenario():
+        await gate.acquire()
+        await gate.acquire()
+        return _IN_FLIGHT.value(gate="test.limit")
+
+    assert asyncio.run(scenario()) == 2
+    assert gate.waiting == 0
+
+
+def test_queued_request_runs_once_a_slot_is_released():
+    gate = make_gate("test.queue")
+
+    async def scenario():
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        queued = _QUEUE_DEPTH.value(gate="test.queue")
+        gate.release()
+        await waiter
+        return queued
+
+    assert asyncio.run(scenario()) == 1
+    assert _QUEUE_DEPTH.value(gate="test.queue") == 0
+
+
+def test_admit_releases_the_slot_when_the_body_raises():
+    gate = make_gate("test.release")
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            async with gate.admit():
+                raise RuntimeError("graph failed")
+        async with asyncio.timeout(0.1), gate.admit():
+            pass
+
+    asyncio.run(scenario())
+    assert _IN_FLIGHT.value(gate="test.release") == 0
+
+
+# ---------------------------------------------------------------------------
+# Shedding load
+# ---------------------------------------------------------------------------
+
+
+def test_rejects_immediately_when_the_queue_is_full():
+    gate = make_gate("test.full", max_wait=5.0)
+
+    async def scenario():
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as exc_info:
+            async with asyncio.timeout(0.1):
+                await gate.acquire()
+        waiter.cancel()
+        return exc_info.value
+
+    rejected = asyncio.run(scenario())
+
+    assert rejected.reason == "queue_full"
+    assert rejected.retry_after == 7
+    assert _REJECTED.value(gate="test.full", reason="queue_full") == 1
+
+
+def test_rejects_when_no_slot_frees_up_within_max_wait():
+    gate = make_gate("test.timeout", max_wait=0.01)
+
+    async def scenario():
+        await gate.acquire()
+        with pytest.raises(Overloaded) as exc_info:
+            await gate.acquire()
+        return exc_info.value
+
+    assert asyncio.run(scenario()).reason == "timeout"
+    assert _REJECTED.value(gate="test.timeout", reason="timeout") == 1
+    assert gate.waiting == 0
+
+
+# ---------------------------------------------------------------------------
+# AdmittedStreamingResponse — the slot lives as long as the response
+# ---------------------------------------------------------------------------
+
+
+def _send_response(response, send) -> None:
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    asyncio.run(response(scope, receive, send))
+
+
+def test_streamed_response_releases_its_slot_when_done():
+    gate = make_gate("test.stream")
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def body():
+        yield b"data: {}\n\n"
+
+    asyncio.run(gate.acquire())
+    _send_response(AdmittedStreamingResponse(gate, body()), send)
+
+    assert sent[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+    assert _IN_FLIGHT.value(gate="test.stream") == 0
+
+
+def test_slot_is_released_when_the_client_leaves_before_the_body_is_read():
+    gate = make_gate("test.gone")
+    iterated = []
+
+    async def send(message):
+        raise OSError("client went away")
+
+    async def body():
+        iterated.append(True)
+        yield b"data: {}\n\n"
+
+    asyncio.run(gate.acquire())
+    with pytest.raises(ClientDisconnect):
+        _send_response(AdmittedStreamingResponse(gate, body()), send)
+
+    assert not iterated
+    assert _IN_FLIGHT.value(gate="test.gone") == 0
@@ -1,12 +1,29 @@
+import subprocess
+import sys
+from collections import OrderedDict
 from unittest.mock import MagicMock, patch
 
+import httpx
+import numpy as np
+from langgraph.types import Command
+
+import app.agent as agent_module
+import app.retrieval as retrieval_module
 from app.agent import (
     RecommenderState,
+    _media_type_filter,
+    begin_thread,
+    build_graph,
     check_availability,
-    check_streaming_in_romania,
+    check_streaming_availability,
+    get_recommender,
     recommend,
     route_after_search,
+    search_db,
+    speculate,
 )
+from app.speculation import Speculator
+from app.tracing import thread_scope
 
 
 # ---------------------------------------------------------------------------
@@ -28,10 +45,44 @@ def make_state(**overrides) -> RecommenderState:
         "recommendation": None,
         "asked_nostalgic": False,
         "availability_info": None,
+        "watch_context": None,
+        "region": "RO",
+        "household": "default",
+        "names": ["Mora", "GF"],
     }
     return {**base, **overrides}  # type: ignore[return-value]
 
 
+# ---------------------------------------------------------------------------
+# Lazy construction — nothing heavy is built at import
+# ---------------------------------------------------------------------------
+
+
+def test_importing_agent_does_not_load_heavy_dependencies():
+    # Fresh interpreter: this process has already imported everything.
+    code = (
+        "import sys, app.agent; "
+        "print([m for m in ('langchain_anthropic', 'sentence_transformers', "
+        "'supabase') if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_get_recommender_builds_graph_once():
+    with (
+        patch.object(agent_module, "_recommender", None),
+        patch("app.agent.build_graph") as mock_build,
+    ):
+        first = get_recommender()
+        second = get_recommender()
+
+    mock_build.assert_called_once()
+    assert first is second
+
+
 # ---------------------------------------------------------------------------
 # route_after_search — pure routing logic, no mocking needed
 # ---------------------------------------------------------------------------
@@ -67,6 +118,127 @@ def test_routes_to_recommend_when_already_asked_nostalgic_with_one_result():
     assert route_after_search(state) == "recommend"
 
 
+# ---------------------------------------------------------------------------
+# search_db — builds the hybrid query from the collected answers
+# ---------------------------------------------------------------------------
+
+
+def test_media_type_filter_maps_answers():
+    assert _media_type_filter("A movie please") == "movie"
+    assert _media_type_filter("series") == "series"
+    assert _media_type_filter("a TV show") == "series"
+    assert _media_type_filter("both") is None
+    assert _media_type_filter(None) is None
+
+
+def test_search_db_passes_structured_filters():
+    with patch("app.agent.hybrid_search", return_value=[]) as mock_search:
+        search_db(make_state(mood=["cozy"], media_type="movie", genres=["comedy"]))
+
+    kwargs = mock_search.call_args[1]
+    assert kwargs["media_type"] == "movie"
+    assert kwargs["genres"] == ["comedy"]
+    assert kwargs["limit"] == 5
+
+
+def test_search_db_searches_the_threads_household():
+    with patch("app.agent.hybrid_search", return_value=[]) as mock_search:
+        search_db(make_state(mood=["cozy"], household="flat-4b"))
+
+    assert mock_search.call_args[1]["household"] == "flat-4b"
+
+
+def test_search_db_uses_answers_as_keywords():
+    with patch("app.agent.hybrid_search", return_value=[]) as mock_search:
+        search_db(
+            make_state(mood=["cozy"], genres=["comedy"], nostalgic_title="Paddington")
+        )
+
+    keywords = mock_search.call_args[0][1]
+    assert "cozy" in keywords
+    assert "comedy" in keywords
+    assert "Paddington" in keywords
+
+
+def test_search_db_stores_results():
+    with patch("app.agent.hybrid_search", return_value=[{"title": "Heat"}]):
+        result = search_db(make_state(mood=["tense"]))
+
+    assert result == {"search_results": [{"title": "Heat"}]}
+
+
+# ---------------------------------------------------------------------------
+# speculate — search_db's work starts while the user is still answering
+# ---------------------------------------------------------------------------
+
+HITS = [{"title": "Heat"}, {"title": "Ronin"}]
+CONFIG = {"configurable": {"thread_id": "t1"}}
+
+
+def waiting_at(node: str, **values):
+    """Patch the graph so the thread is waiting on ``node``'s question."""
+    graph = MagicMock()
+    graph.get_state.return_value = MagicMock(next=(node,), values=make_state(**values))
+    return patch.object(agent_module, "_recommender", graph)
+
+
+def test_search_db_takes_the_speculative_search_when_the_guess_holds():
+    speculator = Speculator("test.agent.hit", workers=4)
+
+    with (
+        patch.object(agent_module, "_speculative", speculator),
+        patch("app.agent.hybrid_search", return_value=HITS) as mock_search,
+    ):
+        with waiting_at("ask_genres", mood=["tense"], media_type="movie"):
+            speculate("t1", CONFIG)
+        with thread_scope("t1"):
+            result = search_db(make_state(mood=["tense"], media_type="movie"))
+        speculator._executor.shutdown(wait=True)
+
+    assert result == {"search_results": HITS}
+    assert mock_search.call_count == 1
+
+
+def test_search_db_searches_again_when_the_answers_differ_from_the_guess():
+    speculator = Speculator("test.agent.stale", workers=4)
+
+    with (
+        patch.object(agent_module, "_speculative", speculator),
+        patch("app.agent.hybrid_search", return_value=HITS) as mock_search,
+    ):
+        with waiting_at("ask_genres", mood=["tense"]):
+            speculate("t1", CONFIG)
+        with thread_scope("t1"):
+            search_db(make_state(mood=["tense"], genres=["comedy"]))
+        speculator._executor.shutdown(wait=True)
+
+    assert mock_search.call_count == 2
+    assert mock_search.call_args[1]["genres"] == ["comedy"]
+
+
+def test_speculate_ignores_questions_asked_after_the_search():
+    speculator = MagicMock()
+
+    with patch.object(agent_module, "_speculative", speculator):
+        with waiting_at("ask_nostalgic", mood=["tense"]):
+            speculate("t1", CONFIG)
+
+    speculator.submit.assert_not_called()
+
+
+def test_speculate_does_nothing_when_disabled():
+    speculator = MagicMock()
+
+    with (
+        patch.object(agent_module, "_speculative", speculator),
+        patch.object(agent_module, "SPECULATIVE_SEARCH", False),
+    ):
+        with waiting_at("ask_type", mood=["tense"]):
+            speculate("t1", CONFIG)
+
+    speculator.submit.assert_not_called()
+
+
 # ---------------------------------------------------------------------------
 # check_availability — uses _llm_with_tools to find an available title
 # ---------------------------------------------------------------------------
@@ -76,7 +248,7 @@ def test_check_availability_returns_tool_results():
     mock_response_with_tool = MagicMock()
     mock_response_with_tool.tool_calls = [
         {
-            "name": "check_streaming_in_romania",
+            "name": "check_streaming_availability",
             "args": {"title": "Inception"},
             "id": "1",
         }
@@ -87,16 +259,36 @@ def test_check_availability_returns_tool_results():
 
     with (
         patch("app.agent._llm_with_tools") as mock_tools,
-        patch("app.agent.check_streaming_in_romania") as mock_tool_fn,
+        patch("app.agent.check_streaming_availability") as mock_tool_fn,
     ):
         mock_tools.invoke.side_effect = [mock_response_with_tool, mock_response_done]
-        mock_tool_fn.invoke.return_value = (
-            "'Inception' is available on: Netflix in Romania."
-        )
+        mock_tool_fn.invoke.return_value = "'Inception' is available on: Netflix in RO."
         result = check_availability(make_state())
 
     assert "Inception" in result["availability_info"]
     assert "Netflix" in result["availability_info"]
+    mock_tool_fn.invoke.assert_called_once_with({"title": "Inception", "region": "RO"})
+
+
+def test_check_availability_uses_the_session_region():
+    mock_response_with_tool = MagicMock()
+    mock_response_with_tool.tool_calls = [
+        {"name": "check_streaming_availability", "args": {"title": "Dark"}, "id": "1"}
+    ]
+    mock_response_done = MagicMock()
+    mock_response_done.tool_calls = []
+
+    with (
+        patch("app.agent._llm_with_tools") as mock_tools,
+        patch("app.agent.check_streaming_availability") as mock_tool_fn,
+    ):
+        mock_tools.invoke.side_effect = [mock_response_with_tool, mock_response_done]
+        mock_tool_fn.invoke.return_value = "'Dark' is available on: Netflix in DE."
+        check_availability(make_state(region="DE"))
+
+    mock_tool_fn.invoke.assert_called_once_with({"title": "Dark", "region": "DE"})
+    human_content = mock_tools.invoke.call_args_list[0][0][0][1].content
+    assert "(DE)" in human_content
 
 
 def test_check_availability_returns_empty_when_no_tool_calls():
@@ -123,6 +315,33 @@ def test_check_availability_includes_mood_in_prompt():
     assert "cozy" in human_content
 
 
+def test_check_availability_stores_the_watch_context_for_recommend():
+    mock_response = MagicMock()
+    mock_response.tool_calls = []
+    results = [{"title": "Heat", "type": "movie", "user_review": "Tense."}]
+
+    with patch("app.agent._llm_with_tools") as mock_tools:
+        mock_tools.invoke.return_value = mock_response
+        result = check_availability(make_state(search_results=results))
+
+    assert "Heat" in result["watch_context"]
+    assert result["watch_context"] in mock_tools.invoke.call_args[0][0][1].content
+
+
+def test_check_availability_records_input_tokens():
+    mock_response = MagicMock()
+    mock_response.tool_calls = []
+    mock_response.usage_metadata = {"input_tokens": 321, "output_tokens": 5}
+    before = agent_module._LLM_INPUT_TOKENS.count(call="check_availability")
+
+    with patch("app.agent._llm_with_tools") as mock_tools:
+        mock_tools.invoke.return_value = mock_response
+        check_availability(make_state())
+
+    after = agent_module._LLM_INPUT_TOKENS.count(call="check_availability")
+    assert after == before + 1
+
+
 # ---------------------------------------------------------------------------
 # recommend — generates formatted recommendation (no tools, safe to stream)
 # ---------------------------------------------------------------------------
@@ -161,9 +380,7 @@ def test_recommend_includes_availability_in_prompt():
     with patch("app.agent._llm") as mock_llm:
         mock_llm.invoke.return_value = mock_response
         recommend(
-            make_state(
-                availability_info="'Inception' is available on: Netflix in Romania."
-            )
+            make_state(availability_info="'Inception' is available on: Netflix in RO.")
         )
 
     human_content = mock_llm.invoke.call_args[0][0][1].content
@@ -195,6 +412,22 @@ def test_recommend_includes_search_results_in_prompt():
     assert "Favourite show" in human_content
 
 
+def test_recommend_reuses_the_stored_watch_context():
+    mock_response = MagicMock()
+    mock_response.content = "## Movie\n\nDesc.\n\n### Available on: `Netflix`"
+
+    with (
+        patch("app.agent._llm") as mock_llm,
+        patch("app.agent.build_watch_context") as mock_build,
+    ):
+        mock_llm.invoke.return_value = mock_response
+        recommend(make_state(watch_context="- Heat (movie, rated 9/10): ..."))
+
+    mock_build.assert_not_called()
+    human_content = mock_llm.invoke.call_args[0][0][1].content
+    assert "- Heat (movie, rated 9/10)" in human_content
+
+
 def test_recommend_uses_no_matches_message_when_results_empty():
     mock_response = MagicMock()
     mock_response.content = "## Movie\n\nDesc.\n\n### Available on: `Netflix`"
@@ -220,7 +453,7 @@ def test_recommend_includes_nostalgic_title_in_prompt():
 
 
 # ---------------------------------------------------------------------------
-# check_streaming_in_romania — tests the TMDB availability tool
+# check_streaming_availability — tests the TMDB availability tool
 # ---------------------------------------------------------------------------
 
 
@@ -235,7 +468,9 @@ def test_check_streaming_returns_platforms_when_available():
         mock_providers.return_value = {
             "RO": {"flatrate": [{"provider_name": "Netflix"}]}
         }
-        result = check_streaming_in_romania.invoke({"title": "Inception"})
+        result = check_streaming_availability.invoke(
+            {"title": "Inception", "region": "RO"}
+        )
 
     assert "Inception" in result
     assert "Netflix" in result
@@ -250,7 +485,9 @@ def test_check_streaming_reports_not_available():
             {"tmdb_id": 1, "type": "movie", "title": "Inception"}
         ]
         mock_providers.return_value = {"RO": {}}
-        result = check_streaming_in_romania.invoke({"title": "Inception"})
+        result = check_streaming_availability.invoke(
+            {"title": "Inception", "region": "RO"}
+        )
 
     assert "NOT" in result
 
@@ -258,6 +495,133 @@ def test_check_streaming_reports_not_available():
 def test_check_streaming_handles_title_not_on_tmdb():
     with patch("app.agent.search_media") as mock_search:
         mock_search.return_value = []
-        result = check_streaming_in_romania.invoke({"title": "XYZUnknown"})
+        result = check_streaming_availability.invoke(
+            {"title": "XYZUnknown", "region": "RO"}
+        )
 
     assert "Could not find" in result
+
+
+def test_check_streaming_reports_a_timed_out_lookup():
+    with patch("app.agent.search_media") as mock_search:
+        mock_search.side_effect = httpx.ReadTimeout("slow")
+        result = check_streaming_availability.invoke(
+            {"title": "Inception", "region": "RO"}
+        )
+
+    assert "Could not check availability of 'Inception'" in result
+
+
+def test_check_streaming_looks_up_the_requested_region():
+    with (
+        patch("app.agent.search_media") as mock_search,
+        patch("app.agent.get_watch_providers") as mock_providers,
+    ):
+        mock_search.return_value = [
+            {"tmdb_id": 1, "type": "movie", "title": "Inception"}
+        ]
+        mock_providers.return_value = {
+            "RO": {"flatrate": [{"provider_name": "Netflix"}]},
+            "DE": {"flatrate": [{"provider_name": "WOW"}]},
+        }
+        result = check_streaming_availability.invoke(
+            {"title": "Inception", "region": "DE"}
+        )
+
+    assert "WOW" in result
+    assert "Netflix" not in result
+
+
+def test_region_is_hidden_from_the_model():
+    schema = check_streaming_availability.tool_call_schema.model_json_schema()
+
+    assert list(schema["properties"]) == ["title"]
+
+
+# ---------------------------------------------------------------------------
+# begin_thread — the first reply creates the thread
+# ---------------------------------------------------------------------------
+
+
+def test_begin_thread_records_mood_and_resumes_at_the_type_question():
+    graph = build_graph()
+    config = {"configurable": {"thread_id": "lazy"}}
+    assert graph.get_state(config).values == {}
+
+    with (
+        patch.object(agent_module, "_recommender", graph),
+        patch("app.agent.partner_names", return_value=["Ana", "Ben"]) as names,
+    ):
+        begin_thread(config, "US", "cozy and funny, tense", "flat-4b")
+        graph.invoke(None, config)
+
+    state = graph.get_state(config)
+    names.assert_called_once_with("flat-4b")
+    assert state.values["mood"] == ["cozy", "funny", "tense"]
+    assert state.values["region"] == "US"
+    assert state.values["household"] == "flat-4b"
+    assert state.values["names"] == ["Ana", "Ben"]
+    assert state.next == ("ask_type",)
+    assert "movie, a series" in state.tasks[0].interrupts[0].value
+
+
+# ---------------------------------------------------------------------------
+# Checkpoint size — state is snapshotted after every node of every session
+# ---------------------------------------------------------------------------
+
+# Serialized bytes of all checkpoints of one session (start + three answers).
+# Storing the RPC's full rows (embedding, description) costs ~100 KB.
+CHECKPOINT_BUDGET_BYTES = 32 * 1024
+
+
+def _library_row(i: int) -> dict:
+    """A row as fat as the RPC could return it, embedding included."""
+    return {
+        "id": f"id-{i}",
+        "title": f"Title {i}",
+        "type": "movie",
+        "genres": ["Thriller", "Drama"],
+        "description": "A long plot synopsis that keeps going. " * 15,
+        "embedding": "[" + ",".join(["0.0123456789"] * 384) + "]",
+        "embedding_model": "all-MiniLM-L6-v2",
+        "user_rating": 8,
+        "gf_rating": 7,
+        "user_review": "Tense and great, loved the heist.",
+        "gf_review": "Too long but fun.",
+        "similarity": 0.8,
+    }
+
+
+def test_session_checkpoints_stay_within_budget():
+    rows = [_library_row(i) for i in range(20)]
+    client = MagicMock()
+    client.rpc.return_value.execute.return_value.data = rows
+    llm_with_tools = MagicMock()
+    llm_with_tools.invoke.return_value.tool_calls = []
+    llm = MagicMock()
+    llm.invoke.return_value.content = (
+        "## Title 1\n\nFits.\n\n### Available on: `Netflix`"
+    )
+
+    with (
+        patch("app.database._client", client),
+        patch("app.database.embed", return_value=np.zeros(384, dtype=np.float32)),
+        patch("app.retrieval.list_media", return_value=rows),
+        patch.object(retrieval_module, "_indexes", OrderedDict()),
+        patch.object(agent_module, "_llm_with_tools", llm_with_tools),
+        patch.object(agent_module, "_llm", llm),
+    ):
+        graph = build_graph()
+        config = {"configurable": {"thread_id": "budget"}}
+        graph.invoke(make_state(), config)
+        for answer in ("tense", "movie", "thriller"):
+            graph.invoke(Command(resume=answer), config)
+
+        assert graph.get_state(config).values["recommendation"].startswith("## ")
+        serde = graph.checkpointer.serde
+        sizes = [
+            len(serde.dumps_typed(saved.checkpoint)[1])
+            for saved in graph.checkpointer.list(config)
+        ]
+
+    assert sum(sizes) < CHECKPOINT_BUDGET_BYTES
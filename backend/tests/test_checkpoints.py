@@ -0,0 +1,216 @@
+from unittest.mock import patch
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+
+from app.checkpoints import _DROPPED_ROWS, _FLUSH_FAILURES, SupabaseSaver
+
+CONFIG = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+
+class FakeTables:
+    """The two checkpoint tables, behind app.checkpoints' database calls."""
+
+    def __init__(self) -> None:
+        self.checkpoints: dict[tuple, dict] = {}
+        self.writes: dict[tuple, dict] = {}
+        self.saves: list[tuple[int, int]] = []
+
+    def save(self, checkpoints: list[dict], writes: list[dict]) -> None:
+        self.saves.append((len(checkpoints), len(writes)))
+        for row in checkpoints:
+            key = (row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"])
+            self.checkpoints[key] = row
+        for row in writes:
+            key = (
+                row["thread_id"],
+                row["checkpoint_ns"],
+                row["checkpoint_id"],
+                row["task_id"],
+                row["idx"],
+            )
+            self.writes[key] = row
+
+    def load(
+        self, thread_id, checkpoint_ns=None, checkpoint_id=None, before=None, limit=None
+    ):
+        rows = [
+            row
+            for row in self.checkpoints.values()
+            if (thread_id is None or row["thread_id"] == thread_id)
+            and (checkpoint_ns is None or row["checkpoint_ns"] == checkpoint_ns)
+            and (checkpoint_id is None or row["checkpoint_id"] == checkpoint_id)
+            and (before is None or row["checkpoint_id"] < before)
+        ]
+        rows.sort(key=lambda r: r["checkpoint_id"], reverse=True)
+        return rows[:limit]
+
+    def load_writes(self, thread_id, checkpoint_ns, checkpoint_id):
+        return [
+            row
+            for key, row in sorted(self.writes.items())
+            if key[:3] == (thread_id, checkpoint_ns, checkpoint_id)
+        ]
+
+
+@pytest.fixture
+def tables():
+    fake = FakeTables()
+    with (
+        patch("app.checkpoints.save_checkpoints", side_effect=fake.save),
+        patch("app.checkpoints.load_checkpoints", side_effect=fake.load),
+        patch("app.checkpoints.load_checkpoint_writes", side_effect=fake.load_writes),
+    ):
+        yield fake
+
+
+def put(saver: SupabaseSaver, step: int = 0) -> dict:
+    return saver.put(CONFIG, empty_checkpoint(), {"step": step}, {})
+
+
+# ---------------------------------------------------------------------------
+# Batching
+# ---------------------------------------------------------------------------
+
+
+def test_write_through_saves_every_put(tables):
+    saver = SupabaseSaver(flush_ms=0)
+
+    put(saver)
+    put(saver)
+
+    assert tables.saves == [(1, 0), (1, 0)]
+
+
+def test_puts_are_saved_together_once_the_batch_is_full(tables):
+    saver = SupabaseSaver(batch_size=3, flush_ms=60_000)
+
+    put(saver)
+    put(saver)
+    assert tables.saves == []
+
+    put(saver)
+    assert tables.saves == [(3, 0)]
+
+
+def test_pending_puts_are_flushed_in_the_background(tables):
+    saver = SupabaseSaver(batch_size=100, flush_ms=1)
+
+    put(saver)
+    saver._flusher.join(0.2)  # never exits; just gives it time to flush
+
+    assert tables.saves == [(1, 0)]
+
+
+def test_sync_durability_writes_each_put_before_returning(tables):
+    saver = SupabaseSaver(batch_size=100, flush_ms=60_000, durability="sync")
+
+    put(saver)
+
+    assert tables.saves == [(1, 0)]
+    assert saver._flusher is None
+
+
+def test_close_stops_the_background_flush_and_writes_pending_rows(tables):
+    saver = SupabaseSaver(batch_size=100, flush_ms=60_000)
+    put(saver)
+    flusher = saver._flusher
+
+    saver.close()
+
+    assert not flusher.is_alive()
+    assert tables.saves == [(1, 0)]
+    put(saver, step=1)
+    assert tables.saves == [(1, 0), (1, 0)]
+
+
+def test_reads_see_pending_writes(tables):
+    saver = SupabaseSaver(batch_size=100, flush_ms=60_000)
+    config = put(saver, step=3)
+    saver.put_writes(config, [("mood", ["tense"])], task_id="task-1")
+
+    result = saver.get_tuple(CONFIG)
+
+    assert result.metadata["step"] == 3
+    assert result.pending_writes == [("task-1", "mood", ["tense"])]
+    assert tables.saves == [(1, 1)]
+
+
+def test_failed_flush_keeps_rows_pending(tables):
+    saver = SupabaseSaver(batch_size=100, flush_ms=60_000)
+    config = put(saver)
+
+    with patch("app.checkpoints.save_checkpoints", side_effect=RuntimeError("down")):
+        with pytest.raises(RuntimeError):
+            saver.flush()
+    saver.flush()
+
+    assert saver.get_tuple(CONFIG).config == config
+
+
+def test_failed_flush_drops_rows_past_the_pending_limit(tables):
+    saver = SupabaseSaver(batch_size=100, flush_ms=60_000, max_pending=2)
+    before = _DROPPED_ROWS.value()
+
+    with patch("app.checkpoints.save_checkpoints", side_effect=RuntimeError("down")):
+        config = put(saver)
+        with pytest.raises(RuntimeError):
+            saver.flush()
+        assert saver._checkpoints  # within the limit: kept
+
+        saver.put_writes(config, [("mood", ["tense"]), ("genres", [])], "task-1")
+        with pytest.raises(RuntimeError):
+            saver.flush()
+
+    assert _DROPPED_ROWS.value() == before + 3
+    assert not saver._checkpoints and not saver._writes
+
+
+def test_background_flush_failure_is_counted(tables):
+    saver = SupabaseSaver(batch_size=100, flush_ms=1)
+    before = _FLUSH_FAILURES.value()
+
+    with patch("app.checkpoints.save_checkpoints", side_effect=RuntimeError("down")):
+        put(saver)
+        saver._flusher.join(0.2)
+    # Drain the retried rows here, not after the fake tables are unpatched.
+    saver.flush()
+
+    assert _FLUSH_FAILURES.value() > before
+
+
+# ---------------------------------------------------------------------------
+# Reading back
+# ---------------------------------------------------------------------------
+
+
+def test_get_tuple_returns_the_latest_checkpoint_with_its_parent(tables):
+    saver = SupabaseSaver(flush_ms=0)
+    first = put(saver, step=0)
+    second = saver.put(first, empty_checkpoint(), {"step": 1}, {})
+
+    result = saver.get_tuple(CONFIG)
+
+    assert result.config == second
+    assert result.parent_config == first
+
+
+def test_get_tuple_is_none_for_an_unknown_thread(tables):
+    saver = SupabaseSaver(flush_ms=0)
+
+    assert saver.get_tuple({"configurable": {"thread_id": "nope"}}) is None
+
+
+def test_list_filters_on_metadata(tables):
+    saver = SupabaseSaver(flush_ms=0)
+    config = put(saver, step=0)
+    saver.put(config, empty_checkpoint(), {"step": 1}, {})
+
+    steps = [t.metadata["step"] for t in saver.list(CONFIG, filter={"step": 0})]
+
+    assert steps == [0]
@@ -0,0 +1,22 @@
+import pytest
+
+from app.config import _choice
+
+
+def test_choice_reads_the_setting_case_insensitively(monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_DURABILITY", "SYNC")
+
+    assert _choice("CHECKPOINT_DURABILITY", "async", ("sync", "async")) == "sync"
+
+
+def test_choice_falls_back_to_the_default(monkeypatch):
+    monkeypatch.delenv("CHECKPOINT_DURABILITY", raising=False)
+
+    assert _choice("CHECKPOINT_DURABILITY", "async", ("sync", "async")) == "async"
+
+
+def test_choice_rejects_an_unknown_value(monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_DURABILITY", "syncc")
+
+    with pytest.raises(ValueError, match="CHECKPOINT_DURABILITY"):
+        _choice("CHECKPOINT_DURABILITY", "async", ("sync", "async", "exit"))
@@ -0,0 +1,113 @@
+from app.context import (
+    NO_MATCHES,
+    build_watch_context,
+    compact_review,
+    estimate_tokens,
+)
+
+
+def hit(title: str, user_review: str = "", gf_review: str = "", **extra) -> dict:
+    return {
+        "title": title,
+        "type": "movie",
+        "user_rating": 8,
+        "user_review": user_review,
+        "gf_review": gf_review,
+        **extra,
+    }
+
+
+# ---------------------------------------------------------------------------
+# compact_review — keeps the sentences that match the session's answers
+# ---------------------------------------------------------------------------
+
+
+def test_short_reviews_are_kept_whole():
+    assert compact_review("Loved it.", 100, {"tense"}) == "Loved it."
+
+
+def test_long_reviews_keep_the_most_relevant_sentences_in_order():
+    review = (
+        "We watched it on a Sunday. The ending was tense and dark. "
+        "Popcorn was stale. The dark cinematography stood out."
+    )
+
+    result = compact_review(review, 75, {"tense", "dark"})
+
+    assert result == (
+        "The ending was tense and dark. … The dark cinematography stood out."
+    )
+
+
+def test_ties_go_to_earlier_sentences():
+    review = "First thought here. Second thought here. Third thought here."
+
+    assert compact_review(review, 20, set()) == "First thought here."
+
+
+def test_a_single_sentence_over_the_limit_is_cut_at_a_word():
+    review = "An extremely long single sentence without any break in it at all"
+
+    result = compact_review(review, 30, set())
+
+    assert len(result) <= 30
+    assert result.endswith("…")
+    assert result.startswith("An extremely long")
+
+
+# ---------------------------------------------------------------------------
+# build_watch_context — the whole block within the budget
+# ---------------------------------------------------------------------------
+
+
+def test_no_hits_gives_the_no_matches_message():
+    assert build_watch_context([], 1000) == NO_MATCHES
+
+
+def test_small_contexts_are_unchanged():
+    hits = [hit("Fleabag", "Loved it.", "Favourite show.")]
+
+    assert build_watch_context(hits, 1000) == (
+        '- Fleabag (movie, rated 8/10): Mora said "Loved it.". '
+        'GF said "Favourite show.".'
+    )
+
+
+def test_reviews_go_under_the_households_names():
+    hits = [hit("Fleabag", "Loved it.", "Favourite show.")]
+
+    assert build_watch_context(hits, 1000, names=["Ana", "Ben"]) == (
+        '- Fleabag (movie, rated 8/10): Ana said "Loved it.". '
+        'Ben said "Favourite show.".'
+    )
+
+
+def test_context_stays_within_the_budget():
+    review = "This was a great and tense film. " * 200
+    hits = [hit(f"Title {i}", review, review) for i in range(5)]
+
+    context = build_watch_context(hits, 300, ["tense"])
+
+    assert estimate_tokens(context) <= 300
+    assert all(f"Title {i}" in context for i in range(5))
+
+
+def test_short_reviews_leave_room_for_long_ones():
+    long_review = " ".join(f"Sentence {i} was tense." for i in range(100))
+    hits = [hit("Short", "Fine.", "Ok."), hit("Long", long_review, "")]
+
+    context = build_watch_context(hits, 150, ["tense"])
+
+    long_line = context.splitlines()[1]
+    assert estimate_tokens(context) <= 150
+    assert len(long_line) > 400
+
+
+def test_lowest_ranked_hits_are_dropped_when_titles_do_not_fit():
+    hits = [hit(f"Title {i}") for i in range(10)]
+
+    context = build_watch_context(hits, 40)
+
+    assert "Title 0" in context
+    assert "Title 9" not in context
+    assert estimate_tokens(context) <= 40
@@ -1,8 +1,27 @@
-from unittest.mock import patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import httpx
+import numpy as np
 import pytest
-
-from app.database import add_media, search_similar
+from postgrest.exceptions import APIError
+
+import app.database as database_module
+from app.database import (
+    SearchHit,
+    add_media,
+    add_media_async,
+    add_media_batch,
+    get_client,
+    iter_stale_media,
+    library_version,
+    list_media,
+    media_key,
+    partner_names,
+    search_similar,
+    update_embeddings,
+)
+from app.embeddings import TEMPLATE_VERSION, build_embedding_text, content_hash
 
 
 # ---------------------------------------------------------------------------
@@ -14,15 +33,33 @@ from app.database import add_media, search_similar
 
 @pytest.fixture
 def mock_client():
-    """Replaces the real Supabase client with a mock for the duration of a test."""
+    """Replaces the real Supabase client with a mock for the duration of a test.
+
+    The library starts out empty: media_key lookups find no stored rows.
+    """
     with patch("app.database._client") as m:
+        lookup = m.table.return_value.select.return_value.eq.return_value.in_
+        lookup.return_value.execute.return_value.data = []
         yield m
 
 
+def _async_client(*results) -> MagicMock:
+    """An async client whose media_key lookup finds nothing and whose upsert
+    answers ``results`` in order."""
+    client = MagicMock()
+    table = client.table.return_value
+    table.select.return_value.eq.return_value.in_.return_value.execute = AsyncMock(
+        return_value=MagicMock(data=[])
+    )
+    table.upsert.return_value.execute = AsyncMock(side_effect=list(results))
+    return client
+
+
 @pytest.fixture
 def mock_embed():
     """Replaces embed() with a fixed 384-float vector so tests don't load the model."""
-    with patch("app.database.embed", return_value=[0.1] * 384) as m:
+    vector = np.full(384, 0.1, dtype=np.float32)
+    with patch("app.database.embed", return_value=vector) as m:
         yield m
 
 
@@ -35,6 +72,26 @@ def mock_build_text():
         yield m
 
 
+SEVERANCE = {"title": "Severance", "type": "series", "genres": []}
+
+
+# ---------------------------------------------------------------------------
+# get_client — built lazily, once
+# ---------------------------------------------------------------------------
+
+
+def test_get_client_is_created_once_on_first_use():
+    with (
+        patch.object(database_module, "_client", None),
+        patch("supabase.create_client") as mock_create,
+    ):
+        first = get_client()
+        second = get_client()
+
+    mock_create.assert_called_once()
+    assert first is second
+
+
 # ---------------------------------------------------------------------------
 # add_media
 # ---------------------------------------------------------------------------
@@ -43,51 +100,416 @@ def mock_build_text():
 def test_add_media_calls_build_text_with_entry(
     mock_client, mock_embed, mock_build_text
 ):
-    mock_client.table.return_value.insert.return_value.execute.return_value.data = [
+    mock_client.table.return_value.upsert.return_value.execute.return_value.data = [
         {"id": "1", "title": "Severance"}
     ]
     entry = {"title": "Severance", "type": "series", "genres": ["thriller"]}
 
     add_media(entry)
 
-    mock_build_text.assert_called_once_with(entry)
+    mock_build_text.assert_called_once_with(
+        {**entry, "household_id": "default", "media_key": "title:series:severance"}
+    )
 
 
 def test_add_media_embeds_the_built_text(mock_client, mock_embed, mock_build_text):
-    mock_client.table.return_value.insert.return_value.execute.return_value.data = [
+    mock_client.table.return_value.upsert.return_value.execute.return_value.data = [
         {"id": "1", "title": "Severance"}
     ]
 
-    add_media({"title": "Severance", "type": "series", "genres": []})
+    add_media(SEVERANCE)
 
     mock_embed.assert_called_once_with("mocked rich text")
 
 
 def test_add_media_inserts_row_with_embedding(mock_client, mock_embed, mock_build_text):
-    mock_client.table.return_value.insert.return_value.execute.return_value.data = [
+    mock_client.table.return_value.upsert.return_value.execute.return_value.data = [
         {"id": "1", "title": "Severance"}
     ]
     entry = {"title": "Severance", "type": "series", "genres": ["thriller"]}
 
     add_media(entry)
 
-    # Inspect exactly what was passed to .insert()
-    inserted = mock_client.table.return_value.insert.call_args[0][0]
+    # Inspect exactly what was passed to .upsert()
+    inserted = mock_client.table.return_value.upsert.call_args[0][0]
     assert inserted["title"] == "Severance"
-    assert inserted["embedding"] == [0.1] * 384
+    assert inserted["embedding"] == "[" + ",".join(["0.1"] * 384) + "]"
+
+
+def test_add_media_tags_row_with_model_and_template_version(
+    mock_client, mock_embed, mock_build_text
+):
+    mock_client.table.return_value.upsert.return_value.execute.return_value.data = [
+        {"id": "1"}
+    ]
+
+    add_media(SEVERANCE)
+
+    inserted = mock_client.table.return_value.upsert.call_args[0][0]
+    assert inserted["embedding_model"] == "all-MiniLM-L6-v2"
+    assert inserted["embedding_version"] == TEMPLATE_VERSION
 
 
 def test_add_media_returns_the_saved_row(mock_client, mock_embed, mock_build_text):
     saved_row = {"id": "abc-123", "title": "Severance", "type": "series"}
-    mock_client.table.return_value.insert.return_value.execute.return_value.data = [
+    mock_client.table.return_value.upsert.return_value.execute.return_value.data = [
         saved_row
     ]
 
-    result = add_media({"title": "Severance", "type": "series", "genres": []})
+    result = add_media(SEVERANCE)
 
     assert result == saved_row
 
 
+def test_add_media_bumps_library_version(mock_client, mock_embed, mock_build_text):
+    mock_client.table.return_value.upsert.return_value.execute.return_value.data = [
+        {"id": "1"}
+    ]
+    before = library_version()
+
+    add_media(SEVERANCE)
+
+    assert library_version() == before + 1
+
+
+def test_add_media_async_upserts_on_the_async_client(mock_embed, mock_build_text):
+    saved_row = {"id": "abc-123", "title": "Severance"}
+    client = _async_client(MagicMock(data=[saved_row]))
+    before = library_version()
+
+    with patch.object(database_module, "_async_client", client):
+        result = asyncio.run(add_media_async(SEVERANCE))
+
+    assert result == saved_row
+    inserted = client.table.return_value.upsert.call_args[0][0]
+    assert inserted["embedding_model"] == "all-MiniLM-L6-v2"
+    assert library_version() == before + 1
+
+
+# ---------------------------------------------------------------------------
+# Retries on transient failures
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def no_backoff():
+    with patch("app.database._backoff", return_value=0):
+        yield
+
+
+def _api_error(code: str) -> APIError:
+    return APIError({"code": code, "message": "", "hint": None, "details": None})
+
+
+def test_search_similar_retries_when_postgrest_has_no_connection(
+    mock_client, mock_embed, no_backoff
+):
+    mock_client.rpc.return_value.execute.side_effect = [
+        _api_error("PGRST001"),
+        MagicMock(data=[{"title": "Heat", "type": "movie"}]),
+    ]
+
+    assert [r["title"] for r in search_similar("crime")] == ["Heat"]
+    assert mock_client.rpc.return_value.execute.call_count == 2
+
+
+def test_search_similar_gives_up_after_max_retries(mock_client, mock_embed, no_backoff):
+    mock_client.rpc.return_value.execute.side_effect = httpx.ReadTimeout("slow")
+
+    with patch("app.database.DB_MAX_RETRIES", 2), pytest.raises(httpx.ReadTimeout):
+        search_similar("crime")
+
+    assert mock_client.rpc.return_value.execute.call_count == 3
+
+
+def test_errors_from_the_query_itself_are_not_retried(
+    mock_client, mock_embed, no_backoff
+):
+    mock_client.rpc.return_value.execute.side_effect = _api_error("42883")
+
+    with pytest.raises(APIError):
+        search_similar("crime")
+
+    mock_client.rpc.return_value.execute.assert_called_once()
+
+
+def test_add_media_retries_when_the_request_was_never_sent(
+    mock_client, mock_embed, mock_build_text, no_backoff
+):
+    execute = mock_client.table.return_value.upsert.return_value.execute
+    execute.side_effect = [httpx.ConnectError("refused"), MagicMock(data=[{"id": "1"}])]
+
+    assert add_media(SEVERANCE) == {"id": "1"}
+
+
+def test_add_media_retries_timeouts_because_the_upsert_is_idempotent(
+    mock_client, mock_embed, mock_build_text, no_backoff
+):
+    # Writing the row twice under its media_key leaves one row.
+    execute = mock_client.table.return_value.upsert.return_value.execute
+    execute.side_effect = [httpx.ReadTimeout("slow"), MagicMock(data=[{"id": "1"}])]
+
+    assert add_media(SEVERANCE) == {"id": "1"}
+    assert execute.call_count == 2
+
+
+def test_add_media_async_retries_transient_failures(
+    mock_embed, mock_build_text, no_backoff
+):
+    client = _async_client(_api_error("PGRST003"), MagicMock(data=[{"id": "1"}]))
+
+    with patch.object(database_module, "_async_client", client):
+        result = asyncio.run(add_media_async(SEVERANCE))
+
+    assert result == {"id": "1"}
+
+
+# ---------------------------------------------------------------------------
+# Deduplication on media_key
+# ---------------------------------------------------------------------------
+
+HEAT = {
+    "title": "Heat",
+    "type": "movie",
+    "tmdb_id": 949,
+    "genres": ["Crime"],
+    "description": "A heist.",
+    "user_rating": 9,
+    "gf_rating": 7,
+    "user_review": "",
+    "gf_review": "",
+}
+
+
+def _stored(entry: dict, **columns) -> dict:
+    """The row add_media would have stored for ``entry``."""
+    row = {
+        **entry,
+        "id": "row-1",
+        "household_id": "default",
+        "media_key": media_key(entry),
+    }
+    return {
+        **row,
+        "content_hash": content_hash(build_embedding_text(row)),
+        "embedding_model": "all-MiniLM-L6-v2",
+        **columns,
+    }
+
+
+@pytest.fixture
+def stored_rows(mock_client):
+    """Set the rows the media_key lookup finds."""
+
+    def install(*rows: dict) -> None:
+        select = mock_client.table.return_value.select
+        select.return_value.eq.return_value.in_.return_value.execute.return_value.data = list(
+            rows
+        )
+
+    return install
+
+
+def test_media_key_prefers_the_tmdb_id():
+    assert media_key(HEAT) == "tmdb:movie:949"
+    assert media_key({"title": "  The  OFFICE ", "type": "series"}) == (
+        "title:series:the office"
+    )
+
+
+def test_resubmitting_an_entry_writes_nothing(mock_client, mock_embed, stored_rows):
+    stored_rows(_stored(HEAT))
+
+    result = add_media(HEAT)
+
+    assert result["id"] == "row-1"
+    mock_embed.assert_not_called()
+    mock_client.table.return_value.upsert.assert_not_called()
+    mock_client.table.return_value.update.assert_not_called()
+
+
+def test_a_change_outside_the_embedded_text_is_updated_without_embedding(
+    mock_client, mock_embed, stored_rows
+):
+    # Ratings are only embedded alongside a review.
+    stored_rows(_stored(HEAT))
+    update = mock_client.table.return_value.update
+    where = update.return_value.eq
+    where.return_value.eq.return_value.execute.return_value.data = [{"id": "row-1"}]
+
+    add_media({**HEAT, "user_rating": 10})
+
+    mock_embed.assert_not_called()
+    update.assert_called_once_with({"user_rating": 10})
+    where.assert_called_once_with("household_id", "default")
+    where.return_value.eq.assert_called_once_with("media_key", "tmdb:movie:949")
+
+
+def test_an_update_that_finds_its_row_deleted_adds_the_entry_again(
+    mock_client, mock_embed, stored_rows
+):
+    stored_rows(_stored(HEAT))
+    update = mock_client.table.return_value.update
+    update.return_value.eq.return_value.eq.return_value.execute.return_value.data = []
+    upsert = mock_client.table.return_value.upsert
+    upsert.return_value.execute.return_value.data = [{"id": "row-2"}]
+
+    result = add_media({**HEAT, "user_rating": 10})
+
+    assert result == {"id": "row-2"}
+    mock_embed.assert_called_once()
+    assert upsert.call_args[0][0]["user_rating"] == 10
+    assert upsert.call_args[0][0]["title"] == "Heat"
+
+
+def test_an_edited_review_is_embedded_again(mock_client, mock_embed, stored_rows):
+    stored_rows(_stored(HEAT))
+    upsert = mock_client.table.return_value.upsert
+    upsert.return_value.execute.return_value.data = [{"id": "row-1"}]
+
+    add_media({**HEAT, "user_review": "Best shootout ever."})
+
+    mock_embed.assert_called_once()
+    row = upsert.call_args[0][0]
+    assert upsert.call_args.kwargs == {"on_conflict": "household_id,media_key"}
+    assert row["content_hash"] != _stored(HEAT)["content_hash"]
+
+
+def test_rows_embedded_by_another_model_are_embedded_again(
+    mock_client, mock_embed, stored_rows
+):
+    stored_rows(_stored(HEAT, embedding_model="old-model"))
+    upsert = mock_client.table.return_value.upsert
+    upsert.return_value.execute.return_value.data = [{"id": "row-1"}]
+
+    add_media(HEAT)
+
+    mock_embed.assert_called_once()
+
+
+def test_add_media_batch_embeds_only_new_and_changed_entries(mock_client, stored_rows):
+    heat_again = _stored(HEAT)
+    amelie = {**HEAT, "title": "Amélie", "tmdb_id": 194}
+    stored_rows(heat_again)
+    upsert = mock_client.table.return_value.upsert
+    upsert.return_value.execute.return_value.data = [
+        {"id": "row-2", "media_key": "tmdb:movie:194"}
+    ]
+
+    with patch(
+        "app.database.embed_batch",
+        side_effect=lambda texts: np.full((len(texts), 3), 0.5, dtype=np.float32),
+    ) as embed:
+        written = add_media_batch([HEAT, amelie, amelie])
+
+    assert [outcome for outcome, _ in written] == ["unchanged", "unchanged", "added"]
+    assert [row["id"] for _, row in written] == ["row-1", "row-2", "row-2"]
+    assert len(embed.call_args[0][0]) == 1
+    [payload] = upsert.call_args[0][0]
+    assert payload["media_key"] == "tmdb:movie:194"
+    assert payload["embedding"] == "[0.5,0.5,0.5]"
+    select = mock_client.table.return_value.select
+    select.return_value.eq.return_value.in_.assert_called_once_with(
+        "media_key", ["tmdb:movie:194", "tmdb:movie:949"]
+    )
+
+
+def test_add_media_batch_writes_the_last_copy_of_a_repeated_entry(
+    mock_client, stored_rows
+):
+    stored_rows(_stored(HEAT))
+    update = mock_client.table.return_value.update
+    update.return_value.eq.return_value.eq.return_value.execute.return_value.data = [
+        {**_stored(HEAT), "user_rating": 6}
+    ]
+
+    written = add_media_batch([{**HEAT, "user_rating": 10}, {**HEAT, "user_rating": 6}])
+
+    assert [outcome for outcome, _ in written] == ["unchanged", "updated"]
+    assert [row["user_rating"] for _, row in written] == [6, 6]
+    update.assert_called_once_with({"user_rating": 6})
+
+
+def test_add_media_batch_adds_an_entry_whose_row_is_gone_before_the_update(
+    mock_client, stored_rows
+):
+    stored_rows(_stored(HEAT))
+    update = mock_client.table.return_value.update
+    update.return_value.eq.return_value.eq.return_value.execute.return_value.data = []
+    upsert = mock_client.table.return_value.upsert
+    upsert.return_value.execute.return_value.data = [
+        {"id": "row-2", "media_key": "tmdb:movie:949"}
+    ]
+
+    with patch(
+        "app.database.embed_batch",
+        side_effect=lambda texts: np.full((len(texts), 3), 0.5, dtype=np.float32),
+    ):
+        written = add_media_batch([{**HEAT, "user_rating": 10}])
+
+    assert written == [("added", {"id": "row-2", "media_key": "tmdb:movie:949"})]
+    assert upsert.call_args[0][0][0]["user_rating"] == 10
+
+
+def test_library_writes_are_scoped_to_the_household(mock_client, mock_embed):
+    upsert = mock_client.table.return_value.upsert
+    upsert.return_value.execute.return_value.data = [{"id": "row-1"}]
+
+    add_media(HEAT, household="flat-4b")
+
+    select = mock_client.table.return_value.select
+    select.return_value.eq.assert_called_once_with("household_id", "flat-4b")
+    assert upsert.call_args[0][0]["household_id"] == "flat-4b"
+
+
+# ---------------------------------------------------------------------------
+# list_media
+# ---------------------------------------------------------------------------
+
+
+def test_list_media_reads_every_page(mock_client):
+    where = mock_client.table.return_value.select.return_value.eq
+    query = where.return_value.order.return_value
+    query.range.return_value.execute.side_effect = [
+        MagicMock(data=[{"id": "1"}, {"id": "2"}]),
+        MagicMock(data=[{"id": "3"}]),
+    ]
+
+    rows = list_media(page_size=2)
+
+    assert [r["id"] for r in rows] == ["1", "2", "3"]
+    assert [c[0] for c in query.range.call_args_list] == [(0, 1), (2, 3)]
+    where.assert_called_with("household_id", "default")
+
+
+# ---------------------------------------------------------------------------
+# partner_names
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def households(mock_client):
+    """The households table's ``names`` lookup, with an empty name cache."""
+    database_module._partner_names.clear()
+    select = mock_client.table.return_value.select
+    yield select.return_value.eq.return_value.execute
+    database_module._partner_names.clear()
+
+
+def test_partner_names_come_from_the_households_table(households):
+    households.return_value.data = [{"names": ["Ana", "Ben"]}]
+
+    assert partner_names("flat-4b") == ["Ana", "Ben"]
+    assert partner_names("flat-4b") == ["Ana", "Ben"]
+    households.assert_called_once()
+
+
+def test_partner_names_default_when_the_household_has_none(households):
+    households.return_value.data = []
+
+    assert partner_names("unknown") == ["Mora", "GF"]
+
+
 # ---------------------------------------------------------------------------
 # search_similar
 # ---------------------------------------------------------------------------
@@ -116,18 +538,57 @@ def test_search_similar_passes_vector_threshold_and_limit(mock_client, mock_embe
     search_similar("test query", limit=3)
 
     params = mock_client.rpc.call_args[0][1]
-    assert params["query_embedding"] == [0.1] * 384
+    assert params["query_embedding"] == "[" + ",".join(["0.1"] * 384) + "]"
     assert params["match_threshold"] == 0.2
     assert params["match_count"] == 3
 
 
-def test_search_similar_returns_rpc_data(mock_client, mock_embed):
-    expected = [{"title": "Parasite", "similarity": 0.85}]
-    mock_client.rpc.return_value.execute.return_value.data = expected
+def test_search_similar_returns_rpc_rows_as_search_hits(mock_client, mock_embed):
+    mock_client.rpc.return_value.execute.return_value.data = [
+        {"id": "1", "title": "Parasite", "type": "movie", "similarity": 0.85}
+    ]
 
     results = search_similar("dark social thriller")
 
-    assert results == expected
+    assert results == [
+        {
+            "id": "1",
+            "tmdb_id": None,
+            "title": "Parasite",
+            "type": "movie",
+            "user_rating": None,
+            "gf_rating": None,
+            "user_review": "",
+            "gf_review": "",
+            "similarity": 0.85,
+        }
+    ]
+
+
+def test_search_similar_drops_embedding_and_description(mock_client, mock_embed):
+    mock_client.rpc.return_value.execute.return_value.data = [
+        {
+            "id": "1",
+            "tmdb_id": 496243,
+            "title": "Parasite",
+            "type": "movie",
+            "genres": ["Thriller"],
+            "description": "A poor family schemes its way into a rich one. " * 20,
+            "embedding": "[" + ",".join(["0.1"] * 384) + "]",
+            "user_rating": 9,
+            "gf_rating": 8,
+            "user_review": "Brilliant.",
+            "gf_review": "Stressful.",
+            "similarity": 0.85,
+        }
+    ]
+
+    [hit] = search_similar("dark social thriller")
+
+    assert set(hit) == set(SearchHit.__annotations__)
+    assert hit["tmdb_id"] == 496243
+    assert hit["user_rating"] == 9
+    assert hit["gf_review"] == "Stressful."
 
 
 def test_search_similar_default_limit_is_5(mock_client, mock_embed):
@@ -137,3 +598,167 @@ def test_search_similar_default_limit_is_5(mock_client, mock_embed):
 
     params = mock_client.rpc.call_args[0][1]
     assert params["match_count"] == 5
+
+
+def test_search_similar_passes_structured_filters_to_rpc(mock_client, mock_embed):
+    mock_client.rpc.return_value.execute.return_value.data = []
+
+    search_similar("anything", media_type="movie", genres=["Drama"], min_rating=7)
+
+    params = mock_client.rpc.call_args[0][1]
+    assert params["filter_type"] == "movie"
+    assert params["filter_genres"] == ["Drama"]
+    assert params["min_rating"] == 7
+
+
+def test_search_similar_searches_only_the_households_library(mock_client, mock_embed):
+    mock_client.rpc.return_value.execute.return_value.data = []
+
+    search_similar("anything", household="flat-4b")
+
+    assert mock_client.rpc.call_args[0][1]["filter_household"] == "flat-4b"
+
+
+def test_search_similar_sends_null_filters_by_default(mock_client, mock_embed):
+    mock_client.rpc.return_value.execute.return_value.data = []
+
+    search_similar("anything")
+
+    params = mock_client.rpc.call_args[0][1]
+    assert params["filter_type"] is None
+    assert params["filter_genres"] is None
+    assert params["min_rating"] is None
+
+
+def test_search_similar_filters_rpc_to_current_model(mock_client, mock_embed):
+    mock_client.rpc.return_value.execute.return_value.data = []
+
+    search_similar("anything")
+
+    params = mock_client.rpc.call_args[0][1]
+    assert params["filter_model"] == "all-MiniLM-L6-v2"
+
+
+def test_search_similar_dual_reads_during_model_migration(mock_client, mock_embed):
+    mock_client.rpc.return_value.execute.side_effect = [
+        MagicMock(data=[{"title": "New", "type": "movie", "similarity": 0.5}]),
+        MagicMock(data=[{"title": "Old", "type": "movie", "similarity": 0.9}]),
+    ]
+
+    with patch("app.database.EMBEDDING_PREVIOUS_MODEL", "old-model"):
+        results = search_similar("anything", limit=2)
+
+    models = [c[0][1]["filter_model"] for c in mock_client.rpc.call_args_list]
+    assert models == ["all-MiniLM-L6-v2", "old-model"]
+    assert mock_embed.call_args_list[1][0] == ("anything", "old-model")
+    assert [r["title"] for r in results] == ["Old", "New"]
+
+
+# ---------------------------------------------------------------------------
+# iter_stale_media / update_embeddings — used by the re-index job
+# ---------------------------------------------------------------------------
+
+
+def _stale_query(mock_client):
+    return mock_client.table.return_value.select.return_value.or_.return_value
+
+
+def test_iter_stale_media_pages_by_id_until_empty(mock_client):
+    query = _stale_query(mock_client).order.return_value.limit.return_value
+    query.gt.return_value.execute.side_effect = [
+        MagicMock(data=[{"id": "c"}]),
+        MagicMock(data=[]),
+    ]
+    query.execute.return_value.data = [{"id": "a"}, {"id": "b"}]
+
+    pages = list(iter_stale_media(batch_size=2))
+
+    assert pages == [[{"id": "a"}, {"id": "b"}], [{"id": "c"}]]
+    assert [c[0][1] for c in query.gt.call_args_list] == ["b", "c"]
+
+
+def test_iter_stale_media_selects_rows_with_other_model_or_version(mock_client):
+    query = _stale_query(mock_client).order.return_value.limit.return_value
+    query.execute.return_value.data = []
+
+    list(iter_stale_media(batch_size=10))
+
+    stale_filter = mock_client.table.return_value.select.return_value.or_.call_args[0][
+        0
+    ]
+    assert 'embedding_model.neq."all-MiniLM-L6-v2"' in stale_filter
+    assert f"embedding_version.neq.{TEMPLATE_VERSION}" in stale_filter
+
+
+def test_iter_stale_media_resumes_after_given_id(mock_client):
+    query = _stale_query(mock_client).order.return_value.limit.return_value
+    query.gt.return_value.execute.return_value.data = []
+
+    list(iter_stale_media(batch_size=10, after_id="m"))
+
+    query.gt.assert_called_once_with("id", "m")
+
+
+class _WatchedMedia:
+    """watched_media rows by id, behind update().eq()/is_().execute()."""
+
+    def __init__(self, *rows: dict) -> None:
+        self.rows = {row["id"]: {**row} for row in rows}
+
+    def update(self, fields: dict) -> "_WatchedMedia":
+        self._fields, self._filters = fields, {}
+        return self
+
+    def eq(self, column: str, value) -> "_WatchedMedia":
+        self._filters[column] = value
+        return self
+
+    def is_(self, column: str, value: str) -> "_WatchedMedia":
+        return self.eq(column, None)
+
+    def execute(self) -> MagicMock:
+        matched = [
+            row
+            for row in self.rows.values()
+            if all(row.get(c) == v for c, v in self._filters.items())
+        ]
+        for row in matched:
+            row.update(self._fields)
+        return MagicMock(data=matched)
+
+
+def test_update_embeddings_writes_only_the_embedding_columns(mock_client):
+    rows = [
+        {"id": "1", "title": "A", "type": "movie", "content_hash": None},
+        {"id": "2", "title": "B", "type": "movie", "content_hash": "old"},
+    ]
+    table = _WatchedMedia(*rows)
+    mock_client.table.return_value = table
+    vectors = np.full((2, 3), 0.5, dtype=np.float32)
+
+    assert update_embeddings(rows, vectors) == 2
+
+    stored = table.rows["1"]
+    assert stored["embedding"] == "[0.5,0.5,0.5]"
+    assert stored["embedding_version"] == TEMPLATE_VERSION
+    assert stored["content_hash"] == content_hash(build_embedding_text(rows[0]))
+    assert table._fields.keys() == {
+        "embedding",
+        "embedding_model",
+        "embedding_version",
+        "content_hash",
+    }
+
+
+def test_update_embeddings_keeps_an_edit_made_after_the_fetch(mock_client):
+    fetched = {"id": "1", "title": "Heat", "type": "movie", "user_review": "ok"}
+    fetched["content_hash"] = "old"
+    # Edited through /media between iter_stale_media and the write.
+    edited = {**fetched, "user_review": "Best shootout ever.", "content_hash": "new"}
+    table = _WatchedMedia(edited)
+    mock_client.table.return_value = table
+
+    written = update_embeddings([fetched], np.full((1, 3), 0.5, dtype=np.float32))
+
+    assert written == 0
+    assert table.rows["1"] == edited
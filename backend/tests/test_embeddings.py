@@ -1,6 +1,19 @@
+import os
+import threading
+
 import numpy as np
+import pytest
 
-from app.embeddings import build_embedding_text, embed
+from app.embeddings import (
+    EmbeddingBatcher,
+    build_embedding_text,
+    embed,
+    embed_batch,
+    load_model,
+    pack_vector,
+    to_pgvector,
+    unpack_vector,
+)
 
 
 # ---------------------------------------------------------------------------
@@ -68,10 +81,11 @@ def test_only_user_review_included_when_gf_review_missing():
 # ---------------------------------------------------------------------------
 
 
-def test_embed_returns_list_of_floats():
+def test_embed_returns_contiguous_float32_array():
     vector = embed("test sentence")
-    assert isinstance(vector, list)
-    assert all(isinstance(v, float) for v in vector)
+    assert isinstance(vector, np.ndarray)
+    assert vector.dtype == np.float32
+    assert vector.flags["C_CONTIGUOUS"]
 
 
 def test_embed_returns_384_dimensions():
@@ -79,18 +93,37 @@ def test_embed_returns_384_dimensions():
     assert len(vector) == 384
 
 
+def test_load_model_returns_the_same_instance():
+    assert load_model() is load_model()
+
+
+def test_load_model_rejects_unconfigured_models():
+    with pytest.raises(ValueError, match="not configured"):
+        load_model("some-other-model")
+
+
+def test_embed_batch_returns_one_row_per_text():
+    vectors = embed_batch(["first text", "second text", "third text"])
+    assert vectors.shape == (3, 384)
+    np.testing.assert_allclose(vectors[1], embed("second text"), atol=1e-5)
+
+
+def test_embed_batch_handles_empty_input():
+    assert embed_batch([]).shape == (0, 384)
+
+
 def test_different_texts_produce_different_vectors():
     v1 = embed("happy romantic comedy")
     v2 = embed("dark horror thriller")
-    assert v1 != v2
+    assert not np.array_equal(v1, v2)
 
 
 def test_similar_texts_are_closer_than_unrelated():
     # Core property of a good embedding model: semantically related sentences
     # should have higher cosine similarity than unrelated ones.
-    v_horror_a = np.array(embed("I love scary horror movies"))
-    v_horror_b = np.array(embed("terrifying films and thrillers"))
-    v_cooking = np.array(embed("delicious pasta recipe with tomatoes"))
+    v_horror_a = embed("I love scary horror movies")
+    v_horror_b = embed("terrifying films and thrillers")
+    v_cooking = embed("delicious pasta recipe with tomatoes")
 
     def cosine(a: np.ndarray, b: np.ndarray) -> float:
         return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
@@ -98,3 +131,135 @@ def test_similar_texts_are_closer_than_unrelated():
     sim_related = cosine(v_horror_a, v_horror_b)
     sim_unrelated = cosine(v_horror_a, v_cooking)
     assert sim_related > sim_unrelated
+
+
+# ---------------------------------------------------------------------------
+# Wire encodings — pgvector text literal and base64 buffer
+# ---------------------------------------------------------------------------
+
+
+def test_to_pgvector_writes_compact_literal():
+    vector = np.array([0.5, -0.25, 0.1], dtype=np.float32)
+    assert to_pgvector(vector) == "[0.5,-0.25,0.1]"
+
+
+def test_to_pgvector_round_trips_within_float32_precision():
+    vector = np.random.default_rng(0).standard_normal(384).astype(np.float32)
+    parsed = np.array(to_pgvector(vector)[1:-1].split(","), dtype=np.float32)
+    np.testing.assert_allclose(parsed, vector, rtol=1e-6)
+
+
+def test_to_pgvector_is_smaller_than_json_float_list():
+    vector = np.random.default_rng(1).standard_normal(384).astype(np.float32)
+    assert len(to_pgvector(vector)) < len(str(vector.tolist()))
+
+
+def test_pack_vector_round_trips_exactly():
+    vector = np.random.default_rng(2).standard_normal(384).astype(np.float32)
+    packed = pack_vector(vector)
+    assert isinstance(packed, str)
+    np.testing.assert_array_equal(unpack_vector(packed), vector)
+
+
+# ---------------------------------------------------------------------------
+# EmbeddingBatcher — micro-batching with a fake encode function
+# ---------------------------------------------------------------------------
+
+
+class RecordingEncoder:
+    """Fake encode function: maps each text to [len(text)] and records batch sizes."""
+
+    def __init__(self):
+        self.batches: list[list[str]] = []
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        self.batches.append(list(texts))
+        return np.array([[float(len(t))] for t in texts], dtype=np.float32)
+
+
+def test_batcher_returns_each_caller_its_own_vector():
+    encoder = RecordingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=1)
+
+    assert batcher.encode("abc").tolist() == [3.0]
+    assert batcher.encode("abcdef").tolist() == [6.0]
+
+
+def test_batcher_groups_concurrent_requests_into_one_batch():
+    encoder = RecordingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=16, max_wait_ms=200)
+
+    texts = [f"text {'x' * i}" for i in range(8)]
+    futures = [batcher.submit(t) for t in texts]
+    results = [f.result(timeout=5) for f in futures]
+
+    assert [r[0] for r in results] == [float(len(t)) for t in texts]
+    assert len(encoder.batches) == 1
+    assert encoder.batches[0] == texts
+
+
+def test_batcher_respects_max_batch_size():
+    encoder = RecordingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=3, max_wait_ms=200)
+
+    futures = [batcher.submit(str(i)) for i in range(7)]
+    for f in futures:
+        f.result(timeout=5)
+
+    assert all(len(batch) <= 3 for batch in encoder.batches)
+    assert sum(len(batch) for batch in encoder.batches) == 7
+
+
+def test_batcher_propagates_encode_errors_to_every_caller():
+    def failing_encode(texts):
+        raise RuntimeError("model exploded")
+
+    batcher = EmbeddingBatcher(failing_encode, max_batch_size=4, max_wait_ms=50)
+    futures = [batcher.submit("a"), batcher.submit("b")]
+
+    for f in futures:
+        with pytest.raises(RuntimeError, match="model exploded"):
+            f.result(timeout=5)
+
+    # The worker keeps running after a failed batch.
+    batcher._encode = RecordingEncoder()
+    assert batcher.encode("ok").tolist() == [2.0]
+
+
+def test_batcher_is_safe_under_many_threads():
+    encoder = RecordingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=2)
+    results: dict[int, float] = {}
+
+    def worker(i: int):
+        results[i] = float(batcher.encode("y" * i)[0])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(64)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert results == {i: float(i) for i in range(64)}
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded")
+def test_batcher_restarts_in_a_forked_child(monkeypatch):
+    batcher = EmbeddingBatcher(RecordingEncoder(), max_batch_size=4, max_wait_ms=1)
+    monkeypatch.setattr("app.embeddings._batcher", batcher)
+    batcher.encode("parent")  # the parent's worker thread is running
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        fresh = batcher._thread is None
+        vector = batcher.encode("child")
+        os.write(write_fd, f"{fresh} {vector[0]}".encode())
+        os._exit(0)
+
+    os.close(write_fd)
+    _, status = os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as pipe:
+        assert pipe.read() == "True 5.0"
+    assert status == 0
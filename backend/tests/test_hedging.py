@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+
+from app.hedging import _HEDGES, Hedger
+
+
+def make_hedger(name: str, enabled: bool = True, delay_ms: float = 10) -> Hedger:
+    return Hedger(name, enabled=enabled, delay_ms=delay_ms, min_delay_ms=1, workers=4)
+
+
+def slow_first(release: threading.Event, first="slow", then="fast"):
+    """A call whose first copy waits for ``release`` and later ones return."""
+    calls = []
+    lock = threading.Lock()
+
+    def fn() -> str:
+        with lock:
+            calls.append(None)
+            number = len(calls)
+        if number == 1:
+            release.wait(5)
+            return first
+        return then
+
+    return fn, calls
+
+
+# ---------------------------------------------------------------------------
+# When a hedge fires
+# ---------------------------------------------------------------------------
+
+
+def test_fast_calls_are_not_hedged():
+    hedger = make_hedger("test.fast", delay_ms=1000)
+
+    assert hedger.call(lambda: "answer") == "answer"
+    assert _HEDGES.value(name="test.fast", result="fired") == 0
+
+
+def test_slow_call_is_hedged_and_the_first_answer_wins():
+    hedger = make_hedger("test.slow")
+    release = threading.Event()
+    fn, calls = slow_first(release)
+
+    result = hedger.call(fn)
+    release.set()
+
+    assert result == "fast"
+    assert len(calls) == 2
+    assert _HEDGES.value(name="test.slow", result="fired") == 1
+    assert _HEDGES.value(name="test.slow", result="won") == 1
+
+
+def test_disabled_hedger_calls_once():
+    hedger = make_hedger("test.disabled", enabled=False)
+    release = threading.Event()
+    threading.Timer(0.05, release.set).start()
+    fn, calls = slow_first(release)
+
+    assert hedger.call(fn) == "slow"
+    assert len(calls) == 1
+
+
+def test_vetoed_hedge_waits_for_the_first_copy():
+    hedger = make_hedger("test.vetoed")
+    release = threading.Event()
+    threading.Timer(0.05, release.set).start()
+    fn, calls = slow_first(release)
+
+    assert hedger.call(fn, may_hedge=lambda: False) == "slow"
+    assert len(calls) == 1
+    assert _HEDGES.value(name="test.vetoed", result="skipped") == 1
+    assert _HEDGES.value(name="test.vetoed", result="fired") == 0
+
+
+def test_a_failed_copy_waits_for_the_other():
+    hedger = make_hedger("test.failed")
+    release = threading.Event()
+    calls = []
+
+    def fn() -> str:
+        calls.append(None)
+        if len(calls) == 1:
+            release.wait(5)
+            raise RuntimeError("first copy failed")
+        release.set()
+        raise RuntimeError("second copy failed")
+
+    with pytest.raises(RuntimeError):
+        hedger.call(fn)
+    assert len(calls) == 2
+
+
+def test_primary_failing_fast_raises_without_a_hedge():
+    hedger = make_hedger("test.error", delay_ms=1000)
+
+    def fn() -> str:
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        hedger.call(fn)
+    assert _HEDGES.value(name="test.error", result="fired") == 0
+
+
+# ---------------------------------------------------------------------------
+# Delay
+# ---------------------------------------------------------------------------
+
+
+def test_delay_is_the_default_until_enough_samples():
+    hedger = make_hedger("test.default", delay_ms=250)
+
+    assert hedger.delay() == 0.25
+
+
+def test_delay_is_the_recent_p95():
+    hedger = make_hedger("test.p95")
+    hedger._latencies.extend(i / 1000 for i in range(1, 101))
+
+    assert hedger.delay() == pytest.approx(0.095)
+
+
+def test_delay_is_never_below_the_minimum():
+    hedger = make_hedger("test.minimum")
+    hedger._latencies.extend([0.0] * 50)
+
+    assert hedger.delay() == 0.001
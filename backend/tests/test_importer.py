@@ -0,0 +1,148 @@
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.embeddings import build_embedding_text
+from app.importer import _pick, import_titles
+
+
+def _result(title: str, media_type: str = "movie", tmdb_id: int = 1) -> dict:
+    return {
+        "tmdb_id": tmdb_id,
+        "title": title,
+        "type": media_type,
+        "year": "2001",
+        "description": f"About {title}.",
+        "genres": ["Drama"],
+    }
+
+
+SEARCH = {
+    "Amélie": [_result("Amélie", tmdb_id=194)],
+    "Friends": [_result("Friends (Reunion)"), _result("Friends", "series", 1668)],
+    "Heat": [_result("Heat 2"), _result("Heat", tmdb_id=949)],
+    "xyzzy": [],
+}
+
+
+def _search(query: str) -> list[dict]:
+    if query == "boom":
+        raise httpx.ConnectTimeout("timed out")
+    return SEARCH[query]
+
+
+def _write(entries, household):
+    return [("added", {"id": f"row-{e['tmdb_id']}", **e}) for e in entries]
+
+
+@pytest.fixture
+def write():
+    """Patch TMDB search and the library write behind app.importer."""
+    with (
+        patch("app.importer.search_media", side_effect=_search),
+        patch("app.importer.add_media_batch", side_effect=_write) as write,
+    ):
+        yield write
+
+
+def _by_index(statuses) -> dict[int, dict]:
+    return {s["index"]: s for s in statuses}
+
+
+# ---------------------------------------------------------------------------
+# _pick
+# ---------------------------------------------------------------------------
+
+
+def test_pick_prefers_an_exact_title_match():
+    assert _pick(SEARCH["Heat"], "heat ", None)["tmdb_id"] == 949
+
+
+def test_pick_honours_the_requested_type():
+    assert _pick(SEARCH["Friends"], "Friends", "series")["tmdb_id"] == 1668
+    assert _pick(SEARCH["Amélie"], "Amélie", "series") is None
+
+
+def test_pick_falls_back_to_the_top_result():
+    assert _pick(SEARCH["Heat"], "Heat (1995)", "movie")["title"] == "Heat 2"
+
+
+# ---------------------------------------------------------------------------
+# import_titles
+# ---------------------------------------------------------------------------
+
+
+def test_every_item_gets_a_status(write):
+    items = [{"title": "Amélie"}, {"title": "xyzzy"}, {"title": "boom"}]
+
+    statuses = _by_index(import_titles(items, concurrency=2, batch_size=10))
+
+    assert statuses[0]["status"] == "added"
+    assert statuses[0]["id"] == "row-194"
+    assert statuses[1]["status"] == "not_found"
+    assert statuses[2] == {
+        "index": 2,
+        "title": "boom",
+        "status": "failed",
+        "error": "ConnectTimeout",
+    }
+
+
+def test_resolved_entries_keep_the_users_ratings_and_reviews(write):
+    item = {"title": "Friends", "type": "series", "user_rating": 4, "gf_review": "Ok"}
+
+    list(import_titles([item], concurrency=1, batch_size=10))
+
+    [entry] = write.call_args[0][0]
+    assert entry["tmdb_id"] == 1668
+    assert entry["type"] == "series"
+    assert entry["user_rating"] == 4
+    assert entry["gf_review"] == "Ok"
+    assert entry["user_review"] == ""
+
+
+def test_a_review_without_a_rating_is_embedded_with_an_unknown_rating(write):
+    item = {"title": "Heat", "user_rating": None, "user_review": "great"}
+
+    list(import_titles([item], concurrency=1, batch_size=10))
+
+    [entry] = write.call_args[0][0]
+    assert "user_rating" not in entry and "gf_rating" not in entry
+    assert "Mora's review (rating ?/10): great" in build_embedding_text(entry)
+
+
+def test_entries_are_written_in_batches(write):
+    items = [{"title": t} for t in ("Amélie", "Heat", "Friends")]
+
+    list(import_titles(items, concurrency=3, batch_size=2))
+
+    assert [len(c[0][0]) for c in write.call_args_list] == [2, 1]
+
+
+def test_titles_already_in_the_library_are_reported_as_such(write):
+    write.side_effect = lambda entries, household: [
+        ("reembedded", {"id": "row-1"}),
+        ("unchanged", {"id": "row-2"}),
+    ]
+    items = [{"title": "Amélie"}, {"title": "Heat"}]
+
+    statuses = list(import_titles(items, concurrency=1, batch_size=2))
+
+    assert sorted(s["status"] for s in statuses) == ["unchanged", "updated"]
+
+
+def test_a_failed_write_fails_only_its_batch(write):
+    write.side_effect = [RuntimeError("down"), _write([_result("Heat")], "default")]
+    items = [{"title": t} for t in ("Amélie", "Friends", "Heat")]
+
+    statuses = list(import_titles(items, concurrency=1, batch_size=2))
+
+    assert [s["status"] for s in statuses] == ["failed", "failed", "added"]
+    assert statuses[0]["error"] == "RuntimeError"
+
+
+def test_entries_are_written_to_the_requested_household(write):
+    list(import_titles([{"title": "Heat"}], concurrency=1, household="flat-4b"))
+
+    assert write.call_args[0][1] == "flat-4b"
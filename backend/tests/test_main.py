@@ -0,0 +1,252 @@
+import asyncio
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessageChunk
+
+import main
+from app import profiling, thread_tokens, tmdb
+from app.admission import _IN_FLIGHT, AdmissionGate
+from app.config import API_SECRET
+
+AUTH = {"Authorization": f"Bearer {API_SECRET}"}
+
+# Not entered as a context manager, so the lifespan (model warm-up) doesn't run.
+client = TestClient(main.app, headers=AUTH)
+
+
+def recommendation(*texts: str):
+    for text in texts:
+        yield (
+            "messages",
+            (AIMessageChunk(content=text), {"langgraph_node": "recommend"}),
+        )
+
+
+def running_graph(stream):
+    """Patch the recommender so a resumed thread streams ``stream()``."""
+    graph = MagicMock()
+    graph.get_state.return_value = MagicMock(values={"mood": ["tense"]})
+    graph.stream.side_effect = lambda *args, **kwargs: stream()
+    return patch.object(main, "get_recommender", return_value=graph)
+
+
+def reply(token: str | None = None, **headers):
+    body = {"thread_id": token or thread_tokens.issue("RO"), "answer": "no preference"}
+    return client.post("/recommend/reply", json=body, headers=headers)
+
+
+# ---------------------------------------------------------------------------
+# /recommend/reply — admission control
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def gate():
+    gate = AdmissionGate("test.main", limit=1, max_queue=0, max_wait=1.0, retry_after=7)
+    with patch.object(main, "_graph_gate", gate):
+        yield gate
+
+
+def test_reply_is_turned_away_while_the_gate_is_full(gate):
+    asyncio.run(gate.acquire())
+
+    with running_graph(lambda: recommendation("Heat")) as get_recommender:
+        response = reply()
+    gate.release()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    get_recommender.return_value.stream.assert_not_called()
+
+
+def test_reply_releases_its_slot_once_the_stream_ends(gate):
+    with running_graph(lambda: recommendation("Watch ", "Heat.")):
+        first = reply()
+        second = reply()
+
+    assert first.status_code == second.status_code == 200
+    assert "Heat." in second.text
+    assert _IN_FLIGHT.value(gate="test.main") == 0
+
+
+def test_reply_releases_its_slot_when_the_client_goes_away(gate):
+    streamed = []
+
+    def slow_recommendation():
+        for word in ["word "] * 100:
+            time.sleep(0.01)
+            streamed.append(word)
+            yield from recommendation(word)
+
+    body = json.dumps({"thread_id": thread_tokens.issue("RO"), "answer": "tense"})
+    messages = [
+        {"type": "http.request", "body": body.encode()},
+        {"type": "http.disconnect"},
+    ]
+
+    async def receive():
+        return messages.pop(0) if len(messages) > 1 else messages[0]
+
+    async def send(message):
+        pass
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/recommend/reply",
+        "raw_path": b"/recommend/reply",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"authorization", AUTH["Authorization"].encode()),
+            (b"content-type", b"application/json"),
+        ],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    with running_graph(slow_recommendation):
+        asyncio.run(main.app(scope, receive, send))
+        assert len(streamed) < 100
+        assert _IN_FLIGHT.value(gate="test.main") == 0
+        assert reply().status_code == 200
+
+
+# ---------------------------------------------------------------------------
+# /search — revalidation with ETags
+# ---------------------------------------------------------------------------
+
+
+def search_page(results: list[dict], etag: str) -> tmdb.SearchPage:
+    return tmdb.SearchPage(
+        results=results,
+        body=json.dumps(results).encode(),
+        etag=etag,
+        expires_at=time.monotonic() + 600,
+    )
+
+
+HEAT = [
+    {
+        "tmdb_id": 949,
+        "title": "Heat",
+        "type": "movie",
+        "year": "1995",
+        "description": "A heist.",
+        "genres": ["Crime"],
+    }
+]
+
+
+def test_search_sends_an_etag_and_cache_control():
+    with patch.object(tmdb, "search_page", return_value=search_page(HEAT, '"v1"')):
+        response = client.get("/search", params={"q": "heat"})
+
+    assert response.status_code == 200
+    assert response.json() == HEAT
+    assert response.headers["ETag"] == '"v1"'
+    assert response.headers["Cache-Control"].startswith("private, max-age=")
+    assert 0 < int(response.headers["Cache-Control"].split("=")[1]) <= 600
+
+
+@pytest.mark.parametrize("if_none_match", ['"v1"', 'W/"v1"', '"v0", "v1"', "*"])
+def test_search_answers_a_matching_if_none_match_with_304(if_none_match):
+    with patch.object(tmdb, "search_page", return_value=search_page(HEAT, '"v1"')):
+        response = client.get(
+            "/search", params={"q": "heat"}, headers={"If-None-Match": if_none_match}
+        )
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == '"v1"'
+    assert response.headers["Cache-Control"].startswith("private, max-age=")
+
+
+def test_search_sends_the_new_body_once_the_results_change():
+    changed = search_page([{**HEAT[0], "year": "1996"}], '"v2"')
+
+    with patch.object(tmdb, "search_page", return_value=changed):
+        response = client.get(
+            "/search", params={"q": "heat"}, headers={"If-None-Match": '"v1"'}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"v2"'
+    assert response.json()[0]["year"] == "1996"
+
+
+# ---------------------------------------------------------------------------
+# /admin — guarded by X-Admin-Secret
+# ---------------------------------------------------------------------------
+
+ADMIN_ROUTES = [
+    ("GET", "/admin/memory"),
+    ("POST", "/admin/tracemalloc/start"),
+    ("POST", "/admin/tracemalloc/stop"),
+    ("GET", "/admin/tracemalloc"),
+    ("GET", "/admin/profile/cpu"),
+]
+
+
+@pytest.fixture
+def admin_secret():
+    with patch.object(main, "ADMIN_SECRET", "s3cret"):
+        yield "s3cret"
+
+
+@pytest.mark.parametrize(("method", "path"), ADMIN_ROUTES)
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Secret": "guess"}])
+def test_admin_routes_need_the_admin_secret(admin_secret, method, path, headers):
+    assert client.request(method, path, headers=headers).status_code == 403
+
+
+@pytest.mark.parametrize(("method", "path"), ADMIN_ROUTES)
+def test_admin_routes_dont_exist_without_an_admin_secret(method, path):
+    with patch.object(main, "ADMIN_SECRET", ""):
+        response = client.request(method, path, headers={"X-Admin-Secret": ""})
+
+    assert response.status_code == 404
+
+
+def test_tracemalloc_report_before_start_is_a_conflict(admin_secret):
+    profiling.stop_tracemalloc()
+
+    response = client.get(
+        "/admin/tracemalloc", headers={"X-Admin-Secret": admin_secret}
+    )
+
+    assert response.status_code == 409
+    assert response.json() == {"detail": "tracemalloc is not running"}
+
+
+# ---------------------------------------------------------------------------
+# /recommend/reply — thread tokens
+# ---------------------------------------------------------------------------
+
+
+def test_reply_to_another_households_thread_is_not_found():
+    theirs = thread_tokens.issue("RO", "theirs")
+
+    with running_graph(lambda: recommendation("Heat")) as get_recommender:
+        response = reply(theirs, **{"X-Household-Id": "ours"})
+
+    assert response.status_code == 404
+    get_recommender.assert_not_called()
+
+
+def test_reply_to_a_forged_thread_is_not_found():
+    thread_id, region, _, signature = thread_tokens.issue("RO", "theirs").split(".")
+
+    with running_graph(lambda: recommendation("Heat")) as get_recommender:
+        response = reply(
+            f"{thread_id}.{region}.ours.{signature}", **{"X-Household-Id": "ours"}
+        )
+
+    assert response.status_code == 404
+    get_recommender.assert_not_called()
@@ -0,0 +1,79 @@
+import pytest
+
+from app.metrics import Counter, Gauge, Histogram, _Metric, render
+
+# ---------------------------------------------------------------------------
+# Counter / Gauge
+# ---------------------------------------------------------------------------
+
+
+def test_counter_accumulates_per_label_set():
+    counter = Counter("test_counter_total", "A counter.", labels=("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    counter.inc(kind="b")
+
+    assert counter.value(kind="a") == 3
+    assert counter.value(kind="b") == 1
+
+
+def test_gauge_can_go_up_and_down():
+    gauge = Gauge("test_gauge", "A gauge.")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.value() == 1
+
+    gauge.set(7)
+    assert gauge.value() == 7
+
+
+# ---------------------------------------------------------------------------
+# Histogram
+# ---------------------------------------------------------------------------
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(0.1)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    lines = histogram.render()
+
+    assert 'test_latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{le="1"} 3' in lines
+    assert 'test_latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "test_latency_seconds_count 4" in lines
+    assert histogram.count() == 4
+
+
+def test_histogram_labels_are_escaped():
+    histogram = Histogram("test_labelled_seconds", "Latency.", labels=("route",))
+    histogram.observe(0.2, route='/a"b')
+
+    assert any('route="/a\\"b"' in line for line in histogram.render())
+
+
+# ---------------------------------------------------------------------------
+# render
+# ---------------------------------------------------------------------------
+
+
+def test_render_includes_help_and_type_for_registered_metrics():
+    Counter("test_rendered_total", "Rendered counter.").inc()
+
+    text = render()
+
+    assert "# HELP test_rendered_total Rendered counter." in text
+    assert "# TYPE test_rendered_total counter" in text
+    assert "test_rendered_total 1" in text
+
+
+def test_a_metric_without_render_fails_when_built():
+    class Unrendered(_Metric):
+        kind = "counter"
+
+    with pytest.raises(TypeError):
+        Unrendered("test_unrendered_total", "Never rendered.")
@@ -0,0 +1,132 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app import profiling
+from app.profiling import ProfilingError
+
+# ---------------------------------------------------------------------------
+# deep_size / structures
+# ---------------------------------------------------------------------------
+
+
+def test_deep_size_counts_array_buffers_once():
+    array = np.zeros(1000, dtype=np.float32)
+
+    assert profiling.deep_size({"a": array, "b": [array]}) >= 4000
+    assert profiling.deep_size({"a": array, "b": [array]}) < 8000
+
+
+def test_deep_size_follows_instance_attributes():
+    class Holder:
+        def __init__(self) -> None:
+            self.payload = "x" * 10_000
+
+    assert profiling.deep_size(Holder()) > 10_000
+
+
+@pytest.fixture
+def tracked():
+    saved = dict(profiling._tracked)
+    profiling._tracked.clear()
+    yield
+    profiling._tracked.clear()
+    profiling._tracked.update(saved)
+
+
+def test_structures_reports_tracked_objects_that_exist(tracked):
+    cache = {"q": "result"}
+    profiling.track("test.cache", lambda: cache)
+    profiling.track("test.not_built", lambda: None)
+
+    report = profiling.structures()
+
+    assert list(report) == ["test.cache"]
+    assert report["test.cache"]["entries"] == 1
+    assert report["test.cache"]["bytes"] > 0
+
+
+def test_app_modules_track_their_caches():
+    import app.agent  # noqa: F401
+
+    assert {
+        "tmdb.search_cache",
+        "retrieval.lexical_indexes",
+        "agent.checkpointer",
+    } <= set(profiling._tracked)
+
+
+# ---------------------------------------------------------------------------
+# tracemalloc
+# ---------------------------------------------------------------------------
+
+
+def test_tracemalloc_report_needs_tracing_started():
+    profiling.stop_tracemalloc()
+
+    with pytest.raises(ProfilingError):
+        profiling.tracemalloc_report()
+
+
+def test_tracemalloc_report_shows_where_memory_grew():
+    profiling.start_tracemalloc()
+    try:
+        kept = [bytearray(1024) for _ in range(1000)]  # noqa: F841
+        report = profiling.tracemalloc_report(limit=5)
+        again = profiling.tracemalloc_report(limit=5)
+    finally:
+        profiling.stop_tracemalloc()
+
+    top = report["top"][0]
+    assert top["traceback"][-1].startswith(__file__)
+    assert top["size_diff"] >= 1024 * 1000
+    # Each report diffs against the previous one.
+    assert all(stat["size_diff"] < 1024 * 1000 for stat in again["top"])
+
+
+# ---------------------------------------------------------------------------
+# profile_cpu
+# ---------------------------------------------------------------------------
+
+
+def _spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_cpu_samples_busy_threads_in_collapsed_format():
+    stop = threading.Event()
+    thread = threading.Thread(target=_spin, args=(stop,), name="spinner")
+    thread.start()
+    try:
+        stacks = profiling.profile_cpu(0.2, interval=0.005)
+    finally:
+        stop.set()
+        thread.join()
+
+    spinner = [line for line in stacks.splitlines() if line.startswith("spinner;")]
+    assert spinner
+    stack, count = spinner[0].rsplit(" ", 1)
+    assert stack.split(";")[-1].startswith("_spin (tests/test_profiling.py:")
+    assert int(count) > 0
+
+
+def test_profile_cpu_leaves_out_waiting_threads_unless_asked():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, name="waiter")
+    thread.start()
+    try:
+        busy = profiling.profile_cpu(0.05, interval=0.005)
+        everything = profiling.profile_cpu(0.05, interval=0.005, idle=True)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert "waiter;" not in busy
+    assert "waiter;" in everything
+
+
+def test_only_one_cpu_profile_runs_at_a_time():
+    with profiling._profile_lock, pytest.raises(ProfilingError):
+        profiling.profile_cpu(0.01)
@@ -0,0 +1,117 @@
+import json
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.embeddings import TEMPLATE_VERSION
+from app.reindex import reindex
+
+
+@pytest.fixture
+def state_file(tmp_path):
+    return tmp_path / "reindex-state.json"
+
+
+@pytest.fixture
+def mock_embed_batch():
+    """Returns one zero vector per text so tests don't load the model."""
+    with patch(
+        "app.reindex.embed_batch",
+        side_effect=lambda texts: np.zeros((len(texts), 384), dtype=np.float32),
+    ) as m:
+        yield m
+
+
+def _row(row_id: str) -> dict:
+    return {"id": row_id, "title": f"Title {row_id}", "type": "movie", "genres": []}
+
+
+def test_reindex_embeds_and_writes_each_page(state_file, mock_embed_batch):
+    pages = [[_row("a"), _row("b")], [_row("c")]]
+
+    with (
+        patch("app.reindex.iter_stale_media", return_value=iter(pages)),
+        patch("app.reindex.update_embeddings", side_effect=[2, 0]) as mock_update,
+    ):
+        written = list(reindex(batch_size=2, state_file=state_file))
+
+    # The second page's row was edited meanwhile, so nothing was written.
+    assert written == [2, 0]
+    assert mock_embed_batch.call_count == 2
+    assert [c[0][0] for c in mock_update.call_args_list] == pages
+
+
+def test_reindex_embeds_the_template_text(state_file, mock_embed_batch):
+    with (
+        patch("app.reindex.iter_stale_media", return_value=iter([[_row("a")]])),
+        patch("app.reindex.update_embeddings"),
+    ):
+        list(reindex(state_file=state_file))
+
+    texts = mock_embed_batch.call_args[0][0]
+    assert texts[0].startswith("Title: Title a")
+
+
+def test_reindex_saves_cursor_after_each_page(state_file, mock_embed_batch):
+    def fail_on_second_page(rows, vectors):
+        if rows[0]["id"] == "c":
+            raise RuntimeError("network down")
+
+    pages = [[_row("a"), _row("b")], [_row("c")]]
+    with (
+        patch("app.reindex.iter_stale_media", return_value=iter(pages)),
+        patch("app.reindex.update_embeddings", side_effect=fail_on_second_page),
+        pytest.raises(RuntimeError),
+    ):
+        list(reindex(state_file=state_file))
+
+    assert json.loads(state_file.read_text())["after_id"] == "b"
+
+
+def test_reindex_resumes_from_saved_cursor(state_file, mock_embed_batch):
+    state_file.write_text(
+        json.dumps(
+            {
+                "target": {"model": "all-MiniLM-L6-v2", "version": TEMPLATE_VERSION},
+                "after_id": "b",
+            }
+        )
+    )
+
+    with (
+        patch("app.reindex.iter_stale_media", return_value=iter([])) as mock_iter,
+        patch("app.reindex.update_embeddings"),
+    ):
+        list(reindex(batch_size=5, state_file=state_file))
+
+    mock_iter.assert_called_once_with(5, "b")
+
+
+def test_reindex_ignores_cursor_saved_for_another_version(state_file, mock_embed_batch):
+    state_file.write_text(
+        json.dumps(
+            {
+                "target": {"model": "all-MiniLM-L6-v2", "version": -1},
+                "after_id": "b",
+            }
+        )
+    )
+
+    with (
+        patch("app.reindex.iter_stale_media", return_value=iter([])) as mock_iter,
+        patch("app.reindex.update_embeddings"),
+    ):
+        list(reindex(batch_size=5, state_file=state_file))
+
+    mock_iter.assert_called_once_with(5, None)
+
+
+def test_reindex_removes_cursor_when_finished(state_file, mock_embed_batch):
+    with (
+        patch("app.reindex.iter_stale_media", return_value=iter([[_row("a")]])),
+        patch("app.reindex.update_embeddings"),
+    ):
+        list(reindex(state_file=state_file))
+
+    assert not state_file.exists()
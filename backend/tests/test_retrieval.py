@@ -0,0 +1,256 @@
+from unittest.mock import patch
+
+import pytest
+
+import app.retrieval as retrieval_module
+from app.retrieval import (
+    LexicalIndex,
+    hybrid_search,
+    matches_filters,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+LIBRARY = [
+    {
+        "id": "1",
+        "title": "Breaking Bad",
+        "type": "series",
+        "genres": ["Drama", "Crime"],
+        "user_review": "Tense and dark, could not stop watching.",
+        "gf_review": "Walter is terrifying.",
+    },
+    {
+        "id": "2",
+        "title": "Paddington 2",
+        "type": "movie",
+        "genres": ["Comedy", "Family"],
+        "user_review": "Cozy and funny, perfect relaxed evening.",
+        "gf_review": "Made me cry happy tears.",
+    },
+    {
+        "id": "3",
+        "title": "Heat",
+        "type": "movie",
+        "genres": ["Crime", "Thriller"],
+        "user_review": "Long but tense heist movie.",
+        "gf_review": "Too long.",
+    },
+]
+
+
+@pytest.fixture(autouse=True)
+def reset_index():
+    """Drop the cached lexical indexes before every test."""
+    retrieval_module._indexes.clear()
+    yield
+
+
+# ---------------------------------------------------------------------------
+# tokenize / LexicalIndex — pure BM25, no mocking needed
+# ---------------------------------------------------------------------------
+
+
+def test_tokenize_lowercases_and_drops_stopwords():
+    assert tokenize("The Dark and TENSE night") == ["dark", "tense", "night"]
+
+
+def test_lexical_index_finds_review_terms():
+    index = LexicalIndex(LIBRARY)
+    results = index.search("cozy relaxed", limit=5)
+    assert [r["title"] for r in results] == ["Paddington 2"]
+
+
+def test_lexical_index_ranks_title_match_above_review_match():
+    rows = [
+        {"id": "a", "title": "Other", "genres": [], "user_review": "like heat"},
+        {"id": "b", "title": "Heat", "genres": [], "user_review": "great"},
+    ]
+    results = LexicalIndex(rows).search("heat", limit=5)
+    assert [r["id"] for r in results] == ["b", "a"]
+
+
+def test_lexical_index_matches_genres():
+    results = LexicalIndex(LIBRARY).search("crime", limit=5)
+    assert {r["title"] for r in results} == {"Breaking Bad", "Heat"}
+
+
+def test_lexical_index_applies_filters_before_ranking():
+    results = LexicalIndex(LIBRARY).search("tense", limit=1, media_type="movie")
+    assert [r["title"] for r in results] == ["Heat"]
+
+
+def test_lexical_index_genre_filter():
+    results = LexicalIndex(LIBRARY).search("tense crime", limit=5, genres=["drama"])
+    assert [r["title"] for r in results] == ["Breaking Bad"]
+
+
+def test_lexical_index_returns_nothing_for_unknown_terms():
+    assert LexicalIndex(LIBRARY).search("zzzz", limit=5) == []
+
+
+def test_lexical_index_handles_empty_library():
+    assert LexicalIndex([]).search("anything", limit=5) == []
+
+
+# ---------------------------------------------------------------------------
+# matches_filters — local mirror of the RPC filters
+# ---------------------------------------------------------------------------
+
+
+def test_matches_filters_by_type():
+    assert matches_filters(LIBRARY[1], media_type="movie")
+    assert not matches_filters(LIBRARY[0], media_type="movie")
+
+
+def test_matches_filters_genres_case_insensitively():
+    assert matches_filters(LIBRARY[2], genres=["THRILLER"])
+    assert not matches_filters(LIBRARY[1], genres=["thriller", "horror"])
+
+
+def test_matches_filters_by_average_rating():
+    row = {"user_rating": 9, "gf_rating": 6}
+    assert matches_filters(row, min_rating=7.5)
+    assert not matches_filters(row, min_rating=8)
+
+
+# ---------------------------------------------------------------------------
+# reciprocal_rank_fusion
+# ---------------------------------------------------------------------------
+
+
+def test_rrf_ranks_rows_found_by_both_retrievers_first():
+    a, b, c = ({"id": x} for x in "abc")
+    fused = reciprocal_rank_fusion([a, b], [c, b])
+    assert fused[0] == b
+
+
+def test_rrf_keeps_vector_copy_of_duplicate_rows():
+    vector = [{"id": "1", "similarity": 0.8}]
+    lexical = [{"id": "1"}]
+    fused = reciprocal_rank_fusion(vector, lexical)
+    assert fused == [{"id": "1", "similarity": 0.8}]
+
+
+# ---------------------------------------------------------------------------
+# hybrid_search — search_similar and list_media mocked
+# ---------------------------------------------------------------------------
+
+
+def _fake_search_similar(vector_hits):
+    """search_similar stand-in that applies the filters like the RPC would."""
+
+    def search(query, limit=5, household="default", **filters):
+        return [row for row in vector_hits if matches_filters(row, **filters)][:limit]
+
+    return search
+
+
+def _hybrid(vector_hits, **kwargs):
+    with (
+        patch(
+            "app.retrieval.search_similar",
+            side_effect=_fake_search_similar(vector_hits),
+        ),
+        patch("app.retrieval.list_media", return_value=LIBRARY),
+    ):
+        return hybrid_search(**kwargs)
+
+
+def test_hybrid_adds_lexical_hits_missed_by_vector_search():
+    results = _hybrid([LIBRARY[0]], query="q", keywords="cozy")
+    assert {r["title"] for r in results} == {"Breaking Bad", "Paddington 2"}
+
+
+def test_hybrid_filters_by_media_type():
+    results = _hybrid(LIBRARY, query="q", keywords="tense", media_type="movie")
+    assert all(r["type"] == "movie" for r in results)
+
+
+def test_hybrid_ranks_genre_matches_first():
+    results = _hybrid(LIBRARY, query="q", keywords="", genres=["thriller"])
+    assert results[0]["title"] == "Heat"
+    assert len(results) == 3
+
+
+def test_hybrid_pushes_filters_into_vector_search():
+    with (
+        patch("app.retrieval.search_similar", return_value=[]) as mock_search,
+        patch("app.retrieval.list_media", return_value=LIBRARY),
+    ):
+        hybrid_search("q", "", media_type="series", genres=["drama"])
+
+    first_call = mock_search.call_args_list[0][1]
+    assert first_call["media_type"] == "series"
+    assert first_call["genres"] == ["drama"]
+
+
+def test_hybrid_skips_backfill_when_genre_matches_fill_the_limit():
+    with (
+        patch(
+            "app.retrieval.search_similar",
+            side_effect=_fake_search_similar(LIBRARY),
+        ) as mock_search,
+        patch("app.retrieval.list_media", return_value=LIBRARY),
+    ):
+        hybrid_search("q", "", genres=["crime"], limit=2)
+
+    assert mock_search.call_count == 1
+
+
+def test_hybrid_respects_limit():
+    results = _hybrid(LIBRARY, query="q", keywords="tense crime", limit=1)
+    assert len(results) == 1
+
+
+def test_hybrid_reuses_index_until_library_changes():
+    with (
+        patch("app.retrieval.search_similar", return_value=[]),
+        patch("app.retrieval.list_media", return_value=LIBRARY) as mock_list,
+        patch("app.retrieval.library_version", return_value=1) as mock_version,
+    ):
+        hybrid_search("q", "tense")
+        hybrid_search("q", "tense")
+        assert mock_list.call_count == 1
+
+        mock_version.return_value = 2
+        hybrid_search("q", "tense")
+        assert mock_list.call_count == 2
+
+
+def test_hybrid_searches_only_the_requested_household():
+    with (
+        patch("app.retrieval.search_similar", return_value=[]) as mock_search,
+        patch("app.retrieval.list_media", return_value=LIBRARY) as mock_list,
+    ):
+        hybrid_search("q", "tense", household="flat-4b")
+
+    assert mock_search.call_args[1]["household"] == "flat-4b"
+    mock_list.assert_called_once_with("flat-4b")
+
+
+def test_households_get_their_own_lexical_index():
+    libraries = {"ours": LIBRARY[:1], "theirs": LIBRARY[1:]}
+    with (
+        patch("app.retrieval.search_similar", return_value=[]),
+        patch("app.retrieval.list_media", side_effect=libraries.get),
+    ):
+        ours = hybrid_search("q", "tense", household="ours")
+        theirs = hybrid_search("q", "tense", household="theirs")
+
+    assert [r["title"] for r in ours] == ["Breaking Bad"]
+    assert [r["title"] for r in theirs] == ["Heat"]
+
+
+def test_least_recently_used_household_index_is_evicted(monkeypatch):
+    monkeypatch.setattr(retrieval_module, "LEXICAL_INDEX_CACHE_SIZE", 2)
+    with (
+        patch("app.retrieval.search_similar", return_value=[]),
+        patch("app.retrieval.list_media", return_value=LIBRARY) as mock_list,
+    ):
+        for household in ("a", "b", "a", "c"):
+            hybrid_search("q", "tense", household=household)
+        assert list(retrieval_module._indexes) == ["a", "c"]
+
+        hybrid_search("q", "tense", household="b")
+        assert mock_list.call_count == 4
@@ -0,0 +1,102 @@
+import threading
+
+from app.speculation import _SPECULATIONS, Speculator
+
+
+def wait_idle(speculator: Speculator) -> None:
+    executor = speculator._executor
+    if executor is not None:
+        executor.submit(lambda: None).result()
+
+
+# ---------------------------------------------------------------------------
+# Taking results
+# ---------------------------------------------------------------------------
+
+
+def test_take_returns_the_speculative_result_for_a_matching_key():
+    speculator = Speculator("test.hit", workers=1)
+    speculator.submit("t1", ("a", 1), lambda: ["hit"])
+
+    result = speculator.take("t1", ("a", 1), lambda: ["computed"])
+
+    assert result == ["hit"]
+    assert _SPECULATIONS.value(kind="test.hit", result="hit") == 1
+
+
+def test_take_waits_for_a_speculation_still_running():
+    speculator = Speculator("test.wait", workers=1)
+    release = threading.Event()
+
+    def slow() -> str:
+        release.wait(5)
+        return "speculated"
+
+    speculator.submit("t1", "key", slow)
+    threading.Timer(0.01, release.set).start()
+
+    assert speculator.take("t1", "key", lambda: "computed") == "speculated"
+
+
+def test_take_computes_when_the_guess_was_for_other_input():
+    speculator = Speculator("test.stale", workers=1)
+    speculator.submit("t1", "guess", lambda: "speculated")
+
+    assert speculator.take("t1", "actual", lambda: "computed") == "computed"
+    assert _SPECULATIONS.value(kind="test.stale", result="stale") == 1
+
+
+def test_a_later_guess_replaces_the_earlier_one():
+    speculator = Speculator("test.replace", workers=2)
+    speculator.submit("t1", "first", lambda: "first")
+    speculator.submit("t1", "second", lambda: "second")
+
+    assert speculator.take("t1", "first", lambda: "computed") == "computed"
+
+
+def test_take_computes_when_the_speculation_failed():
+    speculator = Speculator("test.failed", workers=1)
+
+    def boom() -> str:
+        raise RuntimeError("upstream down")
+
+    speculator.submit("t1", "key", boom)
+
+    assert speculator.take("t1", "key", lambda: "computed") == "computed"
+    assert _SPECULATIONS.value(kind="test.failed", result="failed") == 1
+
+
+def test_each_result_is_taken_once():
+    speculator = Speculator("test.once", workers=1)
+    speculator.submit("t1", "key", lambda: "speculated")
+    speculator.take("t1", "key", lambda: "computed")
+
+    assert speculator.take("t1", "key", lambda: "computed") == "computed"
+    assert _SPECULATIONS.value(kind="test.once", result="miss") == 1
+
+
+# ---------------------------------------------------------------------------
+# Staying best-effort
+# ---------------------------------------------------------------------------
+
+
+def test_skips_speculation_when_every_worker_is_busy():
+    speculator = Speculator("test.busy", workers=1)
+    release = threading.Event()
+    speculator.submit("t0", "key", release.wait, 5)
+
+    speculator.submit("t1", "key", lambda: "speculated")
+    release.set()
+
+    assert _SPECULATIONS.value(kind="test.busy", result="skipped") == 1
+    assert speculator.take("t1", "key", lambda: "computed") == "computed"
+
+
+def test_forgets_the_oldest_threads_beyond_max_threads():
+    speculator = Speculator("test.evict", workers=1, max_threads=2)
+    for thread_id in ("t1", "t2", "t3"):
+        speculator.submit(thread_id, "key", lambda: "speculated")
+        wait_idle(speculator)
+
+    assert speculator.take("t1", "key", lambda: "computed") == "computed"
+    assert speculator.take("t3", "key", lambda: "computed") == "speculated"
@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import app.sse as sse_module
+from app import sse
+
+
+def _payload(frame: bytes) -> dict:
+    assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+    return json.loads(frame[6:-2])
+
+
+# ---------------------------------------------------------------------------
+# Frames
+# ---------------------------------------------------------------------------
+
+
+def test_chunk_frame_is_valid_json():
+    assert _payload(sse.chunk("Hello")) == {"type": "chunk", "content": "Hello"}
+
+
+@pytest.mark.parametrize(
+    "text", ['say "hi"', "line\nbreak", "back\\slash", "Amélie 🎬", " "]
+)
+def test_chunk_frame_escapes_content(text):
+    frame = sse.chunk(text)
+
+    assert frame.count(b"\n\n") == 1  # no raw newline can split the event
+    assert _payload(frame)["content"] == text
+
+
+def test_question_and_done_frames():
+    assert _payload(sse.question("Movie or series?")) == {
+        "type": "question",
+        "question": "Movie or series?",
+    }
+    assert _payload(sse.DONE) == {"type": "done"}
+
+
+def test_item_frame_carries_the_import_status():
+    status = {"index": 3, "title": "Amélie", "status": "added", "id": "a1"}
+
+    assert _payload(sse.item(status)) == {"type": "item", "item": status}
+
+
+# ---------------------------------------------------------------------------
+# coalesce
+# ---------------------------------------------------------------------------
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _timed(clock: FakeClock, pieces: list[tuple[float, str]]):
+    for at, text in pieces:
+        clock.now = at
+        yield text
+
+
+def test_coalesce_disabled_passes_texts_through():
+    assert list(sse.coalesce(["a", "b", "c"], window_ms=0)) == ["a", "b", "c"]
+
+
+def test_coalesce_merges_texts_within_the_window(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sse_module, "time", SimpleNamespace(monotonic=clock))
+    pieces = [(0.0, "a"), (0.01, "b"), (0.02, "c"), (0.06, "d"), (0.07, "e")]
+
+    merged = list(sse.coalesce(_timed(clock, pieces), window_ms=50))
+
+    # First text right away, then one event per 50ms, remainder at the end.
+    assert merged == ["a", "bcd", "e"]
+
+
+def test_coalesce_flushes_at_max_chars(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sse_module, "time", SimpleNamespace(monotonic=clock))
+    pieces = [(0.0, "x"), (0.001, "yy"), (0.002, "zz"), (0.003, "w")]
+
+    merged = list(sse.coalesce(_timed(clock, pieces), window_ms=1000, max_chars=4))
+
+    assert merged == ["x", "yyzz", "w"]
+    assert "".join(merged) == "xyyzzw"
@@ -0,0 +1,48 @@
+from app import thread_tokens
+
+
+def test_round_trips_thread_region_and_household():
+    token = thread_tokens.issue("SE", "flat-4b")
+    read = thread_tokens.read(token)
+
+    assert read is not None
+    assert read.region == "SE"
+    assert read.household == "flat-4b"
+    assert token.startswith(read.thread_id + ".")
+
+
+def test_rejects_a_signed_token_without_a_household():
+    payload = "3f2c1a7e.RO"
+
+    assert thread_tokens.read(f"{payload}.{thread_tokens._sign(payload)}") is None
+
+
+def test_every_token_names_a_new_thread():
+    first = thread_tokens.read(thread_tokens.issue("RO"))
+    second = thread_tokens.read(thread_tokens.issue("RO"))
+
+    assert first.thread_id != second.thread_id
+
+
+def test_rejects_a_token_with_a_swapped_region():
+    thread_id, _, household, signature = thread_tokens.issue("RO").split(".")
+
+    assert thread_tokens.read(f"{thread_id}.US.{household}.{signature}") is None
+
+
+def test_rejects_a_token_with_a_swapped_household():
+    thread_id, region, _, signature = thread_tokens.issue("RO", "ours").split(".")
+
+    assert thread_tokens.read(f"{thread_id}.{region}.theirs.{signature}") is None
+
+
+def test_rejects_a_signature_lifted_from_another_token():
+    payload, _, _ = thread_tokens.issue("RO").rpartition(".")
+    *_, other_signature = thread_tokens.issue("RO").split(".")
+
+    assert thread_tokens.read(f"{payload}.{other_signature}") is None
+
+
+def test_rejects_malformed_tokens():
+    for token in ("", "abc", "abc.RO", ".RO.sig", "a.RO..sig", "a.RO.x.y.sig"):
+        assert thread_tokens.read(token) is None
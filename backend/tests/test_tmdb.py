@@ -1,8 +1,15 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from unittest.mock import MagicMock, patch
 
+import httpx
 import pytest
 
 import app.tmdb as tmdb_module
+from app.hedging import Hedger
 from app.tmdb import get_watch_providers, search_media
 
 MOVIE_GENRES_RESP = {
@@ -48,63 +55,54 @@ def _make_http_response(data: dict) -> MagicMock:
 
 
 @pytest.fixture(autouse=True)
-def reset_genre_cache():
-    """Clear the in-memory genre caches before every test."""
-    tmdb_module._movie_genres.clear()
-    tmdb_module._tv_genres.clear()
-    yield
+def genre_maps(monkeypatch):
+    """Install the test genre maps and keep the background refresh from firing."""
+    monkeypatch.setattr(
+        tmdb_module,
+        "_genre_maps",
+        {
+            "movie": tmdb_module._genre_map(MOVIE_GENRES_RESP["genres"]),
+            "tv": tmdb_module._genre_map(TV_GENRES_RESP["genres"]),
+        },
+    )
+    monkeypatch.setattr(tmdb_module, "_next_refresh", float("inf"))
+    tmdb_module._search_cache.clear()
+    tmdb_module._providers_cache.clear()
 
 
+@contextmanager
 def _patch_client(*responses):
-    """Return a context-manager patch where httpx.Client().get() yields responses in order."""
-    mock_client = MagicMock()
-    mock_client.get.side_effect = list(responses)
-    ctx = MagicMock()
-    ctx.__enter__ = MagicMock(return_value=mock_client)
-    ctx.__exit__ = MagicMock(return_value=False)
-    return patch("app.tmdb.httpx.Client", return_value=ctx)
+    """Patch the shared client so its get() returns ``responses`` in order."""
+    client = MagicMock()
+    client.get.side_effect = list(responses)
+    with patch("app.tmdb._get_client", return_value=client):
+        yield client
 
 
 class TestSearchMedia:
     def test_returns_movies_and_series(self):
-        with _patch_client(
-            _make_http_response(MOVIE_GENRES_RESP),
-            _make_http_response(TV_GENRES_RESP),
-            _make_http_response(SEARCH_RESP),
-        ):
+        with _patch_client(_make_http_response(SEARCH_RESP)):
             results = search_media("white chicks")
 
         types = {r["type"] for r in results}
         assert types == {"movie", "series"}
 
     def test_filters_out_person_results(self):
-        with _patch_client(
-            _make_http_response(MOVIE_GENRES_RESP),
-            _make_http_response(TV_GENRES_RESP),
-            _make_http_response(SEARCH_RESP),
-        ):
+        with _patch_client(_make_http_response(SEARCH_RESP)):
             results = search_media("white chicks")
 
         assert all(r["type"] in ("movie", "series") for r in results)
         assert len(results) == 2
 
     def test_maps_genre_ids_to_names(self):
-        with _patch_client(
-            _make_http_response(MOVIE_GENRES_RESP),
-            _make_http_response(TV_GENRES_RESP),
-            _make_http_response(SEARCH_RESP),
-        ):
+        with _patch_client(_make_http_response(SEARCH_RESP)):
             results = search_media("white chicks")
 
         movie = next(r for r in results if r["type"] == "movie")
         assert movie["genres"] == ["Comedy", "Action"]
 
     def test_extracts_year_from_release_date(self):
-        with _patch_client(
-            _make_http_response(MOVIE_GENRES_RESP),
-            _make_http_response(TV_GENRES_RESP),
-            _make_http_response(SEARCH_RESP),
-        ):
+        with _patch_client(_make_http_response(SEARCH_RESP)):
             results = search_media("white chicks")
 
         movie = next(r for r in results if r["type"] == "movie")
@@ -126,11 +124,7 @@ class TestSearchMedia:
                 }
             ]
         }
-        with _patch_client(
-            _make_http_response(MOVIE_GENRES_RESP),
-            _make_http_response(TV_GENRES_RESP),
-            _make_http_response(resp),
-        ):
+        with _patch_client(_make_http_response(resp)):
             results = search_media("show")
 
         assert results[0]["year"] == "2010"
@@ -148,24 +142,16 @@ class TestSearchMedia:
                 }
             ]
         }
-        with _patch_client(
-            _make_http_response(MOVIE_GENRES_RESP),
-            _make_http_response(TV_GENRES_RESP),
-            _make_http_response(resp),
-        ):
+        with _patch_client(_make_http_response(resp)):
             results = search_media("obscure")
 
         assert results[0]["genres"] == []
 
-    def test_does_not_reload_genres_when_already_cached(self):
-        # Pre-populate the caches so _load_genres should NOT be called.
-        tmdb_module._movie_genres[35] = "Comedy"
-        tmdb_module._tv_genres[35] = "Comedy"
-
-        with _patch_client(_make_http_response(SEARCH_RESP)) as MockClient:
+    def test_search_does_not_fetch_genres(self):
+        with _patch_client(_make_http_response(SEARCH_RESP)) as client:
             search_media("friends")
-            # Only one Client() call (for the search), not three (genre loads + search).
-            assert MockClient.call_count == 1
+            # Only the search request; genres come from the current maps.
+            assert client.get.call_count == 1
 
     def test_limits_results_to_ten(self):
         many_results = {
@@ -181,26 +167,139 @@ class TestSearchMedia:
                 for i in range(15)
             ]
         }
-        with _patch_client(
-            _make_http_response(MOVIE_GENRES_RESP),
-            _make_http_response(TV_GENRES_RESP),
-            _make_http_response(many_results),
-        ):
+        with _patch_client(_make_http_response(many_results)):
             results = search_media("movie")
 
         assert len(results) == 10
 
     def test_returns_empty_list_when_no_results(self):
-        with _patch_client(
-            _make_http_response(MOVIE_GENRES_RESP),
-            _make_http_response(TV_GENRES_RESP),
-            _make_http_response({"results": []}),
-        ):
+        with _patch_client(_make_http_response({"results": []})):
             results = search_media("xyzzy")
 
         assert results == []
 
 
+class TestSearchCache:
+    def test_repeat_queries_are_served_from_cache(self):
+        with _patch_client(_make_http_response(SEARCH_RESP)) as client:
+            first = tmdb_module.search_page("White Chicks")
+            second = tmdb_module.search_page("  white   chicks ")
+
+        assert client.get.call_count == 1
+        assert second is first
+
+    def test_body_is_the_serialized_results(self):
+        with _patch_client(_make_http_response(SEARCH_RESP)):
+            page = tmdb_module.search_page("white chicks")
+
+        assert json.loads(page.body) == page.results
+        assert page.etag.startswith('"') and page.etag.endswith('"')
+        assert 0 < page.max_age <= tmdb_module._SEARCH_TTL_SECONDS
+
+    def test_expired_entry_is_refetched_with_the_same_etag(self):
+        with _patch_client(
+            _make_http_response(SEARCH_RESP), _make_http_response(SEARCH_RESP)
+        ) as client:
+            first = tmdb_module.search_page("friends")
+            tmdb_module._search_cache.put("friends", first, expires_at=0)
+            second = tmdb_module.search_page("friends")
+
+        assert client.get.call_count == 2
+        assert second is not first
+        assert second.etag == first.etag
+
+    def test_different_results_get_a_different_etag(self):
+        with _patch_client(
+            _make_http_response(SEARCH_RESP), _make_http_response({"results": []})
+        ):
+            one = tmdb_module.search_page("friends")
+            other = tmdb_module.search_page("xyzzy")
+
+        assert one.etag != other.etag
+
+    def test_least_recently_used_entries_are_evicted(self, monkeypatch):
+        monkeypatch.setattr(tmdb_module._search_cache, "maxsize", 2)
+        with _patch_client(*[_make_http_response({"results": []})] * 3):
+            tmdb_module.search_page("a")
+            tmdb_module.search_page("b")
+            tmdb_module.search_page("a")  # hit: "b" is now the oldest
+            tmdb_module.search_page("c")
+
+        assert list(tmdb_module._search_cache) == ["a", "c"]
+
+
+class TestGenres:
+    def test_snapshot_covers_both_media_types(self):
+        snapshot = tmdb_module._load_snapshot()
+
+        assert snapshot["movie"][35] == "Comedy"
+        assert snapshot["tv"][10765] == "Sci-Fi & Fantasy"
+
+    def test_refresh_replaces_maps_from_tmdb(self):
+        movie = {"genres": [{"id": 1, "name": "New Movie Genre"}]}
+        tv = {"genres": [{"id": 2, "name": "New TV Genre"}]}
+        with _patch_client(_make_http_response(movie), _make_http_response(tv)):
+            tmdb_module.refresh_genres()
+
+        assert tmdb_module._genre_maps == {
+            "movie": {1: "New Movie Genre"},
+            "tv": {2: "New TV Genre"},
+        }
+
+    def test_failed_refresh_keeps_current_maps(self):
+        before = tmdb_module._genre_maps
+        failing = _make_http_response({})
+        failing.raise_for_status.side_effect = httpx.HTTPStatusError(
+            "boom", request=MagicMock(), response=MagicMock()
+        )
+        with _patch_client(failing, _make_http_response(TV_GENRES_RESP)):
+            with pytest.raises(httpx.HTTPStatusError):
+                tmdb_module.refresh_genres()
+
+        assert tmdb_module._genre_maps is before
+
+    def test_concurrent_refreshes_fetch_once(self):
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_get(url, **kwargs):
+            entered.set()
+            release.wait(timeout=5)
+            kind = "movie" if "/movie/" in url else "tv"
+            return _make_http_response(
+                MOVIE_GENRES_RESP if kind == "movie" else TV_GENRES_RESP
+            )
+
+        with _patch_client() as client:
+            client.get.side_effect = slow_get
+            first = threading.Thread(target=tmdb_module.refresh_genres)
+            first.start()
+            entered.wait(timeout=5)
+            tmdb_module.refresh_genres()  # returns at once: a fetch is in flight
+            release.set()
+            first.join(timeout=5)
+
+        assert client.get.call_count == 2  # movie + tv, once
+
+    def test_warm_up_keeps_maps_that_are_still_fresh(self, monkeypatch):
+        monkeypatch.setattr(tmdb_module, "_next_refresh", time.monotonic() + 60)
+
+        with _patch_client() as client:
+            tmdb_module.warm_up()
+
+        client.get.assert_not_called()
+
+    def test_stale_maps_refresh_in_background(self, monkeypatch):
+        monkeypatch.setattr(tmdb_module, "_next_refresh", 0.0)
+        refreshed = threading.Event()
+        monkeypatch.setattr(tmdb_module, "refresh_genres", refreshed.set)
+
+        with _patch_client(_make_http_response(SEARCH_RESP)):
+            results = search_media("white chicks")
+
+        assert results[0]["genres"] == ["Comedy", "Action"]
+        assert refreshed.wait(timeout=5)
+
+
 WATCH_PROVIDERS_RESP = {
     "results": {
         "RO": {
@@ -222,17 +321,17 @@ class TestGetWatchProviders:
         assert result["RO"]["flatrate"][0]["provider_name"] == "Netflix"
 
     def test_uses_movie_endpoint_for_movie(self):
-        with _patch_client(_make_http_response(WATCH_PROVIDERS_RESP)) as MockClient:
+        with _patch_client(_make_http_response(WATCH_PROVIDERS_RESP)) as client:
             get_watch_providers(8191, "movie")
 
-        url = MockClient.return_value.__enter__.return_value.get.call_args[0][0]
+        url = client.get.call_args[0][0]
         assert "/movie/" in url
 
     def test_uses_tv_endpoint_for_series(self):
-        with _patch_client(_make_http_response(WATCH_PROVIDERS_RESP)) as MockClient:
+        with _patch_client(_make_http_response(WATCH_PROVIDERS_RESP)) as client:
             get_watch_providers(1001, "series")
 
-        url = MockClient.return_value.__enter__.return_value.get.call_args[0][0]
+        url = client.get.call_args[0][0]
         assert "/tv/" in url
 
     def test_returns_empty_dict_when_no_results(self):
@@ -240,3 +339,144 @@ class TestGetWatchProviders:
             result = get_watch_providers(9999, "movie")
 
         assert result == {}
+
+    def test_all_regions_are_served_from_one_cached_lookup(self):
+        with _patch_client(_make_http_response(WATCH_PROVIDERS_RESP)) as client:
+            ro = get_watch_providers(8191, "movie")["RO"]
+            us = get_watch_providers(8191, "movie").get("US")
+
+        assert client.get.call_count == 1
+        assert ro["flatrate"][0]["provider_name"] == "Netflix"
+        assert us is None
+
+    def test_movies_and_series_are_cached_separately(self):
+        with _patch_client(
+            _make_http_response(WATCH_PROVIDERS_RESP),
+            _make_http_response({"results": {}}),
+        ) as client:
+            get_watch_providers(1, "movie")
+            series = get_watch_providers(1, "series")
+
+        assert client.get.call_count == 2
+        assert series == {}
+
+    def test_uses_the_providers_timeout(self):
+        with _patch_client(_make_http_response(WATCH_PROVIDERS_RESP)) as client:
+            get_watch_providers(8191, "movie")
+
+        timeout = client.get.call_args.kwargs["timeout"]
+        assert timeout == tmdb_module._TIMEOUTS["providers"]
+
+    def test_hedged_lookup_takes_the_faster_copy(self, monkeypatch):
+        release = threading.Event()
+        fast = _make_http_response(WATCH_PROVIDERS_RESP)
+
+        def respond(*args, **kwargs):
+            if client.get.call_count == 1:
+                release.wait(5)
+                return _make_http_response({"results": {}})
+            return fast
+
+        client = MagicMock()
+        client.get.side_effect = respond
+        hedger = tmdb_module._hedgers["providers"]
+        monkeypatch.setattr(hedger, "enabled", True)
+        monkeypatch.setattr(hedger, "default_delay", 0.01)
+        monkeypatch.setattr(hedger, "_latencies", deque(maxlen=8))
+
+        with patch("app.tmdb._get_client", return_value=client):
+            result = get_watch_providers(8191, "movie")
+        release.set()
+
+        assert result["RO"]["flatrate"][0]["provider_name"] == "Netflix"
+        assert client.get.call_count == 2
+
+    def test_rate_limit_wait_is_not_taken_for_a_slow_answer(self, monkeypatch):
+        client = MagicMock()
+        client.get.return_value = _make_http_response(WATCH_PROVIDERS_RESP)
+        # A fresh hedger: losing copies from other tests can't add samples.
+        hedger = Hedger(
+            "test.providers", enabled=True, delay_ms=200, min_delay_ms=1, workers=2
+        )
+        monkeypatch.setitem(tmdb_module._hedgers, "providers", hedger)
+        limiter = tmdb_module._RateLimiter(4)
+        monkeypatch.setattr(tmdb_module, "_rate_limiter", limiter)
+        for _ in range(4):
+            limiter.acquire()  # the next request waits 0.25s for a slot
+
+        with patch("app.tmdb._get_client", return_value=client):
+            get_watch_providers(8191, "movie")
+
+        assert client.get.call_count == 1
+        assert list(hedger._latencies) == [pytest.approx(0, abs=0.1)]
+
+    def test_hedge_is_skipped_when_the_rate_limit_has_no_room(self, monkeypatch):
+        release = threading.Event()
+
+        def respond(*args, **kwargs):
+            release.wait(0.1)
+            return _make_http_response(WATCH_PROVIDERS_RESP)
+
+        client = MagicMock()
+        client.get.side_effect = respond
+        hedger = tmdb_module._hedgers["providers"]
+        monkeypatch.setattr(hedger, "enabled", True)
+        monkeypatch.setattr(hedger, "default_delay", 0.01)
+        monkeypatch.setattr(hedger, "_latencies", deque(maxlen=8))
+        monkeypatch.setattr(tmdb_module, "_rate_limiter", tmdb_module._RateLimiter(1))
+
+        with patch("app.tmdb._get_client", return_value=client):
+            get_watch_providers(8191, "movie")
+
+        assert client.get.call_count == 1
+
+
+class TestRateLimiter:
+    def test_requests_over_the_rate_wait_for_a_slot(self, monkeypatch):
+        now = [100.0]
+        sleeps = []
+        monkeypatch.setattr(tmdb_module.time, "monotonic", lambda: now[0])
+        monkeypatch.setattr(tmdb_module.time, "sleep", sleeps.append)
+        limiter = tmdb_module._RateLimiter(2)
+
+        limiter.acquire()
+        limiter.acquire()
+        assert sleeps == []
+
+        limiter.acquire()
+        limiter.acquire()
+        assert sleeps == [0.5, 1.0]
+
+    def test_tokens_refill_over_time(self, monkeypatch):
+        now = [100.0]
+        sleeps = []
+        monkeypatch.setattr(tmdb_module.time, "monotonic", lambda: now[0])
+        monkeypatch.setattr(tmdb_module.time, "sleep", sleeps.append)
+        limiter = tmdb_module._RateLimiter(2)
+        limiter.acquire()
+        limiter.acquire()
+
+        now[0] += 1.0
+        limiter.acquire()
+
+        assert sleeps == []
+
+    def test_try_acquire_takes_only_a_free_token(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(tmdb_module.time, "monotonic", lambda: now[0])
+        monkeypatch.setattr(tmdb_module.time, "sleep", pytest.fail)
+        limiter = tmdb_module._RateLimiter(2)
+
+        assert limiter.try_acquire()
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+
+        now[0] += 0.5
+        assert limiter.try_acquire()
+
+    def test_zero_rate_never_waits(self, monkeypatch):
+        monkeypatch.setattr(tmdb_module.time, "sleep", pytest.fail)
+        limiter = tmdb_module._RateLimiter(0)
+
+        for _ in range(100):
+            limiter.acquire()
@@ -0,0 +1,104 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.tracing import _SPAN_SECONDS, span, thread_scope, traced
+
+# ---------------------------------------------------------------------------
+# span
+# ---------------------------------------------------------------------------
+
+
+def test_span_records_duration_in_histogram():
+    before = _SPAN_SECONDS.count(span="test.duration")
+
+    with span("test.duration"):
+        pass
+
+    assert _SPAN_SECONDS.count(span="test.duration") == before + 1
+
+
+def test_nested_spans_share_trace_and_link_parent():
+    with span("outer") as outer, span("inner") as inner:
+        pass
+
+    assert inner.trace_id == outer.trace_id
+    assert inner.parent_id == outer.span_id
+    assert outer.parent_id is None
+
+
+def test_span_is_tagged_with_thread_id_in_scope():
+    with thread_scope("thread-123"), span("tagged") as tagged:
+        pass
+    with span("untagged") as untagged:
+        pass
+
+    assert tagged.attributes["thread_id"] == "thread-123"
+    assert "thread_id" not in untagged.attributes
+
+
+def test_span_records_error_and_reraises():
+    with pytest.raises(ValueError), span("failing") as failing:
+        raise ValueError("boom")
+
+    assert failing.error == "ValueError"
+
+
+def test_traced_decorator_wraps_function_in_span():
+    @traced("test.decorated")
+    def add(a, b):
+        return a + b
+
+    before = _SPAN_SECONDS.count(span="test.decorated")
+    assert add(1, 2) == 3
+    assert add.__name__ == "add"
+    assert _SPAN_SECONDS.count(span="test.decorated") == before + 1
+
+
+def test_traced_decorator_spans_the_whole_coroutine():
+    @traced("test.decorated_async")
+    async def nap():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    with patch("app.tracing._export") as export:
+        assert asyncio.run(nap()) == "done"
+
+    finished = export.call_args.args[0]
+    assert finished.name == "test.decorated_async"
+    assert finished.duration >= 0.01
+
+
+# ---------------------------------------------------------------------------
+# exporters
+# ---------------------------------------------------------------------------
+
+
+def test_no_output_by_default(capsys):
+    with span("quiet"):
+        pass
+
+    assert capsys.readouterr().err == ""
+
+
+def test_json_exporter_writes_one_line_per_span(capsys):
+    with (
+        patch("app.tracing.TRACING_EXPORTER", "json"),
+        thread_scope("t-1"),
+        span("exported", hits=3),
+    ):
+        pass
+
+    record = json.loads(capsys.readouterr().err)
+    assert record["name"] == "exported"
+    assert record["attributes"] == {"hits": 3, "thread_id": "t-1"}
+    assert record["duration"] >= 0
+
+
+def test_console_exporter_writes_readable_line(capsys):
+    with patch("app.tracing.TRACING_EXPORTER", "console"), span("readable"):
+        pass
+
+    assert "readable" in capsys.readouterr().err
@@ -199,4 +199,51 @@ describe("Add page", () => {
     await new Promise((r) => setTimeout(r, 500));
     expect(searchMedia).not.toHaveBeenCalled();
   });
+
+  it("saves the selected result's TMDB id", async () => {
+    vi.mocked(searchMedia).mockResolvedValue([WHITE_CHICKS]);
+    render(<AddPage />);
+    fireEvent.change(screen.getByLabelText("Title"), {
+      target: { value: "White" },
+    });
+    fireEvent.mouseDown(await screen.findByText("White Chicks"));
+    fireEvent.change(screen.getByLabelText(/your rating/i), {
+      target: { value: "7" },
+    });
+    fireEvent.change(screen.getByLabelText(/lucia's rating/i), {
+      target: { value: "8" },
+    });
+    fireEvent.click(screen.getByRole("button", { name: /save/i }));
+
+    await waitFor(() => {
+      expect(saveMedia).toHaveBeenCalledWith(
+        expect.objectContaining({ title: "White Chicks", tmdb_id: 8191 }),
+      );
+    });
+  });
+
+  it("drops the TMDB id when the title is edited after selecting", async () => {
+    vi.mocked(searchMedia).mockResolvedValue([WHITE_CHICKS]);
+    render(<AddPage />);
+    fireEvent.change(screen.getByLabelText("Title"), {
+      target: { value: "White" },
+    });
+    fireEvent.mouseDown(await screen.findByText("White Chicks"));
+    fireEvent.change(screen.getByLabelText("Title"), {
+      target: { value: "White Chicks 2" },
+    });
+    fireEvent.change(screen.getByLabelText(/your rating/i), {
+      target: { value: "7" },
+    });
+    fireEvent.change(screen.getByLabelText(/lucia's rating/i), {
+      target: { value: "8" },
+    });
+    fireEvent.click(screen.getByRole("button", { name: /save/i }));
+
+    await waitFor(() => {
+      expect(saveMedia).toHaveBeenCalledWith(
+        expect.objectContaining({ title: "White Chicks 2", tmdb_id: null }),
+      );
+    });
+  });
 });
@@ -0,0 +1,74 @@
+// @vitest-environment node
+import { describe, expect, it } from "vitest";
+import { type SSEEvent, readSSE } from "@/lib/api";
+
+function streamOf(...chunks: string[]): ReadableStream<Uint8Array> {
+  const encoder = new TextEncoder();
+  return new ReadableStream({
+    start(controller) {
+      for (const chunk of chunks) controller.enqueue(encoder.encode(chunk));
+      controller.close();
+    },
+  });
+}
+
+async function collect(
+  stream: ReadableStream<Uint8Array>,
+): Promise<SSEEvent[]> {
+  const events: SSEEvent[] = [];
+  for await (const event of readSSE(stream)) events.push(event);
+  return events;
+}
+
+const FRAMES =
+  'data: {"type":"chunk","content":"Heat"}\n\n' +
+  'data: {"type":"chunk","content":" (1995)\\n"}\n\n' +
+  'data: {"type":"done"}\n\n';
+
+const EXPECTED: SSEEvent[] = [
+  { type: "chunk", content: "Heat" },
+  { type: "chunk", content: " (1995)\n" },
+  { type: "done" },
+];
+
+describe("readSSE", () => {
+  it("parses several events from one read", async () => {
+    expect(await collect(streamOf(FRAMES))).toEqual(EXPECTED);
+  });
+
+  it("parses events split at every possible position", async () => {
+    for (let i = 1; i < FRAMES.length; i++) {
+      const events = await collect(
+        streamOf(FRAMES.slice(0, i), FRAMES.slice(i)),
+      );
+      expect(events).toEqual(EXPECTED);
+    }
+  });
+
+  it("parses a byte-at-a-time stream", async () => {
+    expect(await collect(streamOf(...FRAMES))).toEqual(EXPECTED);
+  });
+
+  it("decodes multi-byte characters split across reads", async () => {
+    const bytes = new TextEncoder().encode(
+      'data: {"type":"question","question":"Amélie? 🎬"}\n\n',
+    );
+    const stream = new ReadableStream<Uint8Array>({
+      start(controller) {
+        for (const byte of bytes) controller.enqueue(new Uint8Array([byte]));
+        controller.close();
+      },
+    });
+
+    expect(await collect(stream)).toEqual([
+      { type: "question", question: "Amélie? 🎬" },
+    ]);
+  });
+
+  it("ignores an incomplete trailing event", async () => {
+    const events = await collect(
+      streamOf('data: {"type":"done"}\n\ndata: {"type":"chu'),
+    );
+    expect(events).toEqual([{ type: "done" }]);
+  });
+});
@@ -37,6 +37,8 @@ const EMPTY: FormState = {
 
 export default function AddPage() {
   const [form, setForm] = useState<FormState>(EMPTY);
+  // TMDB id of the picked search result, until the title or type is edited.
+  const [tmdbId, setTmdbId] = useState<number | null>(null);
   const [loading, setLoading] = useState(false);
   const [success, setSuccess] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -75,6 +77,7 @@ export default function AddPage() {
 
   function selectResult(result: SearchResult) {
     skipNextSearch.current = true;
+    setTmdbId(result.tmdb_id);
     setForm((f) => ({
       ...f,
       title: result.title,
@@ -91,7 +94,10 @@ export default function AddPage() {
       e: React.ChangeEvent<
         HTMLInputElement | HTMLTextAreaElement | HTMLSelectElement
       >,
-    ) => setForm((f) => ({ ...f, [key]: e.target.value }));
+    ) => {
+      if (key === "title" || key === "type") setTmdbId(null);
+      setForm((f) => ({ ...f, [key]: e.target.value }));
+    };
   }
 
   function addGenre() {
@@ -113,6 +119,7 @@ export default function AddPage() {
       await saveMedia({
         title: form.title,
         type: form.type,
+        tmdb_id: tmdbId,
         genres: form.genres,
         description: form.description,
         user_rating: Number(form.user_rating),
@@ -13,6 +13,13 @@ export async function POST(req: NextRequest) {
     },
     body: JSON.stringify(body),
   });
+  if (!res.ok) {
+    // e.g. a 503 from admission control; keep its Retry-After.
+    const headers = new Headers({ "Content-Type": "application/json" });
+    const retryAfter = res.headers.get("retry-after");
+    if (retryAfter) headers.set("Retry-After", retryAfter);
+    return new Response(await res.text(), { status: res.status, headers });
+  }
   return new Response(res.body, {
     headers: {
       "Content-Type": "text/event-stream",
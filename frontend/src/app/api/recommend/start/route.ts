@@ -1,13 +1,23 @@
-import { NextResponse } from "next/server";
+import { type NextRequest, NextResponse } from "next/server";
 
 const BACKEND = process.env.API_URL ?? "http://localhost:8000";
 const SECRET = process.env.API_SECRET ?? "";
 
-export async function POST() {
+export async function POST(req: NextRequest) {
+  // Optional {"region": "DE"}; the backend falls back to its DEFAULT_REGION.
+  const body = await req.text();
   const res = await fetch(`${BACKEND}/recommend/start`, {
     method: "POST",
-    headers: { Authorization: `Bearer ${SECRET}` },
+    headers: {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${SECRET}`,
+    },
+    body: body || undefined,
   });
   const data = await res.json();
-  return NextResponse.json(data, { status: res.status });
+  const retryAfter = res.headers.get("retry-after");
+  return NextResponse.json(data, {
+    status: res.status,
+    headers: retryAfter ? { "Retry-After": retryAfter } : undefined,
+  });
 }
@@ -1,13 +1,32 @@
-import { type NextRequest, NextResponse } from "next/server";
+import type { NextRequest } from "next/server";
 
 const BACKEND = process.env.API_URL ?? "http://localhost:8000";
 const SECRET = process.env.API_SECRET ?? "";
 
+// Passed through in both directions so the browser can revalidate repeat
+// queries against the backend's cache and get a bodiless 304 back.
+const CACHE_HEADERS = ["etag", "cache-control"];
+
 export async function GET(req: NextRequest) {
   const q = req.nextUrl.searchParams.get("q") ?? "";
+  const headers: Record<string, string> = { Authorization: `Bearer ${SECRET}` };
+  const ifNoneMatch = req.headers.get("if-none-match");
+  if (ifNoneMatch) headers["If-None-Match"] = ifNoneMatch;
+
   const res = await fetch(`${BACKEND}/search?q=${encodeURIComponent(q)}`, {
-    headers: { Authorization: `Bearer ${SECRET}` },
+    headers,
   });
-  const data = await res.json();
-  return NextResponse.json(data, { status: res.status });
+
+  const out = new Headers();
+  for (const name of CACHE_HEADERS) {
+    const value = res.headers.get(name);
+    if (value) out.set(name, value);
+  }
+  if (res.status === 304) {
+    return new Response(null, { status: 304, headers: out });
+  }
+
+  const contentType = res.headers.get("content-type") ?? "application/json";
+  out.set("content-type", contentType);
+  return new Response(await res.text(), { status: res.status, headers: out });
 }
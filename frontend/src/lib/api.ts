@@ -1,6 +1,8 @@
 export interface MediaPayload {
   title: string;
   type: string;
+  // Set when the title was picked from TMDB search; deduplicates on it.
+  tmdb_id?: number | null;
   genres: string[];
   description: string;
   user_rating: number;
@@ -52,8 +54,14 @@ export async function saveMedia(
   return res.json() as Promise<Record<string, unknown>>;
 }
 
-export async function startRecommendation(): Promise<StartResponse> {
-  const res = await fetch("/api/recommend/start", { method: "POST" });
+export async function startRecommendation(
+  region?: string,
+): Promise<StartResponse> {
+  const res = await fetch("/api/recommend/start", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: region ? JSON.stringify({ region }) : undefined,
+  });
   if (!res.ok) throw new Error("Failed to start recommendation");
   return res.json() as Promise<StartResponse>;
 }
@@ -68,11 +76,32 @@ export async function* sendReply(
     body: JSON.stringify({ thread_id, answer }),
   });
   if (!res.ok) throw new Error("Failed to send reply");
+  if (!res.body) throw new Error("Response body is not readable");
+  yield* readSSE(res.body);
+}
+
+function parseEvent(block: string): SSEEvent | null {
+  for (const line of block.split("\n")) {
+    if (line.startsWith("data: ")) {
+      const raw = line.slice(6).trim();
+      if (raw) return JSON.parse(raw) as SSEEvent;
+    }
+  }
+  return null;
+}
 
-  const reader = res.body?.getReader();
-  if (!reader) throw new Error("Response body is not readable");
+/**
+ * Parse a text/event-stream body as it arrives. Each read is decoded once and
+ * only the new text is searched for event boundaries (blank lines), so a long
+ * event split across many reads isn't rescanned from the start every time.
+ */
+export async function* readSSE(
+  body: ReadableStream<Uint8Array>,
+): AsyncGenerator<SSEEvent> {
+  const reader = body.getReader();
   const decoder = new TextDecoder();
   let buffer = "";
+  let scanFrom = 0;
 
   while (true) {
     const { done, value } = await reader.read();
@@ -80,16 +109,16 @@ export async function* sendReply(
 
     buffer += decoder.decode(value, { stream: true });
 
-    // SSE events are separated by \n\n
-    const parts = buffer.split("\n\n");
-    buffer = parts.pop() ?? "";
-
-    for (const part of parts) {
-      const line = part.trim();
-      if (line.startsWith("data: ")) {
-        const raw = line.slice(6).trim();
-        if (raw) yield JSON.parse(raw) as SSEEvent;
-      }
+    let start = 0;
+    let end = buffer.indexOf("\n\n", scanFrom);
+    while (end !== -1) {
+      const event = parseEvent(buffer.slice(start, end));
+      if (event) yield event;
+      start = end + 2;
+      end = buffer.indexOf("\n\n", start);
     }
+    if (start > 0) buffer = buffer.slice(start);
+    // The buffer may end in "\n", the first half of the next boundary.
+    scanFrom = Math.max(0, buffer.length - 1);
   }
 }